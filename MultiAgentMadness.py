@@ -5,6 +5,9 @@ Now that you have done some of the simple tutorials, let's try something a littl
 Instead of having your code run locally, you can have it run in a Docker image. Autogen automatically looks for docker and creates the resources necessary to run your code. For any given UserProxyAgent that is running code, Autogen assumes you want to use Docker and will look for it. If it does not exist, Autogen will fall back to running locally. If you know ahead of time that you want to run locally, you can set use_docker to False in the UserProxyAgent.
 example:  code_execution_config={"work_dir": "planning", "use_docker": "False"},
 
+*** Helpers ***
+The script also uses history compaction, loop detection, model routing and tracing; each is explained in its own module (history_compaction.py, loop_detector.py, model_router.py, agent_tracing.py) and all of them together in agent_factory.py.
+
 *** Config List Filtering ***
 This is used if you have a list of multiple models in your config. Here is what a multi-model config list looks like:
 config_list = [
@@ -48,6 +51,14 @@ config_list = autogen.config_list_from_json(
 )
 """
 import autogen
+from planner_pool import ASK_PLANNER_BATCH_FUNCTION, PlannerPool
+from history_compaction import HistoryCompactor
+from loop_detector import LoopDetector
+from model_router import ModelRouter
+from agent_tracing import Tracer
+
+# record where the time goes (see agent_tracing.py)
+tracer = Tracer().install()
 
 config_list = autogen.config_list_from_json(
     "OAI_CONFIG_LIST",
@@ -81,6 +92,14 @@ def ask_planner(message):
     # return the last message received from the planner
     return planner_user.last_message()["content"]
 
+# when the assistant has several independent questions (one per topic, one per state, ...) it can send them all at once with ask_planner_batch. Each question goes to its own copy of the planner and planner_user, up to 4 at a time, and the answers come back numbered in the same order as the questions.
+# It is off by default: giving the assistant one more function changes every request it makes, so the responses already saved in the .cache directory for seed 1337 would no longer be found. Set this to True to try it.
+use_planner_batch = False
+planner_pool = PlannerPool.like(planner, planner_user, size=4)
+
+def ask_planner_batch(messages):
+    return planner_pool.ask_planner_batch(messages)
+
 
 """
 Now things get interesting. We create the AssistantAgent that will actually call the ask_planner function. This agent will be responsible for interacting with the planner and planner_user and asking the planner for help when needed. Additionally, it is the 'go between' for the user and the planner and planner_user agents. It will be responsible for asking the user for input and then passing that input along.
@@ -109,10 +128,25 @@ assistant = autogen.AssistantAgent(
                     "required": ["message"],
                 },
             },
-        ],
+        ] + ([ASK_PLANNER_BATCH_FUNCTION] if use_planner_batch else []), # ask_planner_batch is the same as ask_planner, but for a list of independent questions answered in parallel
     }
 )
 
+# send simple requests to gpt-3.5-turbo and the rest to gpt-4 (see model_router.py). The planner always gets gpt-4.
+router_config_list = autogen.config_list_from_json(
+    "OAI_CONFIG_LIST",
+    filter_dict={
+        "model": ["gpt-3.5-turbo", "gpt-4"],
+    },
+)
+router = ModelRouter(router_config_list)
+router.attach(assistant)
+router.attach(planner, role_min_tier=1)
+
+# keep the assistant's history under a token budget (see history_compaction.py). The messages sent to the planner are trimmed the same way.
+history = HistoryCompactor(max_tokens=6000, keep_recent=4)
+history.attach(assistant)
+
 """
 The next step is to create a UserProxyAgent instance named "user_proxy" that is used to actually communicate with the user. When the planner or planner_user agents need to ask the user a question or completes a task section, it will pass a question to the assistant or issue a TERMINATE message to the assistant. This gets passed to the the user_proxy agent that will then ask the user for input and then send the input back to the assistant agent.
 """
@@ -125,9 +159,13 @@ user_proxy = autogen.UserProxyAgent(
     # if you only want the planner and planner_user to do a single round of communication, the below line will stop the process when the planner_user agent sends a TERMINATE message to the user_proxy agent. Uncomment to see it in action. 
     # is_termination_msg=lambda x: "content" in x and x["content"] is not None and x["content"].rstrip().endswith("TERMINATE"),
     code_execution_config={"work_dir": "planning", "use_docker": "False"},
-    function_map={"ask_planner": ask_planner},
+    function_map={"ask_planner": history.wrap(ask_planner), "ask_planner_batch": ask_planner_batch},
 )
 
+# ask for feedback as soon as the conversation starts going in circles instead of after max_consecutive_auto_reply rounds (see loop_detector.py)
+loops = LoopDetector(max_repeats=3, on_loop="escalate")
+loops.attach(user_proxy)
+
 """
 Finally, we invoke the `initiate_chat()` method of the user proxy agent to start the conversation with a task description from the user. The user is prompted to provide feedback after the assistant agent sends a "TERMINATE" signal in the end of the message. If the user doesn't provide any feedback (by pressing Enter directly), the conversation will finish. Before the "TERMINATE" signal, the user proxy agent will try to execute the code suggested by the assistant agent on behalf of the user.
 """
@@ -0,0 +1,181 @@
+"""
+*** One Place to Build the Agents ***
+MultiAgentMadness.py walks through the planner / planner_user / assistant / user_proxy setup step by step, with
+comments. The other scripts (and batch_runner.py, which builds a fresh set of agents for every task) get the same
+setup from build_agents, so it only lives in one place. build_agents returns an AgentTeam with the four agents and
+the helpers from this repo already wired up. Each helper's own module explains it in full; in short:
+
+- Container pool (container_pool.py, when sandbox is given): instead of a fresh Docker container per code block,
+  agents that share a work_dir share a few long-lived containers, or local processes when Docker isn't running.
+  example:  sandbox={"backend": "auto", "size": 2, "max_uses": 50}
+- History compaction (history_compaction.py): the assistant's history is kept under history_tokens. Recent turns are
+  sent as they are, long output in older turns is cut down, repeated code blocks and errors are sent once, and if
+  that is not enough the oldest turns are folded into a summary. The questions sent to ask_planner keep their code
+  whole; only pasted execution output is cut down.
+- Loop detection (loop_detector.py): user_proxy asks you for feedback as soon as the same error, code block or
+  message shows up loop_repeats times, instead of running until max_consecutive_auto_reply.
+- Model routing (model_router.py, when router_config_list is given): simple requests go to the cheaper model, and a
+  request moves up to the bigger one if the cheaper one fails. The planner always gets the bigger model.
+- Planner pool (planner_pool.py, when planner_pool_size is given): the assistant also gets ask_planner_batch, which
+  answers several independent questions in parallel.
+- Checkpoint and resume (conversation_checkpoint.py, when checkpoint is given): the conversation is saved after every
+  turn, so team.run(..., resume=True) continues from the last completed turn after a crash.
+- Cache replay: routing, compaction, the loop detector and the planner pool all change the requests sent to the
+  model, so responses recorded in .cache by runs without them are not reused. cache_replay=True leaves routing,
+  compaction and the loop detector out, to replay such a run from the cache.
+
+Tracing is not part of the team: a script calls Tracer().install() from agent_tracing.py before building it to get a
+table per agent and a trace file of every LLM call, function call and code block.
+
+example:
+team = build_agents(config_list, work_dir="dogrescues", seed=1003, sandbox={"backend": "auto", "size": 2})
+team.run("Find me fosters and rescues in Texas ...")
+"""
+import autogen
+
+from container_pool import SandboxUserProxyAgent
+from conversation_checkpoint import ConversationCheckpoint
+from history_compaction import HistoryCompactor
+from loop_detector import LoopDetector
+from model_router import ModelRouter
+from planner_pool import ASK_PLANNER_BATCH_FUNCTION, PlannerPool
+
+PLANNER_SYSTEM_MESSAGE = "You are a helpful AI assistant. You suggest coding and reasoning steps for another AI assistant to accomplish a task. Do not suggest concrete code. For any action beyond writing code or reasoning, convert it to a step which can be implemented by writing python code. For example, the action of browsing the web can be implemented by writing python code which reads and prints the content of a web page. Assume all tasks can be done with python code. Finally, inspect the execution result. If the plan is not good, suggest a better plan. If the execution is wrong, analyze the error and suggest a fix. Bear in mind workarounds like using BeautifulSoup if we can't use other methods to get web data and always pretend to be a user when web scraping. Keep doing this until the execution result is correct."
+
+ASK_PLANNER_FUNCTION = {
+    "name": "ask_planner",
+    "description": "ask planner to: 1. get a plan for finishing a task, 2. verify the execution result of the plan and potentially suggest new plan.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "message": {
+                "type": "string",
+                "description": "question to ask planner. Make sure the question include enough context, such as the code and the execution result. The planner does not know the conversation between you and the user, unless you share the conversation with the planner.",
+            },
+        },
+        "required": ["message"],
+    },
+}
+
+
+class AgentTeam:
+    """The agents of one run and the helpers attached to them."""
+
+    def __init__(self, planner, planner_user, assistant, user_proxy, planner_pool, history, loops, router=None,
+                 checkpoint=None):
+        self.planner = planner
+        self.planner_user = planner_user
+        self.assistant = assistant
+        self.user_proxy = user_proxy
+        self.planner_pool = planner_pool
+        self.history = history
+        self.loops = loops
+        self.router = router
+        self.checkpoint = checkpoint
+
+    def run(self, message, resume=False):
+        """Start the conversation between user_proxy and the assistant, or with resume, continue it from the last
+        checkpoint if there is one."""
+        if resume and self.checkpoint is not None and self.checkpoint.resumable():
+            self.checkpoint.resume()
+        else:
+            self.user_proxy.initiate_chat(self.assistant, message=message)
+            if self.checkpoint is not None:
+                self.checkpoint.finish()
+        return self.user_proxy.last_message(self.assistant)
+
+
+def build_agents(
+    config_list=None,
+    model="gpt-4",
+    seed=1337,
+    work_dir="planning",
+    planner_work_dir=None,
+    planner_system_message=PLANNER_SYSTEM_MESSAGE,
+    router_config_list=None,
+    sandbox=None,
+    human_input_mode="TERMINATE",
+    max_consecutive_auto_reply=10,
+    planner_pool_size=0,
+    history_tokens=6000,
+    loop_repeats=3,
+    checkpoint=None,
+    cache_replay=False,
+):
+    """Build planner, planner_user, assistant and user_proxy the way the scripts do.
+
+    config_list defaults to the model's entries in OAI_CONFIG_LIST. The planner and planner_user use planner_work_dir
+    (default: work_dir). With sandbox set, both proxies run code in the container pool with those settings. checkpoint
+    is the file the conversation between user_proxy and the assistant is saved to after every turn. With
+    planner_pool_size > 0 the assistant also gets ask_planner_batch, answered by that many planner copies; it is off by
+    default because one more function changes every request, so the responses already in .cache would no longer match.
+    For the same reason cache_replay=True builds the agents without model routing, history compaction and the loop
+    detector, so a run recorded in .cache before those existed is answered from the cache again."""
+    if config_list is None:
+        config_list = autogen.config_list_from_json("OAI_CONFIG_LIST", filter_dict={"model": [model]})
+    planner_work_dir = planner_work_dir or work_dir
+
+    def make_proxy(**kwargs):
+        if sandbox is not None:
+            return SandboxUserProxyAgent(sandbox=sandbox, **kwargs)
+        return autogen.UserProxyAgent(**kwargs)
+
+    planner = autogen.AssistantAgent(
+        name="planner",
+        llm_config={"config_list": config_list},
+        system_message=planner_system_message,
+    )
+    planner_user = make_proxy(
+        name="planner_user",
+        max_consecutive_auto_reply=0,
+        code_execution_config={"work_dir": planner_work_dir},
+        human_input_mode="NEVER",
+    )
+
+    def ask_planner(message):
+        planner_user.initiate_chat(planner, message=message)
+        return planner_user.last_message()["content"]
+
+    functions, function_map = [ASK_PLANNER_FUNCTION], {}
+    planner_pool = None
+    if planner_pool_size:
+        planner_pool = PlannerPool.like(planner, planner_user, size=planner_pool_size)
+        functions.append(ASK_PLANNER_BATCH_FUNCTION)
+        function_map["ask_planner_batch"] = planner_pool.ask_planner_batch
+
+    assistant = autogen.AssistantAgent(
+        name="assistant",
+        llm_config={
+            "temperature": 0,
+            "request_timeout": 600,
+            "seed": seed,
+            "model": model,
+            "config_list": config_list,
+            "functions": functions,
+        },
+    )
+
+    router = history = loops = None
+    if router_config_list and not cache_replay:
+        router = ModelRouter(router_config_list)
+        router.attach(assistant)
+        router.attach(planner, role_min_tier=1)
+    if not cache_replay:
+        history = HistoryCompactor(max_tokens=history_tokens, keep_recent=4)
+        history.attach(assistant)
+        ask_planner = history.wrap(ask_planner)
+
+    user_proxy = make_proxy(
+        name="user_proxy",
+        human_input_mode=human_input_mode,
+        max_consecutive_auto_reply=max_consecutive_auto_reply,
+        code_execution_config={"work_dir": work_dir},
+        function_map={"ask_planner": ask_planner, **function_map},
+    )
+    if not cache_replay:
+        loops = LoopDetector(max_repeats=loop_repeats, on_loop="escalate")
+        loops.attach(user_proxy)
+    if checkpoint is not None:
+        # attached last, so the turn is saved before the loop detector or anything else replies
+        checkpoint = ConversationCheckpoint(checkpoint).attach(user_proxy, assistant)
+    return AgentTeam(planner, planner_user, assistant, user_proxy, planner_pool, history, loops, router, checkpoint)
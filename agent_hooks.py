@@ -0,0 +1,54 @@
+"""
+*** Hooking the LLM Call ***
+Several of the helpers in this repo (the semantic cache, the router, tracing, ...) need to run code around the moment
+an agent asks the model for a reply. In autogen that moment is the generate_oai_reply entry in the agent's list of
+reply functions. wrap_llm_reply swaps that entry for a wrapper that receives the original as "inner". Wrappers
+stack: the wrapper registered last runs first and its inner is the previous wrapper.
+
+A wrapper looks like this. It must return (final, reply) just like a reply function:
+def my_wrapper(inner, recipient, messages, sender, config):
+    final, reply = inner()                       # or inner(messages=..., config=...) to change what is sent
+    return final, reply
+"""
+from autogen import ConversableAgent
+
+
+def _is_llm_reply(reply_func):
+    return reply_func is ConversableAgent.generate_oai_reply or getattr(reply_func, "llm_reply_hook", False)
+
+
+def wrap_llm_reply(agent, wrapper):
+    """Run wrapper(inner, recipient, messages, sender, config) in place of the agent's LLM reply function."""
+    for entry in agent._reply_func_list:
+        if _is_llm_reply(entry["reply_func"]):
+            break
+    else:
+        raise ValueError(f"{agent.name} has no LLM reply function to wrap")
+    previous = entry["reply_func"]
+
+    def reply_func(recipient, messages=None, sender=None, config=None):
+        def inner(messages=messages, sender=sender, config=config):
+            return previous(recipient, messages=messages, sender=sender, config=config)
+
+        if messages is None:
+            messages = recipient._oai_messages[sender]
+        return wrapper(inner, recipient, messages, sender, config)
+
+    reply_func.llm_reply_hook = True
+    reply_func.wrapped = previous
+    entry["reply_func"] = reply_func
+    return agent
+
+
+def unwrap_llm_reply(agent):
+    """Remove the most recently added wrapper."""
+    for entry in agent._reply_func_list:
+        if getattr(entry["reply_func"], "llm_reply_hook", False):
+            entry["reply_func"] = entry["reply_func"].wrapped
+            return agent
+    return agent
+
+
+def llm_messages(recipient, messages):
+    """The message list the model actually sees: system message(s) first, then the conversation."""
+    return recipient._oai_system_message + list(messages)
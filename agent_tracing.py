@@ -0,0 +1,208 @@
+"""
+*** Tracing Where the Time Goes ***
+A 15 minute initiate_chat doesn't say whether the time went to the assistant's LLM calls, to the ask_planner ->
+planner_user.initiate_chat(planner) chat nested inside a function call, or to running code in the work_dir. Tracer
+records a span for each of these, nested the way they happened:
+- chat       every initiate_chat, including the nested planner chats,
+- reply      every time an agent works out its reply,
+- llm        every LLM request: agent, model, prompt/completion tokens, cache hit or miss, cost,
+- function   every function call (ask_planner, ask_planner_batch, ...) and whether it succeeded,
+- code       every executed code block: agent, language, file, exit code.
+
+At exit the spans are written as Chrome trace events (open chrome://tracing or https://ui.perfetto.dev and load the
+file), and a per-agent summary table is printed. Recording a span costs a few microseconds, nothing compared to an LLM
+call, so it's fine to leave on. Threads (the planner pool) get their own tracks.
+
+example:
+tracer = Tracer().install()        # before initiate_chat; traces every agent, including ones created later
+...
+print(tracer.summary())            # also printed at exit, along with the trace file name
+"""
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+
+import openai
+from autogen import ChatCompletion, ConversableAgent
+
+
+class Tracer:
+    def __init__(self, path=None):
+        self.path = path or os.path.join("traces", time.strftime("trace-%Y%m%d-%H%M%S.json"))
+        self.events = []
+        self.thread_names = {}
+        self.pid = os.getpid()
+        self._t0 = time.perf_counter_ns()
+        self._local = threading.local()
+        self._originals = []
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name, cat, **args):
+        """Record a span around a block; args can be added to (the yielded dict) until it ends."""
+        stack = self._stack()
+        stack.append(args)
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            tid = threading.get_ident()
+            if tid not in self.thread_names:
+                self.thread_names[tid] = threading.current_thread().name
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": tid,
+                "ts": (start - self._t0) / 1000, "dur": (end - start) / 1000, "args": args,
+            })
+
+    def current_agent(self):
+        for args in reversed(self._stack()):
+            if "agent" in args:
+                return args["agent"]
+        return None
+
+    def _patch(self, owner, name, make):
+        original = owner.__dict__.get(name)  # None when inherited, e.g. ChatCompletion.create
+        self._originals.append((owner, name, original))
+        setattr(owner, name, make(getattr(owner, name)))
+
+    def install(self):
+        """Patch autogen (and openai, to tell cache hits from misses) and write the trace at exit."""
+        tracer = self
+
+        def traced_initiate_chat(initiate_chat):
+            def wrapper(self, recipient, *args, **kwargs):
+                with tracer.span(f"chat {self.name} -> {recipient.name}", "chat", agent=self.name):
+                    return initiate_chat(self, recipient, *args, **kwargs)
+
+            return wrapper
+
+        def traced_generate_reply(generate_reply):
+            def wrapper(self, messages=None, sender=None, **kwargs):
+                with tracer.span(f"{self.name} reply", "reply", agent=self.name,
+                                 sender=getattr(sender, "name", None)):
+                    return generate_reply(self, messages=messages, sender=sender, **kwargs)
+
+            return wrapper
+
+        def traced_create(create):
+            # autogen's create calls itself once per config_list entry; only the outer call gets a span
+            def wrapper(cls, *args, **kwargs):
+                if getattr(tracer._local, "in_llm", False):
+                    return create(*args, **kwargs)
+                tracer._local.in_llm, tracer._local.api_calls = True, 0
+                try:
+                    with tracer.span("llm", "llm", agent=tracer.current_agent()) as span:
+                        response = create(*args, **kwargs)
+                        usage = response.get("usage") or {}
+                        span.update(
+                            model=response.get("model"), prompt_tokens=usage.get("prompt_tokens", 0),
+                            completion_tokens=usage.get("completion_tokens", 0), cost=response.get("cost", 0),
+                            cache="miss" if tracer._local.api_calls else "hit",
+                        )
+                        return response
+                finally:
+                    tracer._local.in_llm = False
+
+            return classmethod(wrapper)
+
+        def counted_api_create(api_create):
+            def wrapper(cls, *args, **kwargs):
+                tracer._local.api_calls = getattr(tracer._local, "api_calls", 0) + 1
+                return api_create(*args, **kwargs)
+
+            return classmethod(wrapper)
+
+        def traced_execute_function(execute_function):
+            def wrapper(self, func_call):
+                name = func_call.get("name", "")
+                with tracer.span(f"function {name}", "function", agent=self.name, function=name) as span:
+                    success, result = execute_function(self, func_call)
+                    span["success"] = success
+                    return success, result
+
+            return wrapper
+
+        def traced_execute_code_blocks(execute_code_blocks):
+            def wrapper(self, code_blocks):
+                if "run_code" not in self.__dict__:
+                    # per instance, so run_code overrides that call super() still make one span per block
+                    self.run_code = tracer._traced_run_code(self, self.run_code)
+                return execute_code_blocks(self, code_blocks)
+
+            return wrapper
+
+        self._patch(ConversableAgent, "initiate_chat", traced_initiate_chat)
+        self._patch(ConversableAgent, "generate_reply", traced_generate_reply)
+        self._patch(ConversableAgent, "execute_function", traced_execute_function)
+        self._patch(ConversableAgent, "execute_code_blocks", traced_execute_code_blocks)
+        self._patch(ChatCompletion, "create", traced_create)
+        self._patch(openai.ChatCompletion, "create", counted_api_create)
+        atexit.register(self._finish)
+        return self
+
+    def _traced_run_code(self, agent, run_code):
+        def traced(code, **kwargs):
+            lang = kwargs.get("lang") or "python"
+            with self.span(f"code {lang}", "code", agent=agent.name, lang=lang, filename=kwargs.get("filename")) as span:
+                exitcode, logs, image = run_code(code, **kwargs)
+                span["exitcode"] = exitcode
+                return exitcode, logs, image
+
+        return traced
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._originals):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._originals.clear()
+
+    def export_chrome(self, path=None):
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        threads = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                   for tid, name in self.thread_names.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": threads + list(self.events), "displayTimeUnit": "ms"}, f)
+        return path
+
+    def summary(self):
+        """Per agent: LLM calls, function calls and code blocks with their time (inclusive of anything nested)."""
+        rows = {}
+        for event in list(self.events):
+            if event["cat"] not in ("llm", "function", "code"):
+                continue
+            row = rows.setdefault(event["args"].get("agent") or "-", {
+                "llm": 0, "llm_s": 0.0, "tokens": 0, "hits": 0, "function": 0, "function_s": 0.0, "code": 0,
+                "code_s": 0.0,
+            })
+            cat, seconds = event["cat"], event["dur"] / 1e6
+            row[cat] += 1
+            row[f"{cat}_s"] += seconds
+            if cat == "llm":
+                row["tokens"] += event["args"].get("prompt_tokens", 0) + event["args"].get("completion_tokens", 0)
+                row["hits"] += event["args"].get("cache") == "hit"
+        lines = [f"{'agent':<16} {'llm':>5} {'llm time':>9} {'tokens':>8} {'hits':>5} {'func':>5} {'func time':>9} "
+                 f"{'code':>5} {'code time':>9}"]
+        for agent, r in sorted(rows.items(), key=lambda item: -item[1]["llm_s"] - item[1]["code_s"]):
+            lines.append(
+                f"{agent[:16]:<16} {r['llm']:>5} {r['llm_s']:>8.1f}s {r['tokens']:>8} {r['hits']:>5} "
+                f"{r['function']:>5} {r['function_s']:>8.1f}s {r['code']:>5} {r['code_s']:>8.1f}s"
+            )
+        return "\n".join(lines)
+
+    def _finish(self):
+        if self.events:
+            print(f"Trace: {len(self.events)} spans written to {self.export_chrome()}")
+            print(self.summary())
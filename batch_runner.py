@@ -0,0 +1,180 @@
+"""
+*** Running Many Tasks Overnight ***
+The scripts run one hard-coded task each. batch_runner.py reads a task file and runs every task in its own worker
+process, with its own work_dir and a fresh set of agents from agent_factory.py. Nobody is around to answer
+questions, so human input is turned off. A task ends when the assistant says TERMINATE or the auto replies run out.
+
+The task file is either JSON lines, one task per line:
+{"id": "rescues-tx", "message": "Find dog fosters and rescues in Texas ...", "agents": {"seed": 1003}}
+or plain text with one task message per line. "agents" holds optional build_agents arguments for that task (model,
+seed, max_consecutive_auto_reply, ...).
+
+--workers caps how many tasks run at the same time. --max-llm-calls caps the LLM requests in flight across all of
+them (each task has its own planner pool on top). The workers share the LLM cache: autogen's per-seed diskcache is
+SQLite and safe to use from several processes, and --shared-cache switches them to .cache/shared (see
+llm_cache_manager.py). With many workers on one seed they queue up for the SQLite write lock; --cache-daemon sends
+them to a running cache_daemon.py instead, which also makes sure identical requests only reach the model once. Each task writes its output to batch/<id>/output.log, and one JSON result record (status,
+timing, turns, final message) is appended to batch/results.jsonl as it finishes. --skip-done leaves out the tasks that
+already finished successfully, so an interrupted batch can simply be started again. Every task saves a checkpoint after
+each turn (batch/<id>/checkpoint.jsonl, see conversation_checkpoint.py), and with --resume a task that was cut off
+continues from its last completed turn instead of starting over.
+
+python batch_runner.py tasks.jsonl --workers 4 --max-llm-calls 8
+python batch_runner.py states.txt --template "Find dog fosters and rescues in {}. Put them in a spreadsheet." --skip-done
+python batch_runner.py tasks.jsonl --skip-done --resume
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_AGENTS = {"human_input_mode": "NEVER", "sandbox": {"backend": "auto", "size": 1, "max_uses": 50}}
+
+_llm_slots = None  # per worker process: semaphore shared by all workers
+
+
+def load_tasks(path, template=None):
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                task = json.loads(line)  # a full task: its message is used as it is
+            elif template:
+                task = {"id": line, "message": template.format(line)}
+            else:
+                task = {"message": line}
+            task.setdefault("id", f"task-{len(tasks) + 1:04d}")
+            task["id"] = re.sub(r"[^\w.-]+", "-", str(task["id"])).strip("-")
+            tasks.append(task)
+    ids = [task["id"] for task in tasks]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate task ids: {', '.join(duplicates)}")
+    return tasks
+
+
+def finished_ids(results_path):
+    done = set()
+    if os.path.exists(results_path):
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+    return done
+
+
+def _init_worker(llm_slots, shared_cache, cache_daemon=None):
+    global _llm_slots
+    _llm_slots = llm_slots
+    if shared_cache:
+        from llm_cache_manager import use_shared_cache
+
+        use_shared_cache()
+    if cache_daemon:
+        from cache_daemon import use_cache_daemon
+
+        use_cache_daemon(cache_daemon)
+    if llm_slots is not None:
+        import openai
+
+        create = openai.ChatCompletion.create
+
+        def limited_create(cls, *args, **kwargs):
+            # only actual API requests take a slot; cache hits never get this far
+            with _llm_slots:
+                return create(*args, **kwargs)
+
+        openai.ChatCompletion.create = classmethod(limited_create)
+
+
+def run_task(task, out_dir, resume=False):
+    """Worker process: build fresh agents in the task's own directory and run the task."""
+    task_dir = os.path.abspath(os.path.join(out_dir, task["id"]))
+    os.makedirs(task_dir, exist_ok=True)
+    record = {"id": task["id"], "pid": os.getpid(), "work_dir": os.path.join(task_dir, "work"),
+              "log": os.path.join(task_dir, "output.log"), "started": time.time()}
+    checkpoint = os.path.join(task_dir, "checkpoint.jsonl")
+    start = time.perf_counter()
+    # the worker runs just this task and exits (max_tasks_per_child=1), so stdout and stderr stay on the log and the
+    # summaries the helpers print at exit end up there too
+    log = open(record["log"], "a" if resume else "w", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr = log
+    try:
+        from agent_factory import build_agents  # after the redirect, so autogen's log handler writes to the log
+
+        agents = dict(DEFAULT_AGENTS, work_dir=record["work_dir"], checkpoint=checkpoint, **task.get("agents", {}))
+        team = build_agents(**agents)
+        final = team.run(task["message"], resume=resume)
+        record["status"] = "ok"
+        record["turns"] = len(team.user_proxy.chat_messages[team.assistant])
+        record["final_message"] = (final or {}).get("content")
+    except Exception as e:
+        traceback.print_exc()
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["finished"] = time.time()
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many agent tasks in parallel worker processes")
+    parser.add_argument("tasks", help="JSON lines or plain text task file")
+    parser.add_argument("--template", help='format string applied to each plain-text line (not to JSON tasks), e.g. "Find rescues in {}"')
+    parser.add_argument("--workers", type=int, default=4, help="tasks running at the same time")
+    parser.add_argument("--max-llm-calls", type=int, default=0, help="LLM requests in flight across all workers (0 = no cap)")
+    parser.add_argument("--shared-cache", action="store_true", help="use the content-addressed shared LLM cache")
+    parser.add_argument("--cache-daemon", metavar="ADDRESS", help='use a running cache_daemon.py, e.g. "127.0.0.1:8377"')
+    parser.add_argument("--out-dir", default="batch", help="per-task directories go here")
+    parser.add_argument("--results", help="result records (default: <out-dir>/results.jsonl)")
+    parser.add_argument("--skip-done", action="store_true", help="skip tasks with an ok record in the results file")
+    parser.add_argument("--resume", action="store_true", help="continue interrupted tasks from their last checkpoint")
+    args = parser.parse_args()
+
+    results_path = args.results or os.path.join(args.out_dir, "results.jsonl")
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    tasks = load_tasks(args.tasks, args.template)
+    if args.skip_done:
+        done = finished_ids(results_path)
+        tasks = [task for task in tasks if task["id"] not in done]
+    print(f"{len(tasks)} tasks, {args.workers} workers", flush=True)
+
+    # spawn, so every worker starts clean instead of inheriting this process's imports and threads
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager() if args.max_llm_calls else None
+    llm_slots = manager.BoundedSemaphore(args.max_llm_calls) if manager else None
+    start = time.perf_counter()
+    counts = {"ok": 0, "error": 0}
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker,
+                             initargs=(llm_slots, args.shared_cache, args.cache_daemon),
+                             max_tasks_per_child=1) as executor:
+        futures = {executor.submit(run_task, task, args.out_dir, args.resume): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:  # the worker process itself died
+                record = {"id": task["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+            counts[record["status"]] += 1
+            with open(results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            print(f">>>>>>>> {record['id']}: {record['status']} in {record.get('seconds', 0):.1f}s "
+                  f"({counts['ok'] + counts['error']}/{len(tasks)})", flush=True)
+    if manager:
+        manager.shutdown()
+    print(f"{counts['ok']} ok, {counts['error']} failed in {time.perf_counter() - start:.1f}s; "
+          f"results in {results_path}")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
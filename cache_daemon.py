@@ -0,0 +1,466 @@
+"""
+*** One Cache for Many Processes ***
+The per-seed .cache/<seed>/cache.db files are SQLite. That's fine for one script, but when several scripts or
+batch_runner.py workers use the same seed they queue up for its write lock, and two workers that send the same request
+at the same time both pay for it. Nothing is shared with other machines either. cache_daemon.py runs the cache as a
+small server that any number of processes connect to over a socket:
+- one process owns the store (.cache/shared/cas.db, the content-addressed store from llm_cache_manager.py), so there
+  is no lock fight between the clients,
+- requests are looked up the same way as in the seed cache: by seed and autogen's cache key,
+- single flight: while one process is waiting for the model, others asking for the same request wait for its answer
+  instead of sending the request again,
+- get and put take whole batches of keys,
+- entries that are only in an old .cache/<seed>/cache.db are found there and copied over, like use_shared_cache().
+
+python cache_daemon.py serve                              # 127.0.0.1:8377, or --listen unix:.cache/daemon.sock
+python cache_daemon.py stats
+python cache_daemon.py bench --procs 8                    # the daemon against the seed cache file under contention
+
+and in the scripts, before starting a chat:
+from cache_daemon import use_cache_daemon
+use_cache_daemon("127.0.0.1:8377")                        # falls back to the normal seed cache if it isn't running
+
+Clients unpickle the responses they get back (autogen's cache does the same), so only listen on a network you trust.
+The daemon itself never unpickles anything.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import socket
+import socketserver
+import statistics
+import struct
+import tempfile
+import threading
+import time
+import types
+
+import diskcache
+
+from llm_cache_manager import CACHE_ROOT, SHARED_DIR, SharedStore
+
+DEFAULT_ADDRESS = "127.0.0.1:8377"
+LEASE_SECONDS = 300  # how long the others wait for a process that is asking the model, before one of them takes over
+MAX_FRAME = 256 * 1024 * 1024
+FRAME_HEADER = struct.Struct(">I")
+
+
+def parse_address(address):
+    """("unix", path) for "unix:<path>", otherwise ("tcp", (host, port)) for "host:port"."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+def send_frames(sock, header, blobs=()):
+    """A request or reply: a JSON header frame, then one frame per binary value."""
+    frames = [json.dumps(header).encode()] + list(blobs)
+    sock.sendall(b"".join(FRAME_HEADER.pack(len(frame)) + frame for frame in frames))
+
+
+def _recv_exact(sock_file, size):
+    data = sock_file.read(size)
+    if len(data) < size:
+        raise ConnectionError("connection closed")
+    return data
+
+
+def recv_frame(sock_file):
+    (size,) = FRAME_HEADER.unpack(_recv_exact(sock_file, FRAME_HEADER.size))
+    if size > MAX_FRAME:
+        raise ValueError(f"frame of {size} bytes is too large")
+    return _recv_exact(sock_file, size)
+
+
+class CacheServer:
+    """The store, the legacy seed files and the single-flight leases, shared by all connections."""
+
+    def __init__(self, db_path=os.path.join(CACHE_ROOT, SHARED_DIR, "cas.db"), root=CACHE_ROOT,
+                 lease_seconds=LEASE_SECONDS):
+        self.store = SharedStore(db_path)
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.cond = threading.Condition()  # guards the store, the leases and the stats
+        self.leases = {}  # (seed, key) -> (connection id, expiry time)
+        self._legacy = {}  # seed -> diskcache.Cache of .cache/<seed>, or None
+        self.stats = {"connections": 0, "gets": 0, "hits": 0, "misses": 0, "coalesced": 0, "puts": 0,
+                      "batches": 0, "expired_leases": 0}
+
+    def _legacy_get(self, seed, key):
+        if seed not in self._legacy:
+            path = os.path.join(self.root, seed, "cache.db")
+            # diskcache also reads the responses it keeps in files next to cache.db instead of in the table
+            self._legacy[seed] = diskcache.Cache(os.path.dirname(path)) if os.path.exists(path) else None
+        if self._legacy[seed] is None:
+            return None
+        response = self._legacy[seed].get(key)
+        if response is None:
+            return None
+        value = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        self.store.put(seed, key, value)
+        return value
+
+    def _lookup(self, seed, key):
+        value = self.store.get(seed, key)
+        return self._legacy_get(seed, key) if value is None else value
+
+    def get(self, conn_id, seed, keys, single_flight=True):
+        """Per key: ("hit", value), ("lease", None) when the caller should ask the model, or ("miss", None).
+
+        The whole batch is looked at without blocking first. If another connection is asking the model for one of
+        the keys, the batch waits for it without holding any leases, then looks again; so two batches that share
+        keys in a different order can't end up waiting on each other."""
+        with self.cond:
+            self.stats["batches"] += 1
+            self.stats["gets"] += len(keys)
+            waited = False
+            while True:
+                results, wanted, busy_until = [], [], None
+                now = time.time()
+                for key in keys:
+                    value = self._lookup(seed, key)
+                    if value is not None:
+                        results.append(("hit", value))
+                        continue
+                    if not single_flight:
+                        results.append(("miss", None))
+                        continue
+                    owner, expires = self.leases.get((seed, key), (None, 0))
+                    if owner is not None and owner != conn_id and expires > now:
+                        busy_until = expires if busy_until is None else min(busy_until, expires)
+                    wanted.append((key, owner))
+                    results.append(("lease", None))
+                if busy_until is None:
+                    break
+                waited = True
+                self.cond.wait(busy_until - now)
+            for key, owner in wanted:
+                self.stats["expired_leases"] += owner is not None and owner != conn_id
+                self.leases[(seed, key)] = (conn_id, now + self.lease_seconds)
+            hits = sum(status == "hit" for status, _ in results)
+            self.stats["hits"] += hits
+            self.stats["coalesced"] += hits if waited else 0
+            self.stats["misses"] += len(keys) - hits
+        return results
+
+    def put(self, conn_id, seed, items):
+        with self.cond:
+            self.stats["batches"] += 1
+            self.store.db.execute("BEGIN")
+            for key, value in items:
+                self.store.put(seed, key, value)
+                self.leases.pop((seed, key), None)
+            self.store.db.execute("COMMIT")
+            self.stats["puts"] += len(items)
+            self.cond.notify_all()
+
+    def release(self, conn_id, seed=None, keys=None):
+        """Give up leases (all of the connection's when keys is None), so a waiting process can take over."""
+        with self.cond:
+            doomed = [k for k, (owner, _) in self.leases.items()
+                      if owner == conn_id and (keys is None or (k[0] == seed and k[1] in keys))]
+            for k in doomed:
+                del self.leases[k]
+            if doomed:
+                self.cond.notify_all()
+
+    def report(self):
+        with self.cond:
+            return dict(self.stats, leases=len(self.leases), **self.store.stats())
+
+    def close(self):
+        self.store.close()
+        for legacy in self._legacy.values():
+            if legacy is not None:
+                legacy.close()
+
+
+def make_handler(cache):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            conn_id = id(self)
+            with cache.cond:
+                cache.stats["connections"] += 1
+            try:
+                while True:
+                    try:
+                        request = json.loads(recv_frame(self.rfile))
+                    except ConnectionError:
+                        return
+                    op, seed, keys = request.get("op"), str(request.get("seed")), request.get("keys") or []
+                    if op == "get":
+                        results = cache.get(conn_id, seed, keys, request.get("single_flight", True))
+                        send_frames(self.connection, {"status": [status for status, _ in results]},
+                                    [value for status, value in results if status == "hit"])
+                    elif op == "put":
+                        values = [recv_frame(self.rfile) for _ in keys]
+                        cache.put(conn_id, seed, list(zip(keys, values)))
+                        send_frames(self.connection, {"stored": len(values)})
+                    elif op == "release":
+                        cache.release(conn_id, seed, set(keys))
+                        send_frames(self.connection, {"released": True})
+                    elif op == "stats":
+                        send_frames(self.connection, cache.report())
+                    else:
+                        send_frames(self.connection, {"error": f"unknown op {op!r}"})
+            finally:
+                cache.release(conn_id)  # a client that died mid-request doesn't keep the others waiting
+
+    return Handler
+
+
+def start_server(address=DEFAULT_ADDRESS, **cache_options):
+    """Create the daemon's server (not started yet). Returns (server, address it listens on)."""
+    cache = CacheServer(**cache_options)
+    kind, target = parse_address(address)
+    if kind == "unix":
+        if os.path.exists(target):
+            os.remove(target)  # left over from a daemon that didn't shut down cleanly
+        server_class = type("Server", (socketserver.ThreadingMixIn, socketserver.UnixStreamServer),
+                            {"daemon_threads": True})
+        server = server_class(target, make_handler(cache))
+    else:
+        server_class = type("Server", (socketserver.ThreadingMixIn, socketserver.TCPServer),
+                            {"daemon_threads": True, "allow_reuse_address": True})
+        server = server_class(target, make_handler(cache))
+        address = f"{server.server_address[0]}:{server.server_address[1]}"
+    server.cache = cache
+    return server, address
+
+
+def serve_in_background(address="127.0.0.1:0", **cache_options):
+    """Run a daemon on a thread (port 0 picks a free port). Returns (server, address)."""
+    server, address = start_server(address, **cache_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, address
+
+
+class DaemonClient:
+    """Talks to the daemon; one connection per thread, so a thread waiting on single flight doesn't block the rest."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=LEASE_SECONDS + 60):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            kind, target = parse_address(self.address)
+            sock = socket.socket(socket.AF_UNIX if kind == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+            if kind == "tcp":
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self._local.conn = (sock, sock.makefile("rb"))
+        return conn
+
+    def _call(self, header, blobs=()):
+        sock, rfile = self._connection()
+        try:
+            send_frames(sock, header, blobs)
+            return json.loads(recv_frame(rfile)), rfile
+        except (OSError, ValueError):
+            self.close()
+            raise
+
+    def get_many(self, seed, keys, single_flight=True):
+        """Pickled values for the keys (None for a miss) and the keys this client now holds the lease for."""
+        reply, rfile = self._call({"op": "get", "seed": str(seed), "keys": list(keys), "single_flight": single_flight})
+        values, leased = [], []
+        for key, status in zip(keys, reply["status"]):
+            values.append(recv_frame(rfile) if status == "hit" else None)
+            if status == "lease":
+                leased.append(key)
+        return values, leased
+
+    def put_many(self, seed, items):
+        items = list(items)
+        reply, _ = self._call({"op": "put", "seed": str(seed), "keys": [key for key, _ in items]},
+                              [value for _, value in items])
+        return reply["stored"]
+
+    def release(self, seed, keys):
+        self._call({"op": "release", "seed": str(seed), "keys": list(keys)})
+
+    def stats(self):
+        return self._call({"op": "stats"})[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn[1].close()
+            conn[0].close()
+
+
+class DaemonCache:
+    """Stand-in for diskcache.Cache(".cache/<seed>") that asks the daemon.
+
+    A miss takes the lease for that request: autogen asks the model and set() hands the answer to everyone who is
+    waiting for it. If the request fails instead, close() (the end of autogen's "with" block) gives the lease up.
+    """
+
+    client = None  # set by use_cache_daemon
+
+    def __init__(self, directory):
+        self.seed = os.path.basename(os.path.normpath(directory))
+        self._leased = set()
+
+    def get(self, key, default=None):
+        values, leased = self.client.get_many(self.seed, [key])
+        self._leased.update(leased)
+        return default if values[0] is None else pickle.loads(values[0])
+
+    def set(self, key, value):
+        self.client.put_many(self.seed, [(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))])
+        self._leased.discard(key)
+        return True
+
+    def close(self):
+        if self._leased:
+            self.client.release(self.seed, self._leased)
+            self._leased.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def use_cache_daemon(address=None, fallback=True):
+    """Point autogen's completion cache at the daemon (address defaults to $AUTOGEN_CACHE_DAEMON or 127.0.0.1:8377).
+
+    Returns False, and leaves the seed cache in place, when the daemon can't be reached and fallback is set."""
+    from autogen.oai import completion
+
+    client = DaemonClient(address or os.environ.get("AUTOGEN_CACHE_DAEMON", DEFAULT_ADDRESS))
+    try:
+        client.stats()
+    except OSError as e:
+        if not fallback:
+            raise
+        print(f"cache daemon at {client.address} is not reachable ({e}), using the seed cache files")
+        return False
+    DaemonCache.client = client
+    completion.diskcache = types.SimpleNamespace(Cache=DaemonCache)
+    return True
+
+
+def _bench_worker(backend, target, worker, ops, keys, write_every, model_seconds, results):
+    """One contending process: read keys, write every write_every-th one, ask the 'model' on a miss."""
+    import diskcache
+
+    if backend == "daemon":
+        DaemonCache.client = DaemonClient(target)
+        open_cache = DaemonCache
+    else:
+        open_cache = diskcache.Cache
+    latencies, model_calls, errors = [], 0, 0
+    for i in range(ops):
+        key = keys[(worker * 7919 + i) % len(keys)]
+        start = time.perf_counter()
+        try:
+            with open_cache(target if backend == "sqlite" else os.path.join(CACHE_ROOT, "bench")) as cache:
+                value = cache.get(key, None)
+                if value is None or i % write_every == 0:
+                    if value is None:
+                        model_calls += 1
+                        time.sleep(model_seconds)
+                    cache.set(key, {"answer": key, "worker": worker, "padding": "x" * 2000})
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, model_calls, errors))
+
+
+def _run_bench(backend, target, procs, ops, keys, write_every, model_seconds):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_bench_worker,
+                               args=(backend, target, w, ops, keys, write_every, model_seconds, results))
+               for w in range(procs)]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    collected = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    wall = time.perf_counter() - start
+    latencies = sorted(x for lat, _, _ in collected for x in lat)
+    return {
+        "backend": backend, "wall": wall, "ops": len(latencies), "ops_per_s": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000, "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "model_calls": sum(calls for _, calls, _ in collected), "errors": sum(errs for _, _, errs in collected),
+    }
+
+
+def benchmark(procs=8, ops=500, distinct=200, write_every=5, model_seconds=0.05):
+    """The seed cache file and the daemon under the same load from procs processes, on the same key set."""
+    keys = [json.dumps({"model": "gpt-4", "messages": [{"role": "user", "content": f"question {i}"}]})
+            for i in range(distinct)]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rows.append(_run_bench("sqlite", os.path.join(tmp, "bench"), procs, ops, keys, write_every, model_seconds))
+        # a root of its own, or the daemon would find everything in the file the sqlite run just filled
+        daemon_root = os.path.join(tmp, "daemon")
+        server, address = serve_in_background(db_path=os.path.join(daemon_root, "cas.db"), root=daemon_root)
+        rows.append(_run_bench("daemon", address, procs, ops, keys, write_every, model_seconds))
+        stats = server.cache.report()
+        server.shutdown()
+        server.server_close()
+        server.cache.close()
+    print(f"{procs} processes x {ops} requests over {distinct} distinct keys, every {write_every}th one written, "
+          f"{model_seconds * 1000:.0f} ms per model call on a miss")
+    print(f"{'backend':<8} {'wall':>7} {'ops/s':>8} {'p50':>8} {'p99':>8} {'model calls':>12} {'errors':>7}")
+    for r in rows:
+        print(f"{r['backend']:<8} {r['wall']:>6.2f}s {r['ops_per_s']:>8.0f} {r['p50_ms']:>6.2f}ms {r['p99_ms']:>6.2f}ms "
+              f"{r['model_calls']:>12} {r['errors']:>7}")
+    print(f"daemon: {stats['hits']} hits, {stats['misses']} misses, {stats['coalesced']} requests answered by "
+          f"another process's model call, {stats['batches']} round trips")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the LLM cache to many processes over a socket")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve")
+    serve.add_argument("--listen", default=DEFAULT_ADDRESS, help='"host:port" or "unix:<path>"')
+    serve.add_argument("--root", default=CACHE_ROOT, help="where the old per-seed cache files are")
+    serve.add_argument("--db", help="the shared store (default: <root>/shared/cas.db)")
+    serve.add_argument("--lease", type=float, default=LEASE_SECONDS,
+                       help="seconds others wait for a process asking the model before one of them asks again")
+    stats = commands.add_parser("stats")
+    stats.add_argument("--address", default=os.environ.get("AUTOGEN_CACHE_DAEMON", DEFAULT_ADDRESS))
+    bench = commands.add_parser("bench", help="compare the daemon with a seed cache file under contention")
+    bench.add_argument("--procs", type=int, default=8)
+    bench.add_argument("--ops", type=int, default=500, help="requests per process")
+    bench.add_argument("--distinct", type=int, default=200, help="distinct cache keys")
+    bench.add_argument("--write-every", type=int, default=5, help="also write every n-th request")
+    bench.add_argument("--model-ms", type=float, default=50, help="time a 'model call' takes on a miss")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server, address = start_server(args.listen, db_path=args.db or os.path.join(args.root, SHARED_DIR, "cas.db"),
+                                       root=args.root, lease_seconds=args.lease)
+        print(f"LLM cache daemon listening on {address}, store {server.cache.store.path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(json.dumps(server.cache.report()))
+            server.cache.close()
+    elif args.command == "stats":
+        print(json.dumps(DaemonClient(args.address).stats(), indent=2))
+    elif args.command == "bench":
+        benchmark(args.procs, args.ops, args.distinct, args.write_every, args.model_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+*** Container Pool ***
+When Docker is available and use_docker is left at its default, autogen starts a brand new container for every code
+block, waits for it to exit, commits it to an image and removes it. On a long planner loop that start/commit/remove
+cycle costs more than the code itself. The SandboxManager here keeps a small pool of long-lived containers per
+work_dir instead. The work_dir is mounted once when a container starts, and each block runs inside it with
+"docker exec". A container is replaced when a block times out or the exec fails, or after max_uses blocks. Before a
+healthy container is replaced it is committed to an image, so anything the agent pip installed carries over, just
+like autogen's own image chaining.
+
+There is also a "local" backend with the same interface that runs blocks as plain processes in the work_dir. Use it
+when no Docker daemon is running, or to test the pool. backend="auto" picks docker when the daemon answers and
+local otherwise, which is the same fallback autogen uses.
+
+Agents that share a work_dir share its pool. Use it by swapping UserProxyAgent for SandboxUserProxyAgent:
+example:
+planner_user = SandboxUserProxyAgent(
+    name="planner_user",
+    code_execution_config={"work_dir": "planning"},
+    sandbox={"backend": "auto", "size": 2, "max_uses": 50},
+)
+"""
+import atexit
+import hashlib
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import autogen
+
+DEFAULT_IMAGE = "python:3-slim"
+TIMEOUT_MSG = "Timeout"
+TIMEOUT_EXIT = 124  # exit code of coreutils' timeout(1); only means a timeout if the time actually ran out
+LANG_COMMANDS = {"python": "python", "sh": "sh", "shell": "sh", "bash": "bash"}
+
+
+class SandboxError(Exception):
+    """The sandbox itself failed (as opposed to the code inside it)."""
+
+
+class DockerBackend:
+    """Long-lived containers with the work_dir mounted at /workspace; blocks run through docker exec."""
+
+    name = "docker"
+
+    def __init__(self, work_dir, image=DEFAULT_IMAGE):
+        import docker
+
+        self.docker = docker
+        self.client = docker.from_env()
+        self.work_dir = work_dir
+        self.image = image
+        self.commits = 0
+
+    def start(self):
+        try:
+            self.client.images.get(self.image)
+        except self.docker.errors.ImageNotFound:
+            print("Pulling image", self.image)
+            self.client.images.pull(self.image)
+        return self.client.containers.run(
+            self.image,
+            command=["sleep", "infinity"],
+            working_dir="/workspace",
+            detach=True,
+            volumes={self.work_dir: {"bind": "/workspace", "mode": "rw"}},
+        )
+
+    def exec(self, container, command, timeout):
+        """Returns (exit code, output, timed out)."""
+        start = time.monotonic()
+        try:
+            exit_code, output = container.exec_run(["timeout", str(int(timeout)), *command], workdir="/workspace")
+        except self.docker.errors.DockerException as e:
+            raise SandboxError(str(e)) from e
+        # a script may exit with 124 itself; timeout(1) only does so once the time is up
+        timed_out = exit_code == TIMEOUT_EXIT and time.monotonic() - start >= int(timeout)
+        return exit_code, output.decode("utf-8", errors="replace"), timed_out
+
+    def stop(self, container, keep_state=False):
+        try:
+            if keep_state:
+                # carry installed packages over to the replacement container
+                self.commits += 1
+                tag = f"{os.path.basename(self.work_dir)}-{self.commits}".lower()
+                container.commit(repository="python", tag=tag)
+                self.image = f"python:{tag}"
+            container.remove(force=True)
+        except self.docker.errors.DockerException:
+            pass
+
+
+class LocalBackend:
+    """Stand-in for DockerBackend that runs blocks as local processes in the work_dir. No isolation."""
+
+    name = "local"
+
+    def __init__(self, work_dir, image=None):
+        self.work_dir = work_dir
+        self.image = None
+
+    def start(self):
+        return {"started": time.time()}
+
+    def exec(self, sandbox, command, timeout):
+        """Returns (exit code, output, timed out)."""
+        if command[0] == "python":
+            command = [sys.executable, *command[1:]]
+        try:
+            result = subprocess.run(
+                command, cwd=self.work_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            return TIMEOUT_EXIT, TIMEOUT_MSG, True
+        except OSError as e:
+            raise SandboxError(str(e)) from e
+        return result.returncode, result.stdout, False
+
+    def stop(self, sandbox, keep_state=False):
+        pass
+
+
+BACKENDS = {"docker": DockerBackend, "local": LocalBackend}
+
+
+def docker_available():
+    try:
+        import docker
+
+        docker.from_env().ping()
+        return True
+    except Exception:
+        return False
+
+
+class SandboxManager:
+    """A pool of sandboxes for one work_dir. Use SandboxManager.for_work_dir to share pools between agents."""
+
+    _managers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, work_dir, backend="auto", size=2, max_uses=50, timeout=600, image=DEFAULT_IMAGE):
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
+        if backend == "auto":
+            backend = "docker" if docker_available() else "local"
+        self.backend = BACKENDS[backend](self.work_dir, image)
+        self.size = size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.latencies = []
+        self.started = 0
+        self.recycled = 0
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._count_lock = threading.Lock()
+        atexit.register(self._finish)
+
+    @classmethod
+    def for_work_dir(cls, work_dir, **kwargs):
+        """Return the shared manager for work_dir, creating it on first use."""
+        key = os.path.abspath(work_dir)
+        with cls._lock:
+            if key not in cls._managers:
+                cls._managers[key] = cls(work_dir, **kwargs)
+            return cls._managers[key]
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._count_lock:
+                start_new = self.started - self.recycled < self.size
+                if start_new:
+                    self.started += 1
+            if start_new:
+                break
+            try:
+                # wait for a sandbox to come back, but look at the capacity again every second: a recycled sandbox
+                # or a failed start frees a slot without putting anything in the queue
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+        try:
+            sandbox = self.backend.start()
+        except Exception:
+            with self._count_lock:
+                self.started -= 1
+            raise
+        self._uses[id(sandbox)] = 0
+        return sandbox
+
+    def _release(self, sandbox, healthy):
+        uses = self._uses.get(id(sandbox), 0)
+        if healthy and uses < self.max_uses:
+            self._idle.put(sandbox)
+            return
+        self._uses.pop(id(sandbox), None)
+        self.backend.stop(sandbox, keep_state=healthy)
+        with self._count_lock:
+            self.recycled += 1
+
+    def run(self, code, lang="python", filename=None, timeout=None):
+        """Run a code block in a pooled sandbox. Returns (exitcode, logs, seconds)."""
+        if lang not in LANG_COMMANDS:
+            raise NotImplementedError(f"{lang} not recognized in code execution")
+        timeout = timeout or self.timeout
+        original_filename = filename
+        if filename is None:
+            extension = "py" if lang == "python" else lang
+            filename = f"tmp_code_{hashlib.md5(code.encode()).hexdigest()}.{extension}"
+        path = os.path.join(self.work_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        start = time.perf_counter()
+        sandbox = self._acquire()
+        self._uses[id(sandbox)] = self._uses.get(id(sandbox), 0) + 1
+        healthy = False
+        try:
+            exitcode, logs, timed_out = self.backend.exec(sandbox, [LANG_COMMANDS[lang], filename], timeout)
+            if timed_out:
+                exitcode, logs = 1, TIMEOUT_MSG
+            else:
+                healthy = True
+        except SandboxError as e:
+            exitcode, logs = 1, f"Sandbox error: {e}"
+        finally:
+            self._release(sandbox, healthy)
+            if original_filename is None:
+                os.remove(path)
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        return exitcode, logs.replace(f"/workspace/{filename}", "").replace(path, ""), elapsed
+
+    def report(self):
+        if not self.latencies:
+            return f"Sandbox pool {self.work_dir} ({self.backend.name}): no code blocks run"
+        total = sum(self.latencies)
+        return (
+            f"Sandbox pool {self.work_dir} ({self.backend.name}): {len(self.latencies)} blocks, "
+            f"{total:.2f}s total, {total / len(self.latencies):.2f}s mean, {max(self.latencies):.2f}s max, "
+            f"{self.started} sandboxes started, {self.recycled} recycled"
+        )
+
+    def close(self):
+        while not self._idle.empty():
+            self.backend.stop(self._idle.get())
+
+    def _finish(self):
+        if self.latencies:
+            print(self.report())
+        self.close()
+
+
+class SandboxUserProxyAgent(autogen.UserProxyAgent):
+    """UserProxyAgent that runs python and shell blocks in the shared SandboxManager for its work_dir."""
+
+    def __init__(self, *args, sandbox=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        work_dir = (self._code_execution_config or {}).get("work_dir") or "extensions"
+        self.sandbox = SandboxManager.for_work_dir(work_dir, **(sandbox or {}))
+
+    def run_code(self, code, **kwargs):
+        lang = kwargs.get("lang", "python")
+        if lang not in LANG_COMMANDS:
+            return super().run_code(code, **kwargs)
+        exitcode, logs, elapsed = self.sandbox.run(code, lang, kwargs.get("filename"), kwargs.get("timeout"))
+        print(f"\n>>>>>>>> SANDBOX ({self.sandbox.backend.name}) ran the block in {elapsed:.2f}s", flush=True)
+        return exitcode, logs, self.sandbox.backend.image
@@ -0,0 +1,247 @@
+"""
+*** Picking Up Where a Conversation Stopped ***
+If the script dies at turn 8 of 10 (the network drops, a code block runs out of memory, you press Ctrl-C), everything
+is gone. Running it again replays every turn, and only the LLM calls the .cache happens to have come back cheaply;
+the code is run again either way. ConversationCheckpoint saves the state of the conversation every time one of the
+agents is about to reply:
+- every agent's message history,
+- the consecutive auto reply counters,
+- the files in the agents' work_dir (name, size and modification time),
+- the function call waiting to be run, if there is one (e.g. ask_planner).
+
+The checkpoint file is a journal: each turn appends one JSON line with only what changed since the turn before, so
+saving stays cheap however long the conversation gets, and a line cut off by a crash is simply ignored. resume() reads
+the journal back into the agents and lets the agent whose turn it was reply, so the conversation continues from the
+last completed turn. A pending function call is run again, and files in the work_dir that changed or disappeared since
+the checkpoint are listed. The time it takes to resume is printed.
+
+example:
+checkpoint = ConversationCheckpoint(".cache/checkpoints/wiki.jsonl")
+checkpoint.attach(user_proxy, assistant)      # the agents of the top level conversation, not the planner's
+if "--resume" in sys.argv and checkpoint.resumable():
+    checkpoint.resume()                       # a conversation that already finished isn't started again
+else:
+    user_proxy.initiate_chat(assistant, message="...")
+    checkpoint.finish()
+"""
+import atexit
+import json
+import os
+import time
+
+from autogen import Agent
+
+
+def work_dir_manifest(work_dir):
+    """{relative path: [size, mtime_ns]} for every file under work_dir."""
+    manifest = {}
+    for root, dirs, files in os.walk(work_dir):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed while we were looking
+            manifest[os.path.relpath(path, work_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return manifest
+
+
+def pending_function_call(messages):
+    """The function call in the last message, if it hasn't been answered yet."""
+    if messages and messages[-1].get("function_call"):
+        return messages[-1]["function_call"]
+    return None
+
+
+class ConversationCheckpoint:
+    def __init__(self, path, log=True):
+        self.path = path
+        self.log = log
+        self.agents = {}  # name -> agent
+        self.turn = 0
+        self.finished = False
+        self._saved = {}  # (agent, partner) -> number of messages already in the journal
+        self._counters = {}  # (agent, partner) -> consecutive auto reply counter in the journal
+        self._manifests = {}  # work_dir -> manifest in the journal
+        self._file = None
+        self._append = False  # a resumed conversation carries on with the old journal
+        self.stats = {"snapshots": 0, "seconds": 0.0, "bytes": 0, "resume_seconds": None, "resume_turn": None}
+        atexit.register(lambda: print(self.report()) if self.stats["snapshots"] or self.stats["resume_turn"] else None)
+
+    def attach(self, *agents):
+        """Save a checkpoint whenever one of these agents is about to reply to another one of them."""
+        for agent in agents:
+            if self.agents.get(agent.name, agent) is not agent:
+                raise ValueError(f"two agents are called {agent.name}, checkpoints need unique names")
+            self.agents[agent.name] = agent
+            # a bound method rather than config=self: autogen keeps a copy of config per agent, and all of them have to
+            # write to the same journal
+            agent.register_reply([Agent, None], self._reply_func)
+        return self
+
+    def _reply_func(self, recipient, messages=None, sender=None, config=None):
+        if sender is not None and self.agents.get(sender.name) is sender:
+            self.snapshot(recipient, sender)
+        return False, None
+
+    def _work_dirs(self):
+        dirs = set()
+        for agent in self.agents.values():
+            config = getattr(agent, "_code_execution_config", False)
+            if isinstance(config, dict) and config.get("work_dir"):
+                dirs.add(config["work_dir"])
+        return sorted(dirs)
+
+    def snapshot(self, recipient, sender):
+        """Append what changed since the last checkpoint; recipient is about to reply to sender."""
+        start = time.perf_counter()
+        messages, counters = {}, {}
+        for name, agent in self.agents.items():
+            for partner, history in agent._oai_messages.items():
+                if self.agents.get(partner.name) is not partner:
+                    continue
+                key = (name, partner.name)
+                saved = self._saved.get(key, 0)
+                if len(history) < saved:  # the history was cleared, e.g. by a new initiate_chat
+                    saved = 0
+                if len(history) > saved or saved != self._saved.get(key, 0):
+                    messages.setdefault(name, {})[partner.name] = [saved, history[saved:]]
+                    self._saved[key] = len(history)
+                counter = agent._consecutive_auto_reply_counter[partner]
+                if self._counters.get(key) != counter:
+                    counters.setdefault(name, {})[partner.name] = self._counters[key] = counter
+        files = {}
+        for work_dir in self._work_dirs():
+            manifest, before = work_dir_manifest(work_dir), self._manifests.get(work_dir, {})
+            changed = {path: entry for path, entry in manifest.items() if before.get(path) != entry}
+            removed = [path for path in before if path not in manifest]
+            if changed or removed:
+                files[work_dir] = {"changed": changed, "removed": removed}
+            self._manifests[work_dir] = manifest
+        self.turn += 1
+        record = {
+            "turn": self.turn, "time": time.time(), "next": [recipient.name, sender.name], "messages": messages,
+            "counters": counters, "files": files,
+            "pending_function_call": pending_function_call(recipient._oai_messages[sender]),
+        }
+        self._write(record)
+        self.stats["snapshots"] += 1
+        self.stats["seconds"] += time.perf_counter() - start
+
+    def _write(self, record):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a" if self._append else "w", encoding="utf-8")
+        line = json.dumps(record, default=str) + "\n"
+        self._file.write(line)
+        self._file.flush()  # enough to survive the process dying; a power cut may lose the last turn
+        self.stats["bytes"] += len(line)
+
+    def finish(self):
+        """Mark the conversation as finished, so resume() doesn't start it again."""
+        if self.turn:
+            self.finished = True
+            self._write({"turn": self.turn, "time": time.time(), "finished": True})
+
+    def load(self):
+        """Read the journal back: the state after the last complete line."""
+        state = {"turn": 0, "next": None, "messages": {}, "counters": {}, "files": {}, "pending_function_call": None,
+                 "finished": False, "size": 0}
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                record = json.loads(line) if line.endswith(b"\n") else None
+            except json.JSONDecodeError:
+                record = None
+            if record is None:
+                break  # the process died while writing this line
+            state["size"] += len(line)
+            if record.get("finished"):
+                state["finished"] = True
+                continue
+            state["finished"] = False
+            state["turn"], state["next"] = record["turn"], record["next"]
+            state["pending_function_call"] = record["pending_function_call"]
+            for name, partners in record["messages"].items():
+                for partner, (saved, new) in partners.items():
+                    history = state["messages"].setdefault(name, {}).setdefault(partner, [])
+                    del history[saved:]
+                    history.extend(new)
+            for name, partners in record["counters"].items():
+                state["counters"].setdefault(name, {}).update(partners)
+            for work_dir, change in record["files"].items():
+                manifest = state["files"].setdefault(work_dir, {})
+                manifest.update(change["changed"])
+                for path in change["removed"]:
+                    manifest.pop(path, None)
+        return state
+
+    def resumable(self):
+        return self.load()["next"] is not None
+
+    def resume(self):
+        """Restore the agents from the journal and continue the conversation from the last completed turn."""
+        start = time.perf_counter()
+        state = self.load()
+        if state["next"] is None:
+            raise ValueError(f"{self.path} has no checkpoint to resume from")
+        recipient, sender = (self.agents.get(name) for name in state["next"])
+        if recipient is None or sender is None:
+            raise ValueError(f"the checkpoint continues with {' and '.join(state['next'])}, attach those agents first")
+        for name, partners in state["messages"].items():
+            for partner, history in partners.items():
+                if name in self.agents and partner in self.agents:
+                    self.agents[name]._oai_messages[self.agents[partner]] = history
+                    self._saved[(name, partner)] = len(history)
+        for name, partners in state["counters"].items():
+            for partner, counter in partners.items():
+                if name in self.agents and partner in self.agents:
+                    self.agents[name]._consecutive_auto_reply_counter[self.agents[partner]] = counter
+                    self._counters[(name, partner)] = counter
+        # what initiate_chat would have set up between the two
+        recipient.reply_at_receive[sender] = sender.reply_at_receive[recipient] = True
+        self._manifests = {work_dir: dict(manifest) for work_dir, manifest in state["files"].items()}
+        self.turn = state["turn"]
+        self.finished = state["finished"]
+        self._append = True
+        with open(self.path, "r+b") as f:
+            f.truncate(state["size"])  # drop a line cut off by the crash, so the next ones start on a line of their own
+        self.stats["resume_seconds"] = time.perf_counter() - start
+        self.stats["resume_turn"] = self.turn
+        if self.log:
+            count = sum(len(history) for partners in state["messages"].values() for history in partners.values())
+            print(f"\n>>>>>>>> RESUME turn {self.turn} ({count} messages) in "
+                  f"{self.stats['resume_seconds'] * 1000:.1f} ms: {recipient.name} replies to {sender.name}", flush=True)
+            self._report_files(state["files"])
+            if state["pending_function_call"]:
+                print(f">>>>>>>> RESUME running {state['pending_function_call'].get('name')} again", flush=True)
+        if state["finished"]:
+            print(f">>>>>>>> RESUME the conversation in {self.path} already finished", flush=True)
+            return recipient.last_message(sender)
+        reply = recipient.generate_reply(sender=sender)
+        if reply is not None:
+            recipient.send(reply, sender)
+        self.finish()
+        return recipient.last_message(sender)
+
+    def _report_files(self, manifests):
+        for work_dir, manifest in manifests.items():
+            current = work_dir_manifest(work_dir)
+            missing = [path for path in manifest if path not in current]
+            changed = [path for path in manifest if path in current and current[path] != manifest[path]]
+            for label, paths in (("missing", missing), ("changed", changed)):
+                if paths:
+                    print(f">>>>>>>> RESUME {len(paths)} files in {work_dir} {label} since the checkpoint: "
+                          f"{', '.join(sorted(paths)[:5])}{' ...' if len(paths) > 5 else ''}", flush=True)
+
+    def report(self):
+        s = self.stats
+        lines = [f"Checkpoints: {s['snapshots']} saved to {self.path}, {s['bytes'] / 1024:.1f} KiB, "
+                 f"{s['seconds'] / max(s['snapshots'], 1) * 1000:.2f} ms each"]
+        if s["resume_seconds"] is not None:
+            lines.append(f"  resumed at turn {s['resume_turn']} in {s['resume_seconds'] * 1000:.1f} ms")
+        return "\n".join(lines)
@@ -1,17 +1,8 @@
 # filename: check_csv_content.py
-import csv
+import sys
 
-# Load the URLs from the CSV file
-input_file = 'rescues_info.csv'
+from inspect_csv import inspect_csv, print_report
 
-# Read the CSV file and print the first few rows
-with open(input_file, 'r', newline='', encoding='utf-8') as csvfile:
-    reader = csv.reader(csvfile)
-    # Print the header
-    header = next(reader)
-    print(header)
-    # Print the first 5 rows of data
-    for i, row in enumerate(reader):
-        print(row)
-        if i >= 4:  # Only print the first 5 rows
-            break
\ No newline at end of file
+# Profile the CSV file (fill rates, distinct values, duplicates and a sample of rows) in one streaming pass
+input_file = sys.argv[1] if len(sys.argv) > 1 else 'rescues_info.csv'
+print_report(inspect_csv(input_file))
@@ -0,0 +1,217 @@
+# filename: contact_extract.py
+# One extraction engine for every scraper: walk the parsed page once, collect mailto:/tel: links,
+# "Contact"/"About" links and the visible text, then run one precompiled regex over that text for
+# emails, North-American phone numbers and "City, ST" locations.
+#   python contact_extract.py --fixtures fixtures     (runs offline on saved .html files)
+import argparse
+import glob
+import os
+import re
+import time
+from urllib.parse import unquote, urljoin, urlsplit
+
+import lxml.html
+
+STATES = ('AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE NV NH NJ NM '
+          'NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY PR').split()
+
+EMAIL_PATTERN = r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}'
+PHONE_PATTERN = (r'(?<![\d-])(?:\+?1[\s.-]?)?\(?(?P<area>[2-9]\d{2})\)?[\s.-]?(?P<exchange>[2-9]\d{2})[\s.-]?'
+                 r'(?P<line>\d{4})(?![\d-])')
+LOCATION_PATTERN = r"\b(?P<city>[A-Z][A-Za-z.'-]+(?: [A-Z][A-Za-z.'-]+){0,2}), (?P<state>" + '|'.join(STATES) + r')\b'
+
+# Every pattern in one alternation, so the text is scanned a single time
+CONTACT_RE = re.compile(f'(?P<email>{EMAIL_PATTERN})|(?P<phone>{PHONE_PATTERN})|(?P<location>{LOCATION_PATTERN})')
+PHONE_RE = re.compile(PHONE_PATTERN)
+CONTACT_LINK_RE = re.compile(r'\b(contact|about|reach us|get in touch)', re.IGNORECASE)
+
+# Matches that look like emails but are asset names such as logo@2x.png
+NOT_EMAIL_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+def format_phone(area, exchange, line):
+    return f'({area}) {exchange}-{line}'
+
+# Walk an lxml.html tree once, yielding ('title', text), ('a', href, link text) and ('text', text) events
+def _walk_lxml(html):
+    doc = lxml.html.fromstring(html.encode('utf-8') if isinstance(html, str) else html)
+    for el in doc.iter():
+        tag = el.tag if isinstance(el.tag, str) else None
+        # Skip the contents of <script>/<style> but keep the text that follows them
+        if tag in SKIP_TAGS:
+            if el.tail:
+                yield 'text', el.tail
+            continue
+        if tag == 'title':
+            yield 'title', el.text or ''
+        elif tag == 'a':
+            yield 'a', el.get('href') or '', el.text_content()
+        if tag is not None and el.text:
+            yield 'text', el.text
+        if el.tail:
+            yield 'text', el.tail
+
+# The same events from a BeautifulSoup tree, so both parsers can be benchmarked on the same corpus
+def _walk_bs4(html):
+    from bs4 import BeautifulSoup, Comment, Tag
+
+    soup = BeautifulSoup(html, 'lxml')
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            if node.name == 'title':
+                yield 'title', node.get_text()
+            elif node.name == 'a':
+                yield 'a', node.get('href') or '', node.get_text()
+        elif not isinstance(node, Comment) and node.parent is not None and node.parent.name not in SKIP_TAGS:
+            yield 'text', str(node)
+
+PARSERS = {'lxml': _walk_lxml, 'bs4': _walk_bs4}
+
+# Function to extract title, emails, phones, locations and contact-page links from one HTML document
+def extract_contacts(html, url=None, parser='lxml'):
+    start = time.perf_counter()
+    result = {'url': url, 'title': None, 'emails': [], 'phones': [], 'locations': [], 'contact_links': []}
+    if not html or not html.strip():
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    emails, phones, contact_links = {}, {}, {}
+    texts = []
+    for event in PARSERS[parser](html):
+        kind = event[0]
+        if kind == 'text':
+            texts.append(event[1])
+        elif kind == 'title':
+            if result['title'] is None:
+                result['title'] = event[1].strip() or None
+        else:
+            href, link_text = event[1].strip(), event[2]
+            lower = href.lower()
+            if lower.startswith('mailto:'):
+                address = unquote(href[7:].split('?')[0]).strip()
+                if address:
+                    emails.setdefault(address.lower(), address)
+            elif lower.startswith('tel:'):
+                match = PHONE_RE.search(unquote(href[4:]))
+                if match:
+                    phones.setdefault(format_phone(*match.group('area', 'exchange', 'line')), None)
+            elif href and not lower.startswith(('#', 'javascript:')) and CONTACT_LINK_RE.search(f'{link_text} {href}'):
+                link = urljoin(url, href) if url else href
+                contact_links.setdefault(link, None)
+
+    locations = {}
+    for match in CONTACT_RE.finditer(' '.join(texts)):
+        kind = match.lastgroup
+        if kind == 'email':
+            address = match.group('email')
+            if not address.lower().endswith(NOT_EMAIL_SUFFIXES):
+                emails.setdefault(address.lower(), address)
+        elif kind == 'phone':
+            phones.setdefault(format_phone(*match.group('area', 'exchange', 'line')), None)
+        else:
+            locations.setdefault(f"{match.group('city')}, {match.group('state')}", None)
+
+    result['emails'] = list(emails.values())
+    result['phones'] = list(phones)
+    result['locations'] = list(locations)
+    result['contact_links'] = list(contact_links)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# Function to run the extractor over many (url, html) documents
+def extract_batch(documents, parser='lxml'):
+    return [extract_contacts(html, url, parser) for url, html in documents]
+
+# Fold the findings of a contact/about page into the result for the main page
+def merge_contacts(result, extra):
+    for key in ('emails', 'phones', 'locations'):
+        for value in extra[key]:
+            if value not in result[key]:
+                result[key].append(value)
+    result['seconds'] += extra['seconds']
+    return result
+
+# Contact/about links worth following: same site and not visited yet
+def links_to_follow(result, seen, max_pages):
+    site = urlsplit(result['url'] or '').hostname
+    links = []
+    for link in result['contact_links']:
+        if link not in seen and urlsplit(link).hostname == site:
+            seen.add(link)
+            links.append(link)
+    return links[:max_pages]
+
+# Extract from a page and follow its "Contact"/"About" links up to max_depth levels.
+# fetch(url) returns the HTML of a page or None.
+def extract_with_follow(url, html, fetch, max_depth=1, max_pages=3, parser='lxml'):
+    result = extract_contacts(html, url, parser)
+    seen = {url}
+    frontier = [result]
+    for _ in range(max_depth):
+        next_frontier = []
+        for page in frontier:
+            for link in links_to_follow(page, seen, max_pages):
+                sub_html = fetch(link)
+                if sub_html:
+                    sub = extract_contacts(sub_html, link, parser)
+                    merge_contacts(result, sub)
+                    next_frontier.append(sub)
+        frontier = next_frontier
+    return result
+
+# Same as extract_with_follow for the async crawler; fetch is a coroutine function.
+# extract(html, url) is an optional coroutine that parses somewhere else (e.g. in a process pool).
+async def a_extract_with_follow(url, html, fetch, max_depth=1, max_pages=3, extract=None):
+    if extract is None:
+        async def extract(page_html, page_url):
+            return extract_contacts(page_html, page_url)
+    result = await extract(html, url)
+    seen = {url}
+    frontier = [result]
+    for _ in range(max_depth):
+        next_frontier = []
+        for page in frontier:
+            for link in links_to_follow(page, seen, max_pages):
+                sub_html = await fetch(link)
+                if sub_html:
+                    sub = await extract(sub_html, link)
+                    merge_contacts(result, sub)
+                    next_frontier.append(sub)
+        frontier = next_frontier
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract contact details from saved HTML pages')
+    parser.add_argument('--fixtures', default='fixtures', help='directory of saved .html pages')
+    parser.add_argument('--parser', choices=sorted(PARSERS), default='lxml', help='HTML parser backend')
+    parser.add_argument('--repeat', type=int, default=1, help='parse the corpus this many times (benchmarking)')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    documents = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            documents.append((f'file://{os.path.abspath(path)}', f.read()))
+
+    # Local fixtures can follow their contact links straight from disk
+    def fetch(link):
+        path = urlsplit(link).path
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()
+        return None
+
+    total = 0.0
+    for _ in range(args.repeat - 1):
+        total += sum(result['seconds'] for result in extract_batch(documents, args.parser))
+    for url, html in documents:
+        result = extract_with_follow(url, html, fetch, parser=args.parser)
+        total += result['seconds']
+        print(f"{os.path.basename(url)}: {result['seconds'] * 1000:.2f} ms  title={result['title']!r}")
+        print(f"  emails={result['emails']} phones={result['phones']} locations={result['locations']}")
+    if documents:
+        pages = len(documents) * args.repeat
+        print(f"{args.parser}: {pages} pages, {total * 1000 / pages:.2f} ms per page on average")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# filename: crawl_checkpoint.py
+import csv
+import hashlib
+import json
+import os
+import time
+
+# On-disk index of the URLs we have already scraped.
+# It is an append-only JSON-lines file, one line per finished URL, so every line is a checkpoint:
+# if the crawl dies half way through, the lines that made it to disk are still valid on the next run.
+class ContactIndex:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lines = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a torn last line from a crash
+                    self.entries[entry['url']] = entry
+                    self.lines += 1
+        self._file = open(path, 'a', encoding='utf-8')
+
+    # Hash of the input row, so an edited title or URL counts as a new row
+    @staticmethod
+    def row_hash(row):
+        return hashlib.sha1(f"{row['Title']}\x1f{row['URL']}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_hash(body):
+        if body is None:
+            return None
+        if isinstance(body, str):
+            body = body.encode('utf-8', 'replace')
+        return hashlib.sha1(body).hexdigest()
+
+    # A row needs fetching if we have never seen it, it changed, or its last fetch is older than max_age seconds
+    def needs_fetch(self, row, max_age):
+        entry = self.entries.get(row['URL'])
+        if entry is None or entry['row_hash'] != self.row_hash(row):
+            return True
+        return max_age is not None and time.time() - entry['fetched_at'] > max_age
+
+    # Record a finished URL. Returns True if the page content is unchanged since the previous fetch.
+    def record(self, row, body):
+        previous = self.entries.get(row['URL'])
+        entry = {
+            'url': row['URL'],
+            'row_hash': self.row_hash(row),
+            'content_hash': self.content_hash(body),
+            'fetched_at': time.time(),
+        }
+        self.entries[row['URL']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self.lines += 1
+        return previous is not None and previous['content_hash'] == entry['content_hash']
+
+    # Rewrite the index with only the latest line per URL once superseded lines pile up
+    def compact(self):
+        if self.lines <= len(self.entries):
+            return
+        self._file.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+        self.lines = len(self.entries)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+# Keep only the newest row for each URL in an appended-to CSV (re-fetched stale rows are appended, not updated)
+def compact_csv(path, fieldnames, key='URL'):
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        latest = {}
+        total = 0
+        for row in csv.DictReader(csvfile):
+            total += 1
+            latest.pop(row[key], None)
+            latest[row[key]] = row
+    if total == len(latest):
+        return 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(latest.values())
+    os.replace(tmp_path, path)
+    return total - len(latest)
@@ -0,0 +1,58 @@
+# filename: fake_search_server.py
+# A local stand-in for the Google Custom Search JSON API, so search_rescues_paginated.py can be tried without a key:
+#   python fake_search_server.py --port 8081 --results 37 --throttle-every 7
+#   python search_rescues_paginated.py --search-url http://127.0.0.1:8081/customsearch/v1 --query a --query b
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+def make_handler(args):
+    counter = {'requests': 0}
+    lock = threading.Lock()
+
+    class FakeSearchHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = parse_qs(urlsplit(self.path).query)
+            query = params.get('q', [''])[0]
+            start = int(params.get('start', ['1'])[0])
+            num = int(params.get('num', ['10'])[0])
+            with lock:
+                counter['requests'] += 1
+                n = counter['requests']
+            time.sleep(args.latency)
+            if args.throttle_every and n % args.throttle_every == 0:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.end_headers()
+                return
+            items = []
+            for i in range(start, min(start + num, args.results + 1)):
+                # Every other result is shared between queries so de-duplication has something to do
+                slug = f'shared-{i}' if i % 2 else f'{query.replace(" ", "-")}-{i}'
+                items.append({'title': f'Rescue {slug}', 'link': f'https://{slug}.example.org/',
+                              'snippet': 'dog rescue and foster'})
+            body = json.dumps({'items': items} if items else {}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *log_args):
+            pass
+
+    return FakeSearchHandler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Custom Search endpoint for local testing')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--results', type=int, default=37, help='results available for every query')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds of delay per request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth request with a 429')
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args))
+    print(f"Fake search API listening on http://127.0.0.1:{args.port}/customsearch/v1")
+    server.serve_forever()
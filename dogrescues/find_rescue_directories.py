@@ -1,6 +1,11 @@
 # filename: find_rescue_directories.py
 import requests
 
+from http_cache import CachedSession
+
+# Re-runs in the same session are answered from the shared .http_cache instead of the network
+session = CachedSession()
+
 # List of potential sources to check for directories or APIs
 sources = [
     'https://www.petfinder.com/developers/',
@@ -13,7 +18,7 @@ sources = [
 # Check each source to see if it provides a structured way to access data
 for source in sources:
     try:
-        response = requests.get(source)
+        response = session.get(source, timeout=15)
         if response.status_code == 200:
             print(f"Accessible source found: {source}")
         else:
@@ -21,5 +26,7 @@ for source in sources:
     except requests.exceptions.RequestException as e:
         print(f"Error accessing source {source}: {e}")
 
+print(session.cache.report())
+
 # Note: This script only checks if the sources are accessible. 
 # It does not automatically extract data. Manual review of each source is required to determine the best way to access the data.
\ No newline at end of file
@@ -0,0 +1,208 @@
+# filename: http_cache.py
+# Shared on-disk response cache for the dogrescues scrapers.
+# Bodies are stored once per content hash under <cache dir>/bodies/, and a small SQLite index maps
+# each URL to its body, ETag/Last-Modified and fetch time. Fresh entries (younger than the TTL) are
+# served without touching the network, stale ones are revalidated with a conditional GET, and the
+# least recently used entries are evicted once the bodies exceed the size budget.
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+CACHE_DIR = os.environ.get('RESCUE_HTTP_CACHE', '.http_cache')
+
+class ResponseCache:
+    def __init__(self, path=CACHE_DIR, ttl=6 * 3600, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+        os.makedirs(os.path.join(path, 'bodies'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, 'index.sqlite'), timeout=30, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY, body_hash TEXT, size INTEGER, status INTEGER, headers TEXT,
+            etag TEXT, last_modified TEXT, fetched_at REAL, accessed_at REAL)""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.path, 'bodies', body_hash[:2], body_hash)
+
+    # Function to find a cached response; returns None or a dict with a 'fresh' flag
+    def lookup(self, url):
+        row = self.db.execute(
+            'SELECT body_hash, size, status, headers, etag, last_modified, fetched_at FROM entries WHERE url = ?',
+            (url,)).fetchone()
+        if row is None or not os.path.exists(self._body_path(row[0])):
+            return None
+        body_hash, size, status, headers, etag, last_modified, fetched_at = row
+        return {'url': url, 'body_hash': body_hash, 'size': size, 'status': status, 'headers': json.loads(headers),
+                'etag': etag, 'last_modified': last_modified, 'fresh': time.time() - fetched_at < self.ttl}
+
+    # Headers that let the server answer 304 Not Modified instead of resending the page
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read_body(self, entry):
+        with open(self._body_path(entry['body_hash']), 'rb') as f:
+            body = f.read()
+        self.db.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (time.time(), entry['url']))
+        return body
+
+    # Count a cache hit (fresh) and return the body
+    def hit(self, entry):
+        self.stats['hits'] += 1
+        self.stats['bytes_saved'] += entry['size']
+        return self.read_body(entry)
+
+    # The server said 304: the cached body is still good, restart its TTL
+    def revalidate(self, entry, headers=None):
+        self.stats['revalidated'] += 1
+        self.stats['bytes_saved'] += entry['size']
+        now = time.time()
+        etag = (headers or {}).get('ETag') or entry['etag']
+        self.db.execute('UPDATE entries SET fetched_at = ?, accessed_at = ?, etag = ? WHERE url = ?',
+                        (now, now, etag, entry['url']))
+        return self.read_body(entry)
+
+    # Store a freshly downloaded body (only successful, cacheable responses)
+    def store(self, url, status, headers, body):
+        self.stats['misses'] += 1
+        headers = dict(headers)
+        cache_control = CaseInsensitiveDict(headers).get('Cache-Control', '')
+        if status != 200 or 'no-store' in cache_control.lower():
+            return
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        lookup_headers = CaseInsensitiveDict(headers)
+        now = time.time()
+        old = self.db.execute('SELECT body_hash FROM entries WHERE url = ?', (url,)).fetchone()
+        self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (url, body_hash, len(body), status, json.dumps(headers), lookup_headers.get('ETag'),
+                         lookup_headers.get('Last-Modified'), now, now))
+        self.stats['stored'] += 1
+        # the page changed: its old body goes unless another URL still has the same one
+        if old is not None and old[0] != body_hash:
+            self._drop_body(old[0])
+        self.evict()
+
+    # Delete a body file once no entry refers to it; returns the bytes freed
+    def _drop_body(self, body_hash):
+        if self.db.execute('SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone() is not None:
+            return 0
+        path = self._body_path(body_hash)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    # Drop least recently used entries until the distinct bodies fit in max_bytes
+    def evict(self):
+        total = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, body_hash in self.db.execute('SELECT url, body_hash FROM entries ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self.stats['evicted'] += 1
+            total -= self._drop_body(body_hash)
+
+    def report(self):
+        s = self.stats
+        requests_made = s['hits'] + s['revalidated'] + s['misses']
+        hit_rate = (s['hits'] + s['revalidated']) / requests_made * 100 if requests_made else 0
+        return (f"HTTP cache: {s['hits']} hits, {s['revalidated']} revalidated (304), {s['misses']} misses "
+                f"({hit_rate:.0f}% served from cache, {s['bytes_saved'] / 1024:.0f} KiB not downloaded), "
+                f"{s['evicted']} evicted")
+
+    # Print the hit/miss report when the script ends
+    def report_at_exit(self):
+        atexit.register(lambda: print(self.report()))
+        return self
+
+# Decode a body using the charset from its Content-Type header
+def decode_body(headers, body):
+    encoding = get_encoding_from_headers(CaseInsensitiveDict(headers)) or 'utf-8'
+    try:
+        return body.decode(encoding, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+# Fetch through the cache with any plain function that does the real GET.
+# get(url, headers) must return (status, headers, body bytes).
+def cached_get(cache, url, get, headers=None):
+    entry = cache.lookup(url)
+    if entry is not None and entry['fresh']:
+        return entry['status'], entry['headers'], cache.hit(entry)
+    request_headers = dict(headers or {})
+    request_headers.update(cache.conditional_headers(entry))
+    status, response_headers, body = get(url, request_headers)
+    if status == 304 and entry is not None:
+        return entry['status'], entry['headers'], cache.revalidate(entry, response_headers)
+    cache.store(url, status, response_headers, body)
+    return status, response_headers, body
+
+# Same as cached_get for the async crawler; get is a coroutine function
+async def a_cached_get(cache, url, get, headers=None):
+    entry = cache.lookup(url)
+    if entry is not None and entry['fresh']:
+        return entry['status'], entry['headers'], cache.hit(entry)
+    request_headers = dict(headers or {})
+    request_headers.update(cache.conditional_headers(entry))
+    status, response_headers, body = await get(url, request_headers)
+    if status == 304 and entry is not None:
+        return entry['status'], entry['headers'], cache.revalidate(entry, response_headers)
+    cache.store(url, status, response_headers, body)
+    return status, response_headers, body
+
+# requests.Session whose GETs go through a ResponseCache; responses served from disk have .from_cache = True
+class CachedSession(requests.Session):
+    def __init__(self, cache=None, **cache_kwargs):
+        super().__init__()
+        self.cache = cache or ResponseCache(**cache_kwargs)
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        url = requests.Request('GET', url, params=params).prepare().url
+        responses = {}
+
+        def get(request_url, request_headers):
+            response = super(CachedSession, self).get(request_url, headers=request_headers, **kwargs)
+            responses['live'] = response
+            return response.status_code, response.headers, response.content
+
+        status, response_headers, body = cached_get(self.cache, url, get, headers)
+        live = responses.get('live')
+        if live is not None and live.status_code != 304:
+            live.from_cache = False
+            return live
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(response_headers)
+        response._content = body
+        response.url = url
+        response.reason = 'OK'
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
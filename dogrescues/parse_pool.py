@@ -0,0 +1,45 @@
+# filename: parse_pool.py
+# Keep HTML parsing off the event loop: the async crawler only downloads, and a pool of worker
+# processes builds the parse tree and runs the extractors. OrderedWriter then hands the results
+# to the CSV writer in input order, as soon as each next row is ready.
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from contact_extract import extract_contacts
+
+class ParsePool:
+    # workers=0 parses inline on the calling thread (handy for comparing against the pool)
+    def __init__(self, workers=None, parser='lxml'):
+        self.parser = parser
+        self.workers = os.cpu_count() or 1 if workers is None else workers
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+
+    async def extract(self, html, url):
+        if self.executor is None:
+            return extract_contacts(html, url, self.parser)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, extract_contacts, html, url, self.parser)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Results finish out of order; emit them in input order, holding back only the rows that are ahead
+class OrderedWriter:
+    def __init__(self, emit):
+        self.emit = emit
+        self.pending = {}
+        self.next_index = 0
+
+    def put(self, index, *args):
+        self.pending[index] = args
+        while self.next_index in self.pending:
+            self.emit(*self.pending.pop(self.next_index))
+            self.next_index += 1
@@ -0,0 +1,264 @@
+# filename: rescue_directory.py
+# One local SQLite directory of rescue organizations instead of three flat CSV files.
+# Unique indexes on site, email and phone make duplicates merge as they are inserted (no O(n^2) passes),
+# and an FTS5 index answers keyword searches.
+#   python rescue_directory.py import rescues_info.csv contact_info.csv dog_rescues_info.csv
+#   python rescue_directory.py query --state TX --keyword foster
+#   python rescue_directory.py export rescues.xlsx
+import argparse
+import csv
+import re
+import sqlite3
+import sys
+import time
+from urllib.parse import urlsplit
+
+from contact_extract import LOCATION_PATTERN, PHONE_RE, format_phone
+from url_canonical import canonical_domain, canonicalize_url
+
+DB_FILE = 'rescues.db'
+FIELDS = ['name', 'contact_name', 'email', 'phone', 'city', 'state', 'website']
+# Column headings for the spreadsheet the Finding Fosters task asks for
+EXPORT_HEADINGS = ['Organization', 'Contact Name', 'Email', 'Phone', 'City', 'State', 'Website']
+
+# Sites that host many different rescues; the first path segment identifies the organization
+SHARED_HOSTS = {'facebook.com', 'instagram.com', 'petfinder.com', 'adoptapet.com', 'sites.google.com',
+                'linktr.ee', 'twitter.com', 'x.com'}
+
+LOCATION_RE = re.compile(LOCATION_PATTERN)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS organizations (
+    id INTEGER PRIMARY KEY,
+    name TEXT, contact_name TEXT, email TEXT, phone TEXT, city TEXT, state TEXT, website TEXT,
+    site TEXT, updated_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS organizations_site ON organizations (site) WHERE site IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS organizations_email ON organizations (email) WHERE email IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS organizations_phone ON organizations (phone) WHERE phone IS NOT NULL;
+CREATE INDEX IF NOT EXISTS organizations_location ON organizations (state, city);
+CREATE VIRTUAL TABLE IF NOT EXISTS organizations_fts USING fts5(
+    name, contact_name, city, state, website, content='organizations', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS organizations_ai AFTER INSERT ON organizations BEGIN
+    INSERT INTO organizations_fts (rowid, name, contact_name, city, state, website)
+    VALUES (new.id, new.name, new.contact_name, new.city, new.state, new.website);
+END;
+CREATE TRIGGER IF NOT EXISTS organizations_ad AFTER DELETE ON organizations BEGIN
+    INSERT INTO organizations_fts (organizations_fts, rowid, name, contact_name, city, state, website)
+    VALUES ('delete', old.id, old.name, old.contact_name, old.city, old.state, old.website);
+END;
+CREATE TRIGGER IF NOT EXISTS organizations_au AFTER UPDATE ON organizations BEGIN
+    INSERT INTO organizations_fts (organizations_fts, rowid, name, contact_name, city, state, website)
+    VALUES ('delete', old.id, old.name, old.contact_name, old.city, old.state, old.website);
+    INSERT INTO organizations_fts (rowid, name, contact_name, city, state, website)
+    VALUES (new.id, new.name, new.contact_name, new.city, new.state, new.website);
+END;
+"""
+
+# Key that identifies an organization's website: the domain, or domain + page for shared hosts
+def site_key(url):
+    domain = canonical_domain(url)
+    if domain in SHARED_HOSTS:
+        segment = urlsplit(url).path.strip('/').split('/')[0].lower()
+        return f'{domain}/{segment}' if segment else None
+    return domain or None
+
+# Clean one incoming record so equal organizations produce equal index keys
+def normalize(record):
+    clean = {field: (record.get(field) or '').strip() or None for field in FIELDS}
+    if clean['website']:
+        clean['website'] = canonicalize_url(clean['website'])
+    if clean['email']:
+        clean['email'] = clean['email'].lower()
+    if clean['phone']:
+        match = PHONE_RE.search(clean['phone'])
+        clean['phone'] = format_phone(*match.group('area', 'exchange', 'line')) if match else None
+    if clean['state']:
+        clean['state'] = clean['state'].upper()
+    clean['site'] = site_key(clean['website']) if clean['website'] else None
+    return clean
+
+class RescueDirectory:
+    def __init__(self, path=DB_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.stats = {'inserted': 0, 'merged': 0, 'skipped': 0}
+
+    # Insert a record, or merge it into the organization that already has its site, email or phone.
+    # Only empty fields are filled in, so the first good value for each field wins.
+    def add(self, record):
+        clean = normalize(record)
+        if not (clean['site'] or clean['email'] or clean['phone']):
+            self.stats['skipped'] += 1
+            return None
+        ids = set()
+        for key in ('site', 'email', 'phone'):
+            if clean[key]:
+                row = self.db.execute(f'SELECT id FROM organizations WHERE {key} = ?', (clean[key],)).fetchone()
+                if row is not None:
+                    ids.add(row['id'])
+        columns = FIELDS + ['site']
+        if not ids:
+            cursor = self.db.execute(
+                f"INSERT INTO organizations ({', '.join(columns)}, updated_at) VALUES ({', '.join('?' * len(columns))}, ?)",
+                [clean[c] for c in columns] + [time.time()])
+            self.stats['inserted'] += 1
+            return cursor.lastrowid
+        # The record may link two existing rows (e.g. site matches one, phone another): fold them into one
+        target, *others = sorted(ids)
+        merged = dict(self.db.execute('SELECT * FROM organizations WHERE id = ?', (target,)).fetchone())
+        for other in others:
+            row = dict(self.db.execute('SELECT * FROM organizations WHERE id = ?', (other,)).fetchone())
+            self.db.execute('DELETE FROM organizations WHERE id = ?', (other,))
+            for c in columns:
+                merged[c] = merged[c] or row[c]
+        for c in columns:
+            merged[c] = merged[c] or clean[c]
+        self.db.execute(
+            f"UPDATE organizations SET {', '.join(f'{c} = ?' for c in columns)}, updated_at = ? WHERE id = ?",
+            [merged[c] for c in columns] + [time.time(), target])
+        self.stats['merged'] += 1
+        return target
+
+    def add_many(self, records):
+        with self.db:
+            for record in records:
+                self.add(record)
+
+    # Fast lookups by state, city and/or full-text keyword (see fts_query)
+    def query(self, state=None, city=None, keyword=None, limit=None):
+        sql = 'SELECT o.* FROM organizations o'
+        where, params = [], []
+        match = fts_query(keyword) if keyword else None
+        if match:
+            sql += ' JOIN organizations_fts f ON f.rowid = o.id'
+            where.append('organizations_fts MATCH ?')
+            params.append(match)
+        if state:
+            where.append('o.state = ?')
+            params.append(state.upper())
+        if city:
+            where.append('o.city = ? COLLATE NOCASE')
+            params.append(city)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY o.state, o.city, o.name'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return self.db.execute(sql, params)
+
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM organizations').fetchone()[0]
+
+    # Stream the directory to a spreadsheet row by row (.xlsx needs openpyxl, anything else is written as CSV)
+    def export(self, path, **filters):
+        if path.endswith('.xlsx'):
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                raise RuntimeError('Exporting to .xlsx needs openpyxl (pip install openpyxl); '
+                                   'export to a .csv file instead, Excel opens those too') from None
+        rows = self.query(**filters)
+        written = 0
+        if path.endswith('.xlsx'):
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet('Rescues')
+            sheet.append(EXPORT_HEADINGS)
+            for row in rows:
+                sheet.append([row[f] for f in FIELDS])
+                written += 1
+            workbook.save(path)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(EXPORT_HEADINGS)
+                for row in rows:
+                    writer.writerow([row[f] for f in FIELDS])
+                    written += 1
+        return written
+
+    def close(self):
+        self.db.close()
+
+# Turn a --keyword into an FTS5 query: every word is quoted, so punctuation ("St. Louis", "K-9") can't break the
+# query syntax. Upper-case AND/OR/NOT between words and a trailing * for prefix search still work; an operator with
+# no word on one side is dropped. Returns '' when there is nothing to search for.
+def fts_query(keyword):
+    terms = []
+    for word in keyword.split():
+        if word in ('AND', 'OR', 'NOT'):
+            if terms and terms[-1] not in ('AND', 'OR', 'NOT'):
+                terms.append(word)
+            continue
+        prefix = word.endswith('*') and len(word) > 1
+        word = word.rstrip('*') if prefix else word
+        if not re.search(r'\w', word):
+            continue  # only punctuation: fts5 has no token to look for
+        terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    while terms and terms[-1] in ('AND', 'OR', 'NOT'):
+        terms.pop()
+    return ' '.join(terms)
+
+# Map the rows of the pipeline's CSV files (rescues_info, contact_info, dog_rescues_info) onto directory fields
+def records_from_csv(path):
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            record = {
+                'name': row.get('Name') or row.get('Title') or row.get('Organization'),
+                'contact_name': row.get('Contact Name'),
+                'email': row.get('Email'),
+                'phone': row.get('Phone'),
+                'city': row.get('City'),
+                'state': row.get('State'),
+                'website': row.get('URL') or row.get('Website'),
+            }
+            match = LOCATION_RE.search(row.get('Location') or '')
+            if match and not record['city']:
+                record['city'], record['state'] = match.group('city'), match.group('state')
+            yield record
+
+def main():
+    parser = argparse.ArgumentParser(description='Local rescue directory backed by SQLite')
+    parser.add_argument('--db', default=DB_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_cmd = commands.add_parser('import', help='merge CSV files into the directory')
+    import_cmd.add_argument('files', nargs='+')
+    for name in ('query', 'export'):
+        cmd = commands.add_parser(name)
+        if name == 'export':
+            cmd.add_argument('path', help='output .csv or .xlsx file')
+        cmd.add_argument('--state')
+        cmd.add_argument('--city')
+        cmd.add_argument('--keyword', help='full-text search, e.g. "foster OR rescue"')
+        cmd.add_argument('--limit', type=int)
+    commands.add_parser('stats')
+    args = parser.parse_args()
+
+    if getattr(args, 'keyword', None) is not None and not fts_query(args.keyword):
+        parser.error(f'--keyword {args.keyword!r} has no words to search for')
+    directory = RescueDirectory(args.db)
+    start = time.perf_counter()
+    if args.command == 'import':
+        for path in args.files:
+            directory.add_many(records_from_csv(path))
+        s = directory.stats
+        print(f"Imported {len(args.files)} files in {time.perf_counter() - start:.2f}s: {s['inserted']} new, "
+              f"{s['merged']} merged into existing organizations, {s['skipped']} without a site/email/phone")
+    elif args.command == 'query':
+        for row in directory.query(args.state, args.city, args.keyword, args.limit):
+            print(' | '.join(str(row[f] or '') for f in FIELDS))
+    elif args.command == 'export':
+        try:
+            written = directory.export(args.path, state=args.state, city=args.city, keyword=args.keyword,
+                                       limit=args.limit)
+        except RuntimeError as e:
+            directory.close()
+            sys.exit(str(e))
+        print(f"Exported {written} organizations to {args.path}")
+    print(f"{directory.count()} unique organizations in {args.db}")
+    directory.close()
+
+if __name__ == '__main__':
+    main()
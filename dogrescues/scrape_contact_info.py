@@ -1,44 +1,219 @@
 # filename: scrape_contact_info.py
+import argparse
+import asyncio
 import csv
+import os
+import time
+from urllib.parse import urlsplit
+
 import requests
-from bs4 import BeautifulSoup
+
+from contact_extract import a_extract_with_follow, extract_contacts, extract_with_follow
+from crawl_checkpoint import ContactIndex, compact_csv
+from http_cache import CachedSession, ResponseCache, a_cached_get, decode_body
+from parse_pool import OrderedWriter, ParsePool
+from url_canonical import unique_rows
+
+# Pretend to be a regular browser so rescue sites don't reject the request
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0 Safari/537.36'}
+FIELDNAMES = ['Title', 'URL', 'Email', 'Phone']
+
+# Function to pick the email and phone number we report from an extraction result
+def first_contact(result):
+    return (result['emails'] or [None])[0], (result['phones'] or [None])[0]
+
+# Function to pull an email and phone number out of an already downloaded page
+def extract_contact_info(html, url=None):
+    return first_contact(extract_contacts(html, url))
 
 # Function to scrape contact information from a given URL
-def scrape_contact_info(url):
+def scrape_contact_info(url, session=None, timeout=15):
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'lxml')
-        # This is a simple and naive way to find email and phone numbers, it might not work for all websites
-        email = None
-        phone = None
-        for a in soup.find_all('a', href=True):
-            if 'mailto:' in a['href']:
-                email = a['href'].split('mailto:')[1]
-                break
-        for text in soup.stripped_strings:
-            if '@' in text and '.' in text:
-                email = text
-                break
-        # You may need to add more sophisticated methods to find the phone number
-        return email, phone
+        response = (session or requests).get(url, headers=HEADERS, timeout=timeout)
+        return extract_contact_info(response.text)
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return None, None
 
-# Load the URLs from the CSV file
-input_file = 'rescues_info.csv'
-output_file = 'contact_info.csv'
-
-with open(input_file, 'r', newline='', encoding='utf-8') as csvfile, \
-     open(output_file, 'w', newline='', encoding='utf-8') as output_csvfile:
-    reader = csv.DictReader(csvfile)
-    fieldnames = ['Title', 'URL', 'Email', 'Phone']
-    writer = csv.DictWriter(output_csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in reader:
-        title = row['Title']
-        url = row['URL']
-        email, phone = scrape_contact_info(url)
-        writer.writerow({'Title': title, 'URL': url, 'Email': email, 'Phone': phone})
-
-print(f"Scraping completed. Contact information saved to {output_file}")
\ No newline at end of file
+# Function to read the Title/URL rows we need to visit.
+# URLs are canonicalized first so ad redirects, marketplaces and duplicate links are never fetched.
+def read_rescues(input_file, stats=None):
+    with open(input_file, 'r', newline='', encoding='utf-8') as csvfile:
+        rows = ({'Title': row['Title'], 'URL': row['URL']} for row in csv.DictReader(csvfile))
+        return list(unique_rows(rows, stats=stats))
+
+# The original one-URL-at-a-time loop, now with a shared keep-alive Session and a timeout.
+# emit(row, email, phone, html) is called once per URL as soon as it finishes; html is None unless the page came back 2xx.
+# With follow_depth > 0 the "Contact"/"About" pages of each site are scraped as well.
+def crawl_serial(rows, emit, timeout, follow_depth=0, cache=None, parser='lxml', verify_ssl=True):
+    stats = {'ok': 0, 'errors': 0, 'extract_seconds': 0.0}
+    with (CachedSession(cache) if cache is not None else requests.Session()) as session:
+        session.verify = verify_ssl
+        def fetch(link):
+            try:
+                return session.get(link, headers=HEADERS, timeout=timeout).text
+            except requests.exceptions.RequestException:
+                return None
+
+        for row in rows:
+            email, phone, html = None, None, None
+            try:
+                response = session.get(row['URL'], headers=HEADERS, timeout=timeout)
+                if not 200 <= response.status_code < 300:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                html = response.text
+                result = extract_with_follow(row['URL'], html, fetch, max_depth=follow_depth, parser=parser)
+                stats['extract_seconds'] += result['seconds']
+                email, phone = first_contact(result)
+                stats['ok'] += 1
+            except Exception as e:
+                stats['errors'] += 1
+                print(f"Error scraping {row['URL']}: {e}")
+            emit(row, email, phone, html)
+    return stats
+
+# Async crawler: a fixed number of workers pull URLs from a queue and share one pooled connector.
+# The connector caps total open connections and connections per host, and keeps them alive between requests.
+# Downloaded pages are parsed by the ParsePool's worker processes, so the event loop only does I/O.
+# Pages that come back with anything but a 2xx status count as errors and are not parsed.
+async def crawl_async(rows, emit, workers, per_host, timeout, follow_depth=0, cache=None, pool=None, verify_ssl=True):
+    import aiohttp
+
+    stats = {'ok': 0, 'errors': 0, 'extract_seconds': 0.0}
+    queue = asyncio.Queue()
+    for index, row in enumerate(rows):
+        queue.put_nowait((index, row))
+    writer = OrderedWriter(emit)
+    extract = pool.extract if pool is not None else None
+
+    connector = aiohttp.TCPConnector(limit=workers, limit_per_host=per_host, ssl=verify_ssl, keepalive_timeout=30)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def worker(session):
+        async def get(url, headers):
+            async with session.get(url, headers=headers) as response:
+                return response.status, dict(response.headers), await response.read()
+
+        # GET through the shared response cache when there is one
+        async def get_text(url):
+            if cache is None:
+                status, response_headers, body = await get(url, HEADERS)
+            else:
+                status, response_headers, body = await a_cached_get(cache, url, get, HEADERS)
+            if not 200 <= status < 300:
+                raise RuntimeError(f"HTTP {status}")
+            return decode_body(response_headers, body)
+
+        async def fetch(link):
+            try:
+                return await get_text(link)
+            except Exception:
+                return None
+
+        while True:
+            try:
+                index, row = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            url = row['URL']
+            email, phone, html = None, None, None
+            try:
+                html = await get_text(url)
+                result = await a_extract_with_follow(url, html, fetch, max_depth=follow_depth, extract=extract)
+                stats['extract_seconds'] += result['seconds']
+                email, phone = first_contact(result)
+                stats['ok'] += 1
+            except Exception as e:
+                stats['errors'] += 1
+                print(f"Error scraping {url}: {e}")
+            # Rows are written in input order as soon as every earlier row is done, so partial results survive a crash
+            writer.put(index, row, email, phone, html)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(min(workers, len(rows)) or 1)))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape contact information for the rescues in rescues_info.csv')
+    parser.add_argument('--input', default='rescues_info.csv')
+    parser.add_argument('--output', default='contact_info.csv')
+    parser.add_argument('--mode', choices=['async', 'serial'], default='async')
+    parser.add_argument('--workers', type=int, default=32, help='total concurrent requests (async mode)')
+    parser.add_argument('--per-host', type=int, default=2, help='concurrent requests per host (async mode)')
+    parser.add_argument('--timeout', type=float, default=15, help='per-request timeout in seconds')
+    parser.add_argument('--follow-contact', type=int, default=0, metavar='DEPTH',
+                        help='also scrape "Contact"/"About" pages, up to DEPTH links away from each rescue URL')
+    parser.add_argument('--parser', choices=['lxml', 'bs4'], default='lxml', help='HTML parser backend')
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help='processes that parse pages in async mode (default: one per CPU, 0: parse inline)')
+    parser.add_argument('--no-cache', action='store_true', help='always download pages instead of using .http_cache')
+    parser.add_argument('--cache-ttl', type=float, default=6,
+                        help='hours a cached page is served without revalidating it')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch new or stale rows, append to the output and resume from the last checkpoint')
+    parser.add_argument('--max-age', type=float, default=7 * 24,
+                        help='hours before an already scraped URL is considered stale (incremental mode)')
+    parser.add_argument('--index', help='checkpoint index file (default: <output>.index.jsonl)')
+    parser.add_argument('--insecure', action='store_true',
+                        help='do not verify TLS certificates (only for sites whose certificate is broken)')
+    args = parser.parse_args()
+
+    url_stats = {}
+    cache = None if args.no_cache else ResponseCache(ttl=args.cache_ttl * 3600)
+    rows = read_rescues(args.input, url_stats)
+    if url_stats:
+        print(f"Skipping {url_stats.get('dropped', 0)} ad/marketplace/invalid URLs "
+              f"and {url_stats.get('duplicates', 0)} duplicates")
+    index = None
+    skipped = 0
+    if args.incremental:
+        index = ContactIndex(args.index or args.output + '.index.jsonl')
+        fresh_rows = [row for row in rows if index.needs_fetch(row, args.max_age * 3600)]
+        skipped = len(rows) - len(fresh_rows)
+        rows = fresh_rows
+    hosts = len({urlsplit(row['URL']).netloc for row in rows})
+    unchanged = 0
+
+    start = time.perf_counter()
+    append = args.incremental and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+    with open(args.output, 'a' if append else 'w', newline='', encoding='utf-8') as output_csvfile:
+        writer = csv.DictWriter(output_csvfile, fieldnames=FIELDNAMES)
+        if not append:
+            writer.writeheader()
+
+        def emit(row, email, phone, html):
+            nonlocal unchanged
+            if html is None and index is not None and row['URL'] in index.entries:
+                # a stale URL whose re-fetch failed: keep the row from its last good fetch instead of blanking it
+                return
+            writer.writerow({'Title': row['Title'], 'URL': row['URL'], 'Email': email, 'Phone': phone})
+            output_csvfile.flush()
+            # The CSV row is on disk before the checkpoint, so a crash in between only costs a re-fetch.
+            # Failed fetches (no html, e.g. a 404 or 503) are not checkpointed, so --incremental tries them again.
+            if index is not None and html is not None:
+                unchanged += index.record(row, html)
+
+        if args.mode == 'async':
+            with ParsePool(args.parse_workers, args.parser) as pool:
+                stats = asyncio.run(crawl_async(rows, emit, args.workers, args.per_host, args.timeout,
+                                                args.follow_contact, cache, pool, not args.insecure))
+        else:
+            stats = crawl_serial(rows, emit, args.timeout, args.follow_contact, cache, args.parser, not args.insecure)
+    if index is not None:
+        index.compact()
+        index.close()
+        replaced = compact_csv(args.output, FIELDNAMES)
+        print(f"Incremental run: {skipped} URLs up to date, {len(rows)} fetched "
+              f"({unchanged} unchanged since last fetch), {replaced} superseded rows removed")
+    elapsed = time.perf_counter() - start
+
+    print(f"Scraping completed. Contact information saved to {args.output}")
+    print(f"{len(rows)} URLs across {hosts} hosts in {elapsed:.1f}s "
+          f"({len(rows) / elapsed if elapsed else 0:.1f} URLs/s), {stats['ok']} fetched, {stats['errors']} errors")
+    if cache is not None:
+        print(cache.report())
+    if stats['ok']:
+        print(f"Extraction took {stats['extract_seconds'] * 1000 / stats['ok']:.2f} ms per page on average")
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,41 @@
 # filename: search_dog_rescues.py
-import requests
-from bs4 import BeautifulSoup
 import csv
 import urllib3
 
+from contact_extract import extract_contacts
+from http_cache import CachedSession
+from url_canonical import canonicalize_url, dedupe_key
+
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Pages fetched in earlier runs come from the shared .http_cache; the hit/miss report prints at exit
+session = CachedSession()
+session.cache.report_at_exit()
+
+# URLs already visited in this run, so the same rescue found twice is only fetched once
+seen_urls = set()
+
 # Function to extract information from a rescue's website
 def extract_info(url):
+    # Unwrap ad redirects and skip ads, marketplaces and duplicates before paying for a request
+    canonical = canonicalize_url(url)
+    if canonical is None or dedupe_key(canonical) in seen_urls:
+        print(f"Skipping {url[:80]}: ad, marketplace or duplicate")
+        return None
+    seen_urls.add(dedupe_key(canonical))
+    url = canonical
     try:
         # Bypass SSL verification with verify=False
-        response = requests.get(url, verify=False)
-        soup = BeautifulSoup(response.text, 'lxml')
-        # This is a simplified example and may require adjustments
-        # You may need to customize the selectors based on the website's structure
-        name = soup.find('title').get_text()
-        email = None
-        phone = None
-        location = None
-        for a in soup.find_all('a', href=True):
-            if 'mailto:' in a['href']:
-                email = a['href'].split('mailto:')[1]
-                break
-        # Add logic to extract phone and location based on the website's structure
+        response = session.get(url, verify=False, timeout=15)
+        # One pass over the page for the title, emails, phone numbers and "City, ST" locations
+        result = extract_contacts(response.text, url)
+        print(f"Extracted {url} in {result['seconds'] * 1000:.1f} ms")
         return {
-            'Name': name,
-            'Email': email,
-            'Phone': phone,
-            'Location': location,
+            'Name': result['title'],
+            'Email': (result['emails'] or [None])[0],
+            'Phone': (result['phones'] or [None])[0],
+            'Location': (result['locations'] or [None])[0],
             'URL': url
         }
     except Exception as e:
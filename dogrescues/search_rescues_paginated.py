@@ -1,11 +1,55 @@
 # filename: search_rescues_paginated.py
-import requests
+import argparse
+import asyncio
 import csv
+import os
+import random
 import time
 
-# Function to perform a web search using Google Custom Search JSON API
-def google_search(search_term, api_key, cse_id, start_index, **kwargs):
-    search_url = "https://www.googleapis.com/customsearch/v1"
+from url_canonical import unique_rows
+
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+# Replace with your actual API key and search engine ID (or set GOOGLE_API_KEY / GOOGLE_CSE_ID)
+API_KEY = os.environ.get('GOOGLE_API_KEY', 'YOUR_API_KEY')
+SEARCH_ENGINE_ID = os.environ.get('GOOGLE_CSE_ID', 'YOUR_SEARCH_ENGINE_ID')
+
+DEFAULT_QUERIES = ['dog rescue and foster organizations']
+
+# Token bucket shared by every request: `rate` requests per second on average, bursts of up to `capacity`.
+# A 429 from the API pauses the whole bucket, so all in-flight queries back off together.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # refill from the end of the pause, or the time spent paused would come back as one full burst
+        self.updated = self.paused_until
+
+# Function to perform one page of a web search using Google Custom Search JSON API
+async def google_search(session, bucket, search_term, api_key, cse_id, start_index, search_url=SEARCH_URL,
+                        max_retries=5, stats=None, **kwargs):
     params = {
         'q': search_term,
         'cx': cse_id,
@@ -13,8 +57,21 @@ def google_search(search_term, api_key, cse_id, start_index, **kwargs):
         'start': start_index
     }
     params.update(kwargs)
-    response = requests.get(search_url, params=params)
-    return response.json()
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        if stats is not None:
+            stats['requests'] += 1
+        async with session.get(search_url, params=params) as response:
+            if response.status == 429 or response.status >= 500:
+                if stats is not None:
+                    stats['throttled'] += 1
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+                bucket.pause(delay + random.uniform(0, 0.5))
+                continue
+            response.raise_for_status()
+            return await response.json()
+    raise RuntimeError(f"Gave up on '{search_term}' start={start_index} after {max_retries} retries")
 
 # Function to extract relevant information from search results
 def extract_info(results):
@@ -27,25 +84,80 @@ def extract_info(results):
         info_list.append(info)
     return info_list
 
-# Replace with your actual API key and search engine ID
-API_KEY = 'YOUR_API_KEY'
-SEARCH_ENGINE_ID = 'YOUR_SEARCH_ENGINE_ID'
-
-# Perform the search and paginate through results
-all_rescue_info = []
-for i in range(0, 100, 10):  # Adjust range as needed to get more results
-    search_results = google_search('dog rescue and foster organizations', API_KEY, SEARCH_ENGINE_ID, i+1)
-    rescue_info = extract_info(search_results)
-    all_rescue_info.extend(rescue_info)
-    time.sleep(2)  # Pause between requests to avoid rate limiting
-
-# Save the information to a CSV file
-output_file = 'rescues_info.csv'
-with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-    fieldnames = ['Title', 'URL']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-    for info in all_rescue_info:
-        writer.writerow(info)
-
-print(f"Search completed. Information saved to {output_file}")
\ No newline at end of file
+# Walk one query's pages, `window` pages at a time, and stop at the first empty page.
+# The API never returns more than 100 results, i.e. start indexes 1, 11, ..., 91.
+# A page that fails for good ends this query with the results found so far; the other queries carry on.
+async def search_query(session, bucket, query, args, stats):
+    results = []
+    starts = list(range(1, args.max_results + 1, 10))
+    for i in range(0, len(starts), args.window):
+        pages = await asyncio.gather(*(
+            google_search(session, bucket, query, args.api_key, args.cse_id, start, search_url=args.search_url,
+                          stats=stats, num=10)
+            for start in starts[i:i + args.window]
+        ), return_exceptions=True)
+        for page in pages:
+            if isinstance(page, Exception):
+                print(f"Error searching '{query}': {page}")
+                stats['failed_queries'] += 1
+                return results
+            info = extract_info(page)
+            if not info:
+                stats['early_stops'] += 1
+                return results
+            results.extend(info)
+    return results
+
+async def search_all(queries, args):
+    import aiohttp
+
+    stats = {'requests': 0, 'throttled': 0, 'early_stops': 0, 'failed_queries': 0}
+    bucket = TokenBucket(args.rate, args.burst)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        per_query = await asyncio.gather(*(search_query(session, bucket, q, args, stats) for q in queries))
+    return per_query, stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Search for dog rescues across many queries and pages at once')
+    parser.add_argument('--query', action='append', help='search query (repeatable)')
+    parser.add_argument('--queries-file', help='file with one search query per line')
+    parser.add_argument('--max-results', type=int, default=100, help='results per query (the API caps this at 100)')
+    parser.add_argument('--window', type=int, default=3, help='pages of one query requested at the same time')
+    parser.add_argument('--rate', type=float, default=1.0, help='requests per second allowed by the API quota')
+    parser.add_argument('--burst', type=int, default=5, help='requests allowed back to back before the rate applies')
+    parser.add_argument('--concurrency', type=int, default=10, help='open connections to the search API')
+    parser.add_argument('--search-url', default=SEARCH_URL, help='search endpoint (point at a local fake to test)')
+    parser.add_argument('--api-key', default=API_KEY)
+    parser.add_argument('--cse-id', default=SEARCH_ENGINE_ID)
+    parser.add_argument('--output', default='rescues_info.csv')
+    args = parser.parse_args()
+
+    queries = list(args.query or [])
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries.extend(line.strip() for line in f if line.strip())
+    queries = queries or DEFAULT_QUERIES
+
+    start = time.perf_counter()
+    per_query, stats = asyncio.run(search_all(queries, args))
+
+    # Canonicalize and de-duplicate links across all queries, keeping the first title seen
+    all_rescue_info = list(unique_rows(info for rescue_info in per_query for info in rescue_info))
+    total = sum(len(r) for r in per_query)
+
+    # Save the information to a CSV file
+    with open(args.output, 'w', newline='', encoding='utf-8') as csvfile:
+        fieldnames = ['Title', 'URL']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for info in all_rescue_info:
+            writer.writerow(info)
+
+    print(f"Search completed. Information saved to {args.output}")
+    print(f"{len(queries)} queries, {stats['requests']} requests ({stats['throttled']} throttled, "
+          f"{stats['early_stops']} stopped early, {stats['failed_queries']} failed) in {time.perf_counter() - start:.1f}s; "
+          f"{total} links, {len(all_rescue_info)} unique")
+
+if __name__ == '__main__':
+    main()
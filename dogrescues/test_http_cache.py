@@ -0,0 +1,35 @@
+# filename: test_http_cache.py
+# python -m pytest test_http_cache.py
+import os
+
+from http_cache import ResponseCache
+
+
+def body_files(cache):
+    return sorted(name for _, _, names in os.walk(os.path.join(cache.path, 'bodies')) for name in names)
+
+
+def test_storing_a_url_again_replaces_its_body_file(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store('https://rescue.example.org/', 200, {}, b'<html>first</html>')
+    cache.store('https://rescue.example.org/', 200, {}, b'<html>second</html>')
+    assert len(body_files(cache)) == 1
+    assert cache.read_body(cache.lookup('https://rescue.example.org/')) == b'<html>second</html>'
+
+
+def test_a_body_shared_with_another_url_is_kept(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store('https://a.example.org/', 200, {}, b'same page')
+    cache.store('https://b.example.org/', 200, {}, b'same page')
+    cache.store('https://a.example.org/', 200, {}, b'new page')
+    assert len(body_files(cache)) == 2
+    assert cache.read_body(cache.lookup('https://b.example.org/')) == b'same page'
+
+
+def test_eviction_keeps_the_bodies_under_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=250)
+    for i in range(10):
+        cache.store('https://rescue.example.org/', 200, {}, bytes([i]) * 100)
+        cache.store(f'https://other{i}.example.org/', 200, {}, bytes([100 + i]) * 100)
+    assert sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(os.path.join(cache.path, 'bodies')) for name in names) <= 250
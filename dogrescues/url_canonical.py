@@ -0,0 +1,126 @@
+# filename: url_canonical.py
+# Canonicalize URLs before we fetch them: unwrap ad/search redirects (Bing aclk `u=`, Google `/url?q=`),
+# strip tracking parameters and drop ad/marketplace domains that are never rescues. The host and path we fetch are
+# kept as they are (some sites only answer on www. or need the trailing slash); only dedupe_key normalizes them.
+import base64
+import binascii
+import csv
+import posixpath
+import sys
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+# Redirect wrappers: host suffix -> (path prefix, query parameter that carries the real target)
+REDIRECTS = {
+    'bing.com': [('/aclk', 'u'), ('/ck/a', 'u')],
+    'google.com': [('/url', 'q'), ('/url', 'url'), ('/aclk', 'adurl')],
+    'googleadservices.com': [('/pagead/aclk', 'adurl')],
+    'duckduckgo.com': [('/l/', 'uddg')],
+}
+
+# Query parameters that only identify the ad click or campaign. Short generic names such as 'tag', 'ref' or 'si'
+# are left alone: plenty of sites use them for real content.
+TRACKING_PARAMS = {
+    'msclkid', 'gclid', 'gclsrc', 'dclid', 'fbclid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    'ref_', 'adgrpid', 'hydadcr', 'spm', 'rlid',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+# Ads, marketplaces and breeders that show up for "dog rescue" searches but are not rescues
+BLOCKED_DOMAINS = {
+    'amazon.com', 'ebay.com', 'etsy.com', 'walmart.com', 'chewy.com', 'petco.com', 'petsmart.com',
+    'puppiesnation.com', 'minicub.net', 'puppyspot.com', 'greenfieldpuppies.com', 'lancasterpuppies.com',
+    'hoobly.com', 'puppyfind.com', 'doubleclick.net', 'googleadservices.com', 'bing.com',
+}
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Bing base64-encodes the target (sometimes behind an "a1" marker) and percent-encodes it inside that
+def _decode_bing_payload(value):
+    if value.startswith('a1'):
+        value = value[2:]
+    if value.startswith(('http://', 'https://', 'http%3a', 'https%3a')):
+        return unquote(value)
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return unquote(raw)
+
+# Function to follow redirect wrappers without making any request
+def decode_redirect(url, max_depth=3):
+    for _ in range(max_depth):
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        target = None
+        for suffix, rules in REDIRECTS.items():
+            if host == suffix or host.endswith('.' + suffix):
+                params = dict(parse_qsl(parts.query))
+                for path, param in rules:
+                    if parts.path.startswith(path) and params.get(param):
+                        value = params[param]
+                        target = _decode_bing_payload(value) if suffix == 'bing.com' else value
+                        break
+        if not target or not target.startswith(('http://', 'https://')):
+            return url
+        url = target
+    return url
+
+# Registered-looking domain without "www." (good enough for rescue sites; no public suffix list needed)
+def canonical_domain(url):
+    host = (urlsplit(url).hostname or '').lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+def is_blocked(domain):
+    return any(domain == blocked or domain.endswith('.' + blocked) for blocked in BLOCKED_DOMAINS)
+
+# Function to turn any result link into the URL we should actually fetch, or None to skip it
+def canonicalize_url(url):
+    if not url:
+        return None
+    url = decode_redirect(url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    if is_blocked(canonical_domain(url)):
+        return None
+    netloc = parts.hostname.rstrip('.')
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f'{netloc}:{parts.port}'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, netloc, parts.path or '/', urlencode(query), ''))
+
+# The same page over http and https, with and without www., a trailing slash or index.html is still the same page
+def dedupe_key(canonical_url):
+    parts = urlsplit(canonical_url)
+    netloc = canonical_domain(canonical_url) + (f':{parts.port}' if parts.port else '')
+    path = posixpath.normpath('/' + parts.path.lstrip('/')) if parts.path not in ('', '/') else '/'
+    if path.endswith(('/index.html', '/index.htm', '/index.php')):
+        path = path.rsplit('/', 1)[0] or '/'
+    path = path.rstrip('/') or '/'
+    return netloc + path + ('?' + urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True))) if parts.query else '')
+
+# Function to canonicalize the URL column of a list of rows, dropping blocked links and duplicates
+def unique_rows(rows, key='URL', stats=None):
+    seen = set()
+    for row in rows:
+        canonical = canonicalize_url(row.get(key))
+        if canonical is None:
+            if stats is not None:
+                stats['dropped'] = stats.get('dropped', 0) + 1
+            continue
+        if dedupe_key(canonical) in seen:
+            if stats is not None:
+                stats['duplicates'] = stats.get('duplicates', 0) + 1
+            continue
+        seen.add(dedupe_key(canonical))
+        yield dict(row, **{key: canonical})
+
+# Show what canonicalization does to the URL column of a CSV, e.g. python url_canonical.py dog_rescues_info.csv
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'dog_rescues_info.csv'
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            target = decode_redirect(row['URL'])
+            print(f"{canonicalize_url(row['URL']) or 'DROPPED'}  <-  {target[:100]}")
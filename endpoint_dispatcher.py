@@ -0,0 +1,261 @@
+"""
+*** Spreading Requests Across Endpoints ***
+config_list_from_json("OAI_CONFIG_LIST", filter_dict=...) can give you several OpenAI or Azure deployments of the same
+model, but autogen always tries them in list order. It only moves on to the next entry after the first one fails, so
+all the traffic lands on the first deployment until it starts rate limiting. EndpointDispatcher sits underneath
+autogen, at the openai.ChatCompletion.create level, and picks an endpoint for every request:
+
+- Only endpoints that serve the requested model are used.
+- Endpoints on cooldown go to the back of the line.
+- The rest are ranked by their observed latency (an exponentially weighted average), the number of requests
+  already in flight, and their remaining rate-limit headroom (from the x-ratelimit-* response headers).
+
+A request that is rate limited, times out, can't connect or gets a server error puts that endpoint on a cooldown
+(Retry-After if the server sent one, otherwise an exponential backoff) and is retried right away on the next
+endpoint. Per-endpoint counters are available from counters() and report().
+
+example:
+dispatcher = EndpointDispatcher(config_list)
+dispatcher.install()      # every agent's LLM calls now go through the dispatcher
+...
+print(dispatcher.report())
+
+Try it without an API key against a few copies of mock_openai_server.py:
+python endpoint_dispatcher.py --demo
+"""
+import argparse
+import threading
+import time
+
+import openai
+import requests
+from openai.error import (
+    APIConnectionError,
+    APIError,
+    AuthenticationError,
+    RateLimitError,
+    ServiceUnavailableError,
+    Timeout,
+)
+
+CREDENTIAL_KEYS = ("api_key", "api_base", "api_type", "api_version", "organization")
+FAILOVER_ERRORS = (RateLimitError, Timeout, APIConnectionError, ServiceUnavailableError, APIError, AuthenticationError)
+
+_local = threading.local()
+
+
+class Endpoint:
+    """One entry of the config list plus what we have learned about it."""
+
+    def __init__(self, config, index):
+        self.config = config
+        self.index = index
+        self.name = config.get("api_base") or f"openai #{index}"
+        self.model = config.get("model")
+        self.requests = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.latency = None
+        self.remaining = None
+        self.limit = None
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+    def headroom(self):
+        if self.remaining is None or not self.limit:
+            return 1.0
+        return self.remaining / self.limit
+
+    def score(self, default_latency):
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + self.in_flight) / max(self.headroom(), 0.05)
+
+    def counters(self):
+        return {
+            "endpoint": self.name,
+            "model": self.model,
+            "requests": self.requests,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "headroom": self.headroom(),
+            "cooldown_left": max(self.cooldown_until - time.time(), 0.0),
+            "last_error": self.last_error,
+        }
+
+
+class EndpointDispatcher:
+    def __init__(self, config_list, alpha=0.3, cooldown=5.0, max_cooldown=300.0):
+        self.endpoints = [Endpoint(config, i) for i, config in enumerate(config_list)]
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def candidates(self, model):
+        """Endpoints for a model, best first; endpoints on cooldown last, soonest available first."""
+        now = time.time()
+        with self._lock:
+            eligible = [e for e in self.endpoints if not model or e.model in (None, model)]
+            known = [e.latency for e in eligible if e.latency is not None]
+            # endpoints we haven't heard from yet look as fast as the fastest one, so they get tried
+            default_latency = min(known) if known else 0.0
+            ready = sorted((e for e in eligible if e.cooldown_until <= now), key=lambda e: e.score(default_latency))
+            cooling = sorted((e for e in eligible if e.cooldown_until > now), key=lambda e: e.cooldown_until)
+        return ready + cooling
+
+    def call(self, create, params):
+        """Run create(**params) on the best endpoint, failing over to the next ones."""
+        endpoints = self.candidates(params.get("model"))
+        if not endpoints:
+            return create(**params)
+        last_error = None
+        for endpoint in endpoints:
+            request = {k: v for k, v in params.items() if k not in CREDENTIAL_KEYS}
+            request.update({k: endpoint.config[k] for k in CREDENTIAL_KEYS if k in endpoint.config})
+            if "azure" in str(endpoint.config.get("api_type", "")) and "engine" not in request:
+                request["engine"] = endpoint.config.get("engine") or request["model"].replace("gpt-3.5", "gpt-35")
+            with self._lock:
+                endpoint.requests += 1
+                endpoint.in_flight += 1
+            _local.headers = None
+            start = time.perf_counter()
+            try:
+                response = create(**request)
+            except FAILOVER_ERRORS as err:
+                self._record_failure(endpoint, err)
+                last_error = err
+                continue
+            finally:
+                with self._lock:
+                    endpoint.in_flight -= 1
+            self._record_success(endpoint, time.perf_counter() - start)
+            return response
+        raise last_error
+
+    def _rate_headers(self, endpoint):
+        headers = getattr(_local, "headers", None) or {}
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        limit = headers.get("x-ratelimit-limit-requests")
+        if remaining is not None and limit is not None:
+            endpoint.remaining, endpoint.limit = int(remaining), int(limit)
+        return headers
+
+    def _record_success(self, endpoint, seconds):
+        with self._lock:
+            self._rate_headers(endpoint)
+            endpoint.succeeded += 1
+            endpoint.consecutive_failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = seconds
+            else:
+                endpoint.latency = self.alpha * seconds + (1 - self.alpha) * endpoint.latency
+
+    def _record_failure(self, endpoint, err):
+        with self._lock:
+            headers = self._rate_headers(endpoint)
+            endpoint.failed += 1
+            endpoint.consecutive_failures += 1
+            endpoint.last_error = f"{type(err).__name__}: {err}"
+            if isinstance(err, RateLimitError):
+                endpoint.rate_limited += 1
+                endpoint.remaining = 0
+            retry_after = headers.get("Retry-After") or getattr(err, "headers", {}).get("Retry-After")
+            if isinstance(err, AuthenticationError):
+                wait = self.max_cooldown
+            elif retry_after:
+                wait = float(retry_after)
+            else:
+                wait = self.cooldown * 2 ** (endpoint.consecutive_failures - 1)
+            endpoint.cooldown_until = time.time() + min(wait, self.max_cooldown)
+
+    def _session(self):
+        # openai builds one session per thread from this factory; the hook lets us read rate-limit headers
+        session = requests.Session()
+        session.hooks["response"].append(self._on_response)
+        return session
+
+    @staticmethod
+    def _on_response(response, *args, **kwargs):
+        _local.headers = response.headers
+
+    def install(self):
+        """Route openai.ChatCompletion.create and openai.Completion.create (and so all of autogen) through us."""
+        for cls in (openai.ChatCompletion, openai.Completion):
+            if cls in self._originals:
+                continue
+            self._originals[cls] = cls.__dict__["create"]
+            original = cls.create
+
+            def create(klass, *args, _original=original, **params):
+                return self.call(lambda **request: _original(*args, **request), params)
+
+            cls.create = classmethod(create)
+        self._old_session = openai.requestssession
+        openai.requestssession = self._session
+        return self
+
+    def uninstall(self):
+        for cls, original in self._originals.items():
+            cls.create = original
+        self._originals.clear()
+        openai.requestssession = getattr(self, "_old_session", None)
+
+    def counters(self):
+        with self._lock:
+            return [e.counters() for e in self.endpoints]
+
+    def report(self):
+        lines = [f"{'endpoint':<36} {'reqs':>5} {'ok':>5} {'fail':>5} {'429':>4} {'latency':>8} {'headroom':>8}"]
+        for c in self.counters():
+            latency = f"{c['latency']:.2f}s" if c["latency"] is not None else "-"
+            cooling = f"  cooling {c['cooldown_left']:.0f}s" if c["cooldown_left"] else ""
+            lines.append(
+                f"{c['endpoint'][:36]:<36} {c['requests']:>5} {c['succeeded']:>5} {c['failed']:>5} "
+                f"{c['rate_limited']:>4} {latency:>8} {c['headroom']:>8.0%}{cooling}"
+            )
+        return "\n".join(lines)
+
+
+def demo(requests_count=40, concurrency=8):
+    """Three mock servers (fast, slow, flaky and rate limited) behind one dispatcher."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from mock_openai_server import serve_in_background
+
+    servers = [
+        serve_in_background(latency=0.1, name="fast"),
+        serve_in_background(latency=0.5, name="slow"),
+        serve_in_background(latency=0.1, name="flaky", fail_rate=0.3, rpm=10),
+    ]
+    config_list = [{"model": "gpt-4", "api_key": "mock", "api_base": api_base} for _, api_base in servers]
+    dispatcher = EndpointDispatcher(config_list, cooldown=1.0).install()
+
+    def ask(i):
+        response = openai.ChatCompletion.create(model="gpt-4", messages=[{"role": "user", "content": f"question {i}"}])
+        return response["choices"][0]["message"]["content"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        answers = list(executor.map(ask, range(requests_count)))
+    print(f"{len(answers)} requests in {time.perf_counter() - start:.2f}s with {concurrency} threads")
+    print(dispatcher.report())
+    dispatcher.uninstall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-balancing dispatcher for OAI_CONFIG_LIST endpoints")
+    parser.add_argument("--demo", action="store_true", help="run against local mock servers")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    if args.demo:
+        demo(args.requests, args.concurrency)
+    else:
+        parser.print_help()
@@ -0,0 +1,222 @@
+"""
+*** Execution Result Cache ***
+Agents love to re-run the same verification script. In the dogrescues session check_csv_content.py and
+check_updated_csv_content.py were byte-for-byte the same apart from the "# filename:" comment, and each was run again
+and again while nothing had changed. CachingUserProxyAgent remembers the result of python code blocks. The key is a
+hash of the normalized code (comments, blank lines and the filename header don't count) plus a fingerprint (size,
+mtime and content hash) of every work_dir file the code refers to by name, including local modules it imports. If
+the code and its input files are unchanged, the stored output and exit code come back without running anything. If
+any input file is touched or rewritten, the entry no longer matches and the code runs for real.
+
+Only code that looks free of side effects is cached. Code that writes files, touches the network, starts
+processes, asks for input, or reads the clock or random numbers always runs. So does code whose inputs can't be told
+from the code alone: directory listings (glob, os.listdir, os.walk, Path.iterdir, ...) and files opened through a
+computed path. Shell blocks always run, and only successful runs are stored. Entries are kept per work_dir.
+
+It combines with the other executors, since it only wraps run_code:
+example:
+class FastProxy(CachingUserProxyAgent, WarmPoolUserProxyAgent):
+    pass
+"""
+import ast
+import atexit
+import hashlib
+import io
+import os
+import sqlite3
+import time
+import tokenize
+
+import autogen
+
+CACHE_PATH = os.path.join(".cache", "exec_results.db")
+
+# modules and calls that mean a block does more than read its inputs and print
+SIDE_EFFECT_MODULES = {
+    "requests", "urllib", "http", "httpx", "aiohttp", "socket", "smtplib", "ftplib", "subprocess", "shutil",
+    "multiprocessing", "random", "secrets", "uuid", "webbrowser", "yfinance", "selenium", "openai", "autogen", "pip",
+}
+SIDE_EFFECT_CALLS = {
+    "input", "unlink", "mkdir", "touch", "write", "writelines", "write_text", "write_bytes", "writerow", "writerows",
+    "dump", "save", "savefig", "to_csv", "to_excel", "to_json", "to_parquet", "to_sql", "to_pickle",
+    "now", "today", "utcnow", "time", "perf_counter", "sleep", "show",
+}
+# os.<name>() calls that only read; any other os function (system, remove, rename, ...) counts as a side effect
+OS_READ_ONLY = {"getcwd", "stat", "getenv", "fspath", "fsencode", "fsdecode", "cpu_count"}
+# calls that read files the code doesn't name, so input_files can't fingerprint them
+LISTING_CALLS = {"glob", "iglob", "rglob", "listdir", "scandir", "walk", "iterdir"}
+# calls that read the file named by their first argument; fine with a literal, unknowable with anything else
+PATH_READ_CALLS = {"open", "read_csv", "read_excel", "read_json", "read_table", "read_parquet", "read_pickle"}
+WRITE_MODES = set("wax+")
+
+
+def normalize_code(code):
+    """Strip comments (including the '# filename:' header), blank lines and trailing whitespace."""
+    try:
+        tokens = [t for t in tokenize.generate_tokens(io.StringIO(code).readline) if t.type != tokenize.COMMENT]
+        code = tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+
+
+def has_side_effects(tree):
+    """True if the parsed code imports or calls anything that could change the outside world."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(alias.name.split(".")[0] in SIDE_EFFECT_MODULES for alias in node.names):
+                return True
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] in SIDE_EFFECT_MODULES:
+                return True
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+            if name in SIDE_EFFECT_CALLS:
+                return True
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "os":
+                if name not in OS_READ_ONLY:
+                    return True
+            if name == "open" and _opens_for_writing(node):
+                return True
+    return False
+
+
+def has_unresolved_reads(tree):
+    """True if the code reads files that can't be known from the code: directory listings or computed paths."""
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+        if name in LISTING_CALLS:
+            return True
+        if name in PATH_READ_CALLS and node.args:
+            path = node.args[0]
+            if not (isinstance(path, ast.Constant) and isinstance(path.value, str)):
+                return True
+    return False
+
+
+def _opens_for_writing(call):
+    mode = call.args[1] if len(call.args) > 1 else next((k.value for k in call.keywords if k.arg == "mode"), None)
+    if mode is None:
+        return False
+    if not isinstance(mode, ast.Constant) or not isinstance(mode.value, str):
+        return True  # can't tell, assume the worst
+    return bool(WRITE_MODES & set(mode.value))
+
+
+def input_files(tree, work_dir):
+    """Files in work_dir that the code names in a string literal or imports as a local module."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and 0 < len(node.value) < 260:
+            names.add(node.value)
+        elif isinstance(node, ast.Import):
+            names.update(alias.name.replace(".", os.sep) + ".py" for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.replace(".", os.sep) + ".py")
+    files = []
+    for name in names:
+        path = os.path.normpath(os.path.join(work_dir, name))
+        if path.startswith(work_dir + os.sep) and os.path.isfile(path):
+            files.append(path)
+    return sorted(files)
+
+
+class ExecResultCache:
+    """SQLite table of code-block results keyed by code hash + input-file fingerprint."""
+
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, exitcode INTEGER, logs TEXT, seconds REAL, created_at REAL, hits INTEGER DEFAULT 0)"""
+        )
+        self.stats = {"hits": 0, "misses": 0, "uncacheable": 0, "seconds_saved": 0.0}
+        self._hashes = {}  # (path, size, mtime_ns) -> sha256, so unchanged files aren't re-read
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        memo_key = (path, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._hashes:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            self._hashes[memo_key] = digest.hexdigest()
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{self._hashes[memo_key]}"
+
+    def key(self, code, lang, work_dir):
+        """Cache key for a block, or None if the block must always run."""
+        if not lang.startswith("python"):
+            return None
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+        if has_side_effects(tree) or has_unresolved_reads(tree):
+            return None
+        work_dir = os.path.abspath(work_dir)
+        digest = hashlib.sha256(f"{work_dir}\0{normalize_code(code)}".encode())
+        for path in input_files(tree, work_dir):
+            digest.update(f"\0{os.path.relpath(path, work_dir)}\0{self.file_hash(path)}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        row = self.db.execute("SELECT exitcode, logs, seconds FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.db.execute("UPDATE results SET hits = hits + 1 WHERE key = ?", (key,))
+        self.stats["hits"] += 1
+        self.stats["seconds_saved"] += row[2]
+        return row[0], row[1]
+
+    def put(self, key, exitcode, logs, seconds):
+        self.db.execute(
+            "INSERT OR REPLACE INTO results (key, exitcode, logs, seconds, created_at) VALUES (?, ?, ?, ?, ?)",
+            (key, exitcode, logs, seconds, time.time()),
+        )
+
+    def report(self):
+        s = self.stats
+        runs = s["hits"] + s["misses"] + s["uncacheable"]
+        return (
+            f"Execution cache: {s['hits']} of {runs} code blocks served from cache "
+            f"({s['seconds_saved']:.2f}s of execution saved), {s['misses']} misses, {s['uncacheable']} not cacheable"
+        )
+
+
+class CachingUserProxyAgent(autogen.UserProxyAgent):
+    """UserProxyAgent that reuses the stored result of side-effect-free python blocks whose inputs are unchanged."""
+
+    def __init__(self, *args, exec_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exec_cache = exec_cache if isinstance(exec_cache, ExecResultCache) else ExecResultCache(
+            exec_cache or CACHE_PATH
+        )
+        atexit.register(lambda: print(self.exec_cache.report()))
+
+    def run_code(self, code, **kwargs):
+        work_dir = kwargs.get("work_dir") or (self._code_execution_config or {}).get("work_dir") or "extensions"
+        key = self.exec_cache.key(code, kwargs.get("lang", "python"), work_dir)
+        if key is None:
+            self.exec_cache.stats["uncacheable"] += 1
+            return super().run_code(code, **kwargs)
+        cached = self.exec_cache.get(key)
+        if cached is not None:
+            filename = kwargs.get("filename")
+            if filename:
+                # the agent may refer to the saved script later, so still write it
+                with open(os.path.join(work_dir, filename), "w", encoding="utf-8") as f:
+                    f.write(code)
+            print("\n>>>>>>>> EXECUTION CACHE HIT (inputs unchanged, not re-running)", flush=True)
+            return cached[0], cached[1], None
+        start = time.perf_counter()
+        exitcode, logs, image = super().run_code(code, **kwargs)
+        if exitcode == 0:
+            self.exec_cache.put(key, exitcode, logs, time.perf_counter() - start)
+        return exitcode, logs, image
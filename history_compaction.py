@@ -0,0 +1,227 @@
+"""
+*** Keeping the Conversation History Small ***
+Every LLM request resends the whole conversation. With max_consecutive_auto_reply=10 and code output pasted back
+verbatim, the assistant's history grows every turn, and so do the latency and the token bill. HistoryCompactor keeps
+each request under a token budget. The last few messages are always sent as they are. In the older ones:
+- long execution outputs are cut down to their first and last lines,
+- code blocks that appear again later are replaced by a short note,
+- a traceback that ends in the same error as a later one is replaced by that error line.
+If the history is still over budget, the oldest turns (after the original task) are folded into one short summary
+message. Every compacted request is logged with its token count before and after.
+
+planner messages can be compacted the same way, since the assistant pastes code and output into them:
+compactor = HistoryCompactor(max_tokens=6000)
+compactor.attach(assistant)            # compact the assistant's history before every LLM call
+ask_planner = compactor.wrap(ask_planner)  # only the execution output in the question is cut down
+
+Token counts use autogen's count_token (tiktoken) when it is installed, otherwise about 4 characters per token.
+"""
+import atexit
+import hashlib
+import json
+import re
+
+from agent_hooks import llm_messages, wrap_llm_reply
+
+try:
+    from autogen.token_count_utils import count_token
+except ImportError:  # tiktoken isn't installed
+    count_token = None
+
+CODE_BLOCK_RE = re.compile(r"```[ \t]*([\w+-]*)\n(.*?)```", re.S)
+OUTPUT_RE = re.compile(r"^(?:exitcode: -?\d+.*\n)?Code output:.*\n", re.M)
+NUMBER_RE = re.compile(r"\d+")
+
+
+def count_tokens(messages, model="gpt-4"):
+    if count_token is not None:
+        try:
+            return count_token(messages, model)
+        except Exception:
+            pass  # e.g. a model name tiktoken doesn't know
+    return sum(len(m.get("content") or "") + len(json.dumps(m.get("function_call") or "")) for m in messages) // 4 + (
+        4 * len(messages)
+    )
+
+
+def truncate_output(text, max_lines=40, max_chars=4000):
+    """Keep the first and last lines of a long output."""
+    lines = text.splitlines()
+    if len(lines) <= max_lines and len(text) <= max_chars:
+        return text
+    head, tail = lines[: max_lines * 2 // 3], lines[-(max_lines // 3) :]
+    omitted = len(lines) - len(head) - len(tail)
+    text = "\n".join(head + [f"... [{omitted} lines omitted] ..."] + tail) if omitted > 0 else text
+    if len(text) > max_chars:
+        text = text[: max_chars * 2 // 3] + f"\n... [{len(text) - max_chars} characters omitted] ...\n" + text[-max_chars // 3 :]
+    return text
+
+
+def truncate_execution_outputs(text, max_lines=40, max_chars=4000):
+    """Cut down only the execution output pasted into a message ("Code output:" ...), never code blocks or prose."""
+    pieces, last = [], 0
+    for match in list(CODE_BLOCK_RE.finditer(text)) + [None]:
+        prose = text[last : match.start() if match else len(text)]
+        output = OUTPUT_RE.search(prose)
+        if output:
+            prose = prose[: output.end()] + truncate_output(prose[output.end() :], max_lines, max_chars)
+        pieces.append(prose + (match.group(0) if match else ""))
+        last = match.end() if match else len(text)
+    return "".join(pieces)
+
+
+def split_tracebacks(text):
+    """Yield (start, end, error line) for each python traceback in text."""
+    lines = text.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith("Traceback (most recent call last):"):
+            j = i + 1
+            while j < len(lines) and (lines[j].startswith((" ", "\t")) or not lines[j].strip()):
+                j += 1
+            if j < len(lines):
+                yield offsets[i], offsets[j + 1], lines[j].strip()
+                i = j
+        i += 1
+
+
+def error_signature(error):
+    return NUMBER_RE.sub("0", error)
+
+
+def code_key(code):
+    return hashlib.sha1("\n".join(line.rstrip() for line in code.strip().splitlines()).encode()).hexdigest()
+
+
+class HistoryCompactor:
+    def __init__(self, max_tokens=8000, keep_recent=4, max_output_lines=40, model="gpt-4", log=True):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_output_lines = max_output_lines
+        self.model = model
+        self.log = log
+        self.stats = {}  # per agent: requests, tokens before and after compaction
+        atexit.register(lambda: print(self.report()) if self.stats else None)
+
+    def _compact_old(self, messages, later=()):
+        """Truncate outputs and drop code blocks / tracebacks that are repeated later (newest copy is kept).
+        later: the recent messages, which are sent verbatim but still count as "repeated later"."""
+        seen_code, seen_errors = set(), set()
+        for message in later:
+            content = message.get("content")
+            if isinstance(content, str):
+                seen_code.update(code_key(code) for _, code in CODE_BLOCK_RE.findall(content))
+                seen_errors.update(error_signature(error) for _, _, error in split_tracebacks(content))
+        compacted = []
+        for message in reversed(messages):
+            content = message.get("content")
+            if isinstance(content, str) and content:
+                content = self._dedupe_tracebacks(content, seen_errors)
+                content = CODE_BLOCK_RE.sub(lambda m: self._dedupe_code(m, seen_code), content)
+                content = truncate_output(content, self.max_output_lines)
+                message = dict(message, content=content)
+            compacted.append(message)
+        return compacted[::-1]
+
+    @staticmethod
+    def _dedupe_code(match, seen):
+        key = code_key(match.group(2))
+        if key in seen:
+            return f"[{match.group(1) or 'code'} block omitted: repeated in a later message]"
+        seen.add(key)
+        return match.group(0)
+
+    @staticmethod
+    def _dedupe_tracebacks(content, seen):
+        pieces, last = [], 0
+        for start, end, error in split_tracebacks(content):
+            signature = error_signature(error)
+            if signature in seen:
+                pieces.append(content[last:start] + f"[traceback omitted, same error as later: {error}]\n")
+                last = end
+            seen.add(signature)
+        return "".join(pieces) + content[last:]
+
+    def _summarize(self, messages):
+        lines = ["Summary of earlier turns (compacted to save tokens):"]
+        for m in messages:
+            text = m.get("content") or (f"called {m['function_call'].get('name')}" if m.get("function_call") else "")
+            first = " ".join(text.split())[:160]
+            lines.append(f"- {m.get('name') or m.get('role')}: {first}")
+        return {"role": "system", "content": "\n".join(lines)}
+
+    def compact(self, messages, system=(), max_tokens=None):
+        """Return (messages to send, tokens before, tokens after). system: messages counted but not compacted."""
+        max_tokens = max_tokens or self.max_tokens
+        system = list(system)
+        before = count_tokens(system + list(messages), self.model)
+        split = max(len(messages) - self.keep_recent, 0)
+        recent = list(messages[split:])
+        older = self._compact_old(messages[:split], recent)
+        result = older + recent
+        after = count_tokens(system + result, self.model)
+        # still over budget: fold the oldest turns (never the original task) into one summary message
+        folded = []
+        while after > max_tokens and len(older) > 1:
+            folded.append(older.pop(1))
+            result = older[:1] + [self._summarize(folded)] + older[1:] + recent
+            after = count_tokens(system + result, self.model)
+        # last resort: cut long outputs in the recent turns too, except the newest message
+        if after > max_tokens:
+            result = [dict(m, content=truncate_output(m["content"], self.max_output_lines // 2, 2000))
+                      if isinstance(m.get("content"), str) else m for m in result[:-1]] + result[-1:]
+            after = count_tokens(system + result, self.model)
+        return result, before, after
+
+    def _record(self, name, before, after):
+        stats = self.stats.setdefault(name, {"requests": 0, "tokens_before": 0, "tokens_after": 0})
+        stats["requests"] += 1
+        stats["tokens_before"] += before
+        stats["tokens_after"] += after
+
+    def attach(self, agent, max_tokens=None):
+        """Compact an agent's history before each of its LLM calls; max_tokens overrides the budget for this agent."""
+
+        def wrapper(inner, recipient, messages, sender, config):
+            compacted, before, after = self.compact(messages, llm_messages(recipient, []), max_tokens)
+            self._record(recipient.name, before, after)
+            if messages and "context" in messages[-1]:
+                # generate_oai_reply pops the context from the last message; hand it over
+                compacted[-1] = dict(compacted[-1], context=messages[-1].pop("context"))
+            if self.log:
+                print(f"\n>>>>>>>> HISTORY {recipient.name}: {before} -> {after} tokens "
+                      f"({len(messages)} -> {len(compacted)} messages)", flush=True)
+            return inner(messages=compacted)
+
+        return wrap_llm_reply(agent, wrapper)
+
+    def wrap(self, func):
+        """Compact the text passed to a one-argument function such as ask_planner(message).
+
+        The message is the question being asked right now, so only the execution output pasted into it is cut down;
+        the question itself and its code blocks are passed on whole."""
+
+        name = getattr(func, "__name__", "message")
+
+        def compacted(message):
+            text = truncate_execution_outputs(message, self.max_output_lines)
+            before, after = count_tokens([{"content": message}], self.model), count_tokens([{"content": text}], self.model)
+            self._record(name, before, after)
+            if self.log and text != message:
+                print(f"\n>>>>>>>> HISTORY {name}: {before} -> {after} tokens", flush=True)
+            return func(text)
+
+        compacted.__name__ = name
+        compacted.__doc__ = func.__doc__
+        return compacted
+
+    def report(self):
+        lines = ["History compaction:"]
+        for name, s in self.stats.items():
+            saved = s["tokens_before"] - s["tokens_after"]
+            lines.append(f"  {name}: {s['requests']} requests, {s['tokens_before']} -> {s['tokens_after']} tokens "
+                         f"({saved} saved)")
+        return "\n".join(lines)
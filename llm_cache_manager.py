@@ -0,0 +1,411 @@
+"""
+*** Managing the LLM Cache ***
+Every seed you put in an llm_config gets its own cache under .cache/<seed>/cache.db (1337 for MultiAgentMadness, 1003
+for Finding Fosters, 41 is autogen's default, and so on). Autogen never removes anything from those files, so they
+only grow, and nothing is shared between seeds. This script lets you look inside them and keep them in check:
+
+python llm_cache_manager.py stats
+python llm_cache_manager.py list --seed 1003 --model gpt-4 --prefix "verify the execution" --sort size
+python llm_cache_manager.py evict --seed 1003 --ttl 30 --max-mb 50      # drop entries older than 30 days, cap at 50 MB
+python llm_cache_manager.py compact                                     # VACUUM every cache file
+python llm_cache_manager.py consolidate                                 # copy every seed into .cache/shared/cas.db
+
+Eviction supports a TTL, an LRU entry cap and an LRU size cap. Autogen's diskcache only records the store time, so
+for seed files "least recently used" means least recently stored.
+
+The shared store is content addressed. Each distinct response is stored once, by its sha256, no matter how many
+seeds or prompts point to it. Each entry is indexed by (seed, sha256 of the prompt) instead of the full prompt JSON,
+and that index stays small and fast with hundreds of thousands of entries (try "bench"). To have autogen read from
+and write to the shared store instead of the per-seed files, call use_shared_cache() before starting a chat.
+Entries that are still only in an old seed file are found there and copied over the first time they are asked for.
+example:
+from llm_cache_manager import use_shared_cache
+use_shared_cache()
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import time
+import types
+
+import diskcache
+
+CACHE_ROOT = ".cache"
+SHARED_DIR = "shared"
+DAY = 24 * 3600
+
+
+def describe_key(key):
+    """Model name and prompt text (last message) of an autogen cache key, which is the request config as JSON."""
+    try:
+        config = json.loads(key)
+    except (TypeError, ValueError):
+        return None, ""
+    prompt = config.get("prompt") or ""
+    for message in reversed(config.get("messages") or []):
+        # the last turn may be a bare function call; show the latest message that has text
+        if message.get("content"):
+            prompt = message["content"]
+            break
+    return config.get("model"), prompt if isinstance(prompt, str) else json.dumps(prompt)
+
+
+def key_hash(key):
+    return hashlib.sha256(key.encode() if isinstance(key, str) else key).hexdigest()
+
+
+class SeedCacheFile:
+    """One autogen seed cache (.cache/<seed>/cache.db), read and pruned with plain sqlite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.seed = os.path.basename(os.path.dirname(path))
+        self.name = f"seed {self.seed}"
+        self.db = sqlite3.connect(path, timeout=60)
+
+    def entries(self):
+        rows = self.db.execute(
+            "SELECT rowid, key, length(key) + COALESCE(length(value), 0) + size, store_time, "
+            "COALESCE(access_time, store_time) FROM Cache"
+        )
+        for rowid, key, size, stored, accessed in rows:
+            model, prompt = describe_key(key)
+            yield {"store": self.name, "id": rowid, "model": model, "prompt": prompt, "size": size,
+                   "stored": stored, "accessed": accessed}
+
+    def items(self):
+        """(key, pickled value, store time) for every entry, for copying into the shared store."""
+        rows = self.db.execute("SELECT key, raw, mode, value, filename, store_time FROM Cache")
+        for key, raw, mode, value, filename, stored in rows:
+            if not raw or mode != 4:  # only pickled values, which is all autogen ever stores
+                continue
+            if value is None and filename:
+                with open(os.path.join(os.path.dirname(self.path), filename), "rb") as f:
+                    value = f.read()
+            yield key, value, stored
+
+    def delete(self, ids):
+        with self.db:
+            for rowid in ids:
+                row = self.db.execute("SELECT filename FROM Cache WHERE rowid = ?", (rowid,)).fetchone()
+                if row and row[0]:
+                    try:
+                        os.remove(os.path.join(os.path.dirname(self.path), row[0]))
+                    except OSError:
+                        pass
+                self.db.execute("DELETE FROM Cache WHERE rowid = ?", (rowid,))
+
+    def file_size(self):
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def compact(self):
+        # VACUUM goes through the WAL, so checkpoint again afterwards to actually shrink the files
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.db.execute("VACUUM")
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.db.close()
+
+
+class SharedStore:
+    """Content-addressed response store shared by all seeds: blobs by sha256, entries by (seed, prompt hash)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, value BLOB, size INTEGER) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS entries (
+        seed TEXT, key_hash TEXT, model TEXT, prompt TEXT, blob TEXT, size INTEGER, stored REAL, accessed REAL,
+        PRIMARY KEY (seed, key_hash)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+    CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob);
+    """
+
+    def __init__(self, path=os.path.join(CACHE_ROOT, SHARED_DIR, "cas.db")):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.name = "shared"
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+
+    def get(self, seed, key):
+        """Pickled response for a cache key, or None."""
+        khash = key_hash(key)
+        row = self.db.execute(
+            "SELECT b.value FROM entries e JOIN blobs b ON b.hash = e.blob WHERE e.seed = ? AND e.key_hash = ?",
+            (seed, khash),
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE entries SET accessed = ? WHERE seed = ? AND key_hash = ?", (time.time(), seed, khash))
+        return row[0]
+
+    def put(self, seed, key, value, stored=None):
+        """Store a pickled response; returns True if its content was new to the store."""
+        blob = hashlib.sha256(value).hexdigest()
+        model, prompt = describe_key(key)
+        now = time.time()
+        new_blob = self.db.execute(
+            "INSERT OR IGNORE INTO blobs (hash, value, size) VALUES (?, ?, ?)", (blob, value, len(value))
+        ).rowcount == 1
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (seed, key_hash(key), model, prompt[:500], blob, len(value), stored or now, stored or now),
+        )
+        return new_blob
+
+    def import_seed(self, seed_file):
+        """Copy a seed cache into the store. Returns (entries copied, responses that were already stored)."""
+        copied = reused = 0
+        self.db.execute("BEGIN")
+        for key, value, stored in seed_file.items():
+            copied += 1
+            if not self.put(seed_file.seed, key, value, stored):
+                reused += 1
+        self.db.execute("COMMIT")
+        return copied, reused
+
+    def entries(self):
+        rows = self.db.execute("SELECT seed, key_hash, model, prompt, size, stored, accessed FROM entries")
+        for seed, khash, model, prompt, size, stored, accessed in rows:
+            yield {"store": f"shared/{seed}", "id": (seed, khash), "model": model, "prompt": prompt, "size": size,
+                   "stored": stored, "accessed": accessed}
+
+    def delete(self, ids):
+        self.db.execute("BEGIN")
+        self.db.executemany("DELETE FROM entries WHERE seed = ? AND key_hash = ?", list(ids))
+        # responses nobody points to any more
+        self.db.execute("DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM entries WHERE entries.blob = blobs.hash)")
+        self.db.execute("COMMIT")
+
+    def clear(self, seed):
+        self.delete([(seed, khash) for (khash,) in self.db.execute(
+            "SELECT key_hash FROM entries WHERE seed = ?", (seed,)).fetchall()])
+
+    def stats(self):
+        entries, logical = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        blobs, stored = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"entries": entries, "responses": blobs, "logical_bytes": logical, "stored_bytes": stored}
+
+    def file_size(self):
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def compact(self):
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.db.execute("VACUUM")
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.db.close()
+
+
+class SharedCache:
+    """Stand-in for diskcache.Cache(".cache/<seed>") that reads and writes the shared store.
+
+    On a miss it looks in the old per-seed file and copies what it finds into the store.
+    """
+
+    _stores = {}
+
+    def __init__(self, directory):
+        directory = os.path.normpath(directory)
+        self.seed = os.path.basename(directory)
+        path = os.path.join(os.path.dirname(directory), SHARED_DIR, "cas.db")
+        if path not in SharedCache._stores:
+            SharedCache._stores[path] = SharedStore(path)
+        self.store = SharedCache._stores[path]
+        # read through diskcache, which keeps large responses in files next to cache.db instead of in the table
+        self.legacy = diskcache.Cache(directory) if os.path.exists(os.path.join(directory, "cache.db")) else None
+
+    def get(self, key, default=None):
+        value = self.store.get(self.seed, key)
+        if value is None and self.legacy is not None:
+            response = self.legacy.get(key)
+            if response is not None:
+                self.store.put(self.seed, key, pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL))
+                return response
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.store.put(self.seed, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return True
+
+    def clear(self):
+        self.store.clear(self.seed)
+
+    def close(self):
+        if self.legacy is not None:
+            self.legacy.close()
+            self.legacy = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def use_shared_cache():
+    """Point autogen's completion cache at the shared content-addressed store instead of .cache/<seed>/cache.db."""
+    from autogen.oai import completion
+
+    completion.diskcache = types.SimpleNamespace(Cache=SharedCache)
+
+
+def open_stores(root=CACHE_ROOT, seed=None, shared=False):
+    if shared:
+        return [SharedStore(os.path.join(root, SHARED_DIR, "cas.db"))]
+    paths = [os.path.join(root, str(seed), "cache.db")] if seed else sorted(glob.glob(os.path.join(root, "*", "cache.db")))
+    stores = [SeedCacheFile(p) for p in paths if os.path.exists(p)]
+    if not seed and os.path.exists(os.path.join(root, SHARED_DIR, "cas.db")):
+        stores.append(SharedStore(os.path.join(root, SHARED_DIR, "cas.db")))
+    return stores
+
+
+def select(entries, model=None, prefix=None, min_size=0, older_than=None):
+    now = time.time()
+    for entry in entries:
+        if model and not (entry["model"] or "").startswith(model):
+            continue
+        if prefix and not entry["prompt"].lstrip().lower().startswith(prefix.lower()):
+            continue
+        if entry["size"] < min_size:
+            continue
+        if older_than is not None and now - entry["stored"] < older_than:
+            continue
+        yield entry
+
+
+def eviction_candidates(entries, ttl=None, max_entries=None, max_bytes=None):
+    """Entries to drop: older than ttl, then least recently used beyond max_entries or max_bytes."""
+    now = time.time()
+    entries = sorted(entries, key=lambda e: e["accessed"], reverse=True)
+    doomed, kept, kept_bytes = [], 0, 0
+    for entry in entries:
+        expired = ttl is not None and now - entry["stored"] > ttl
+        over_count = max_entries is not None and kept >= max_entries
+        over_size = max_bytes is not None and kept_bytes + entry["size"] > max_bytes
+        if expired or over_count or over_size:
+            doomed.append(entry)
+        else:
+            kept += 1
+            kept_bytes += entry["size"]
+    return doomed
+
+
+def benchmark(entries=200_000, lookups=20_000):
+    """Time inserts and random lookups in a throwaway shared store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SharedStore(os.path.join(tmp, "cas.db"))
+        keys = [json.dumps({"model": "gpt-4", "messages": [{"role": "user", "content": f"question {i} " * 20}]})
+                for i in range(entries)]
+        start = time.perf_counter()
+        store.db.execute("BEGIN")
+        for i, key in enumerate(keys):
+            store.put("bench", key, pickle.dumps({"answer": i % 1000}))  # only 1000 distinct responses
+        store.db.execute("COMMIT")
+        insert_seconds = time.perf_counter() - start
+        sample = random.Random(0).sample(keys, min(lookups, entries))
+        start = time.perf_counter()
+        for key in sample:
+            assert store.get("bench", key) is not None
+        lookup_seconds = time.perf_counter() - start
+        stats = store.stats()
+        store.close()
+    print(f"{entries} entries inserted in {insert_seconds:.1f}s, {stats['responses']} distinct responses stored")
+    print(f"{len(sample)} random lookups: {lookup_seconds / len(sample) * 1e6:.0f} us per lookup")
+
+
+def print_entries(entries, limit=None):
+    now = time.time()
+    print(f"{'store':<14} {'model':<22} {'size':>9} {'age(d)':>7}  prompt")
+    for i, e in enumerate(entries):
+        if limit is not None and i >= limit:
+            break
+        prompt = " ".join(e["prompt"].split())[:60]
+        print(f"{e['store']:<14} {(e['model'] or '?')[:22]:<22} {e['size']:>9} {(now - e['stored']) / DAY:>7.1f}  {prompt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, evict, compact and consolidate autogen's LLM cache")
+    parser.add_argument("--root", default=CACHE_ROOT, help="cache root (default .cache)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("list", "evict", "compact", "stats"):
+        cmd = commands.add_parser(name)
+        cmd.add_argument("--seed", help="only this seed's cache file")
+        cmd.add_argument("--shared", action="store_true", help="only the shared store")
+        if name in ("list", "evict"):
+            cmd.add_argument("--model", help="model name or prefix, e.g. gpt-4")
+            cmd.add_argument("--prefix", help="prompt (last message) starts with this text")
+            cmd.add_argument("--min-size", type=int, default=0, help="bytes")
+            cmd.add_argument("--older-than", type=float, help="days")
+        if name == "list":
+            cmd.add_argument("--sort", choices=["size", "age", "accessed"], default="age")
+            cmd.add_argument("--limit", type=int)
+        if name == "evict":
+            cmd.add_argument("--ttl", type=float, help="drop entries stored more than this many days ago")
+            cmd.add_argument("--max-entries", type=int, help="keep at most this many (least recently used go first)")
+            cmd.add_argument("--max-mb", type=float, help="keep at most this many MB (least recently used go first)")
+            cmd.add_argument("--dry-run", action="store_true")
+    commands.add_parser("consolidate", help="copy every seed cache into the shared content-addressed store")
+    bench = commands.add_parser("bench", help="time lookups in a large shared store")
+    bench.add_argument("--entries", type=int, default=200_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.entries)
+        return
+    if args.command == "consolidate":
+        shared = SharedStore(os.path.join(args.root, SHARED_DIR, "cas.db"))
+        for seed_file in open_stores(args.root):
+            if isinstance(seed_file, SeedCacheFile):
+                copied, reused = shared.import_seed(seed_file)
+                print(f"{seed_file.name}: {copied} entries copied, {reused} responses were already in the store")
+        s = shared.stats()
+        print(f"shared store: {s['entries']} entries, {s['responses']} distinct responses, "
+              f"{s['stored_bytes'] / 1024:.0f} KiB stored for {s['logical_bytes'] / 1024:.0f} KiB of entries")
+        return
+
+    for store in open_stores(args.root, args.seed, args.shared):
+        before = store.file_size()
+        if args.command == "stats":
+            entries = list(store.entries())
+            models = {}
+            for e in entries:
+                models[e["model"]] = models.get(e["model"], 0) + 1
+            print(f"{store.name}: {len(entries)} entries, {sum(e['size'] for e in entries) / 1024:.0f} KiB of data "
+                  f"in a {before / 1024:.0f} KiB file; by model: {models}")
+        elif args.command == "list":
+            entries = select(store.entries(), args.model, args.prefix, args.min_size,
+                             args.older_than * DAY if args.older_than is not None else None)
+            sort_key = {"size": lambda e: -e["size"], "age": lambda e: e["stored"], "accessed": lambda e: e["accessed"]}
+            print_entries(sorted(entries, key=sort_key[args.sort]), args.limit)
+        elif args.command == "evict":
+            entries = select(store.entries(), args.model, args.prefix, args.min_size,
+                             args.older_than * DAY if args.older_than is not None else None)
+            doomed = eviction_candidates(
+                entries,
+                args.ttl * DAY if args.ttl is not None else None,
+                args.max_entries,
+                int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None,
+            )
+            if not args.dry_run:
+                store.delete([e["id"] for e in doomed])
+            verb = "would evict" if args.dry_run else "evicted"
+            print(f"{store.name}: {verb} {len(doomed)} entries ({sum(e['size'] for e in doomed) / 1024:.0f} KiB)")
+        elif args.command == "compact":
+            store.compact()
+            print(f"{store.name}: {before / 1024:.0f} KiB -> {store.file_size() / 1024:.0f} KiB")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
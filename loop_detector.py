@@ -0,0 +1,126 @@
+"""
+*** Catching Stuck Conversations ***
+The comment on max_consecutive_auto_reply admits it: "the same message repeats over and over again many times before
+the user is asked for input." Every repeat is another LLM round trip and another code execution. LoopDetector watches
+the messages an agent (usually user_proxy) receives and fingerprints each of them: the whole message, every code
+block in it, and the error at the end of every traceback or failed execution. Once the same thing shows up
+max_repeats times within the last window messages, the loop is cut short:
+- the same error (line numbers ignored), e.g. the same KeyError after every "fix",
+- the same code block sent for execution again,
+- the same message, e.g. identical planner advice coming back from ask_planner.
+
+With on_loop="escalate" the human is asked for feedback right away instead of after max_consecutive_auto_reply
+rounds. Pressing enter (or human_input_mode="NEVER") stops the conversation. With on_loop="stop" it just stops. The
+report at the end estimates the turns and tokens saved: the auto replies that were left, each resending the history.
+
+example:
+loops = LoopDetector(max_repeats=3, window=12, on_loop="escalate")
+loops.attach(user_proxy)
+"""
+import atexit
+import hashlib
+import json
+
+from autogen import Agent
+
+from history_compaction import CODE_BLOCK_RE, code_key, count_tokens, error_signature, split_tracebacks
+from semantic_cache import normalize_prompt
+
+
+def failure_signatures(content):
+    """Error lines of the tracebacks in a message, or the last line of a failed execution without one."""
+    errors = [error_signature(error) for _, _, error in split_tracebacks(content)]
+    if not errors and content.startswith("exitcode: ") and not content.startswith("exitcode: 0"):
+        lines = [line.strip() for line in content.splitlines() if line.strip()]
+        errors.append(error_signature(lines[-1]))
+    return errors
+
+
+def fingerprint(message):
+    """What a message is made of: a hash of the whole (normalized) message, its code blocks and its errors."""
+    content = message.get("content") or ""
+    whole = json.dumps([message.get("role"), message.get("name"), normalize_prompt(content), message.get("function_call")])
+    return {
+        "message": hashlib.sha1(whole.encode()).hexdigest(),
+        "code": [code_key(code) for _, code in CODE_BLOCK_RE.findall(content)],
+        "errors": failure_signatures(content),
+    }
+
+
+class LoopDetector:
+    def __init__(self, max_repeats=3, window=12, on_loop="escalate", model="gpt-4"):
+        if on_loop not in ("escalate", "stop"):
+            raise ValueError('on_loop must be "escalate" or "stop"')
+        self.max_repeats = max_repeats
+        self.window = window
+        self.on_loop = on_loop
+        self.model = model
+        self._start = {}  # sender -> index of the first message still watched (moves on after the human steps in)
+        self.stats = {"loops": 0, "turns_saved": 0, "tokens_saved": 0, "reasons": []}
+        atexit.register(lambda: print(self.report()) if self.stats["loops"] else None)
+
+    def check(self, messages):
+        """Return a description of the repetition in messages, or None."""
+        counts = {}
+        for message in messages[-self.window :]:
+            prints = fingerprint(message)
+            # empty auto replies are how user_proxy answers plain text, they say nothing on their own
+            keys = [("message", prints["message"])] if message.get("content") or message.get("function_call") else []
+            keys += [("code block", key) for key in set(prints["code"])]
+            keys += [("error", error) for error in set(prints["errors"])]
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+                if counts[key] >= self.max_repeats:
+                    what, value = key
+                    detail = f": {value}" if what == "error" else ""
+                    return f"the same {what} {counts[key]} times in the last {self.window} messages{detail}"
+        return None
+
+    def _estimate_savings(self, agent, sender, messages):
+        turns = max(agent._max_consecutive_auto_reply_dict[sender] - agent._consecutive_auto_reply_counter[sender], 0)
+        # each skipped turn would have resent (at least) the history so far, plus a system message
+        tokens = turns * count_tokens(list(getattr(sender, "_oai_system_message", [])) + list(messages), self.model)
+        return turns, tokens
+
+    def _reply(self, recipient, messages=None, sender=None, config=None):
+        if messages is None:
+            messages = recipient._oai_messages[sender]
+        start = self._start.get(sender, 0)
+        if start > len(messages):  # the conversation was restarted
+            start = self._start[sender] = 0
+        reason = self.check(messages[start:])
+        if reason is None:
+            return False, None
+        turns, tokens = self._estimate_savings(recipient, sender, messages)
+        self.stats["loops"] += 1
+        self.stats["turns_saved"] += turns
+        self.stats["tokens_saved"] += tokens
+        self.stats["reasons"].append(reason)
+        print(f"\n>>>>>>>> LOOP DETECTED between {sender.name} and {recipient.name}: {reason}", flush=True)
+        self._start[sender] = len(messages)
+        reply = ""
+        if self.on_loop == "escalate" and recipient.human_input_mode != "NEVER":
+            reply = recipient.get_human_input(
+                f"{sender.name} seems to be stuck ({reason}). Give feedback to {sender.name}, "
+                "or press enter or type 'exit' to stop the conversation: "
+            )
+        recipient._consecutive_auto_reply_counter[sender] = 0
+        if not reply or reply == "exit":
+            return True, None
+        return True, reply
+
+    def attach(self, agent):
+        """Watch every conversation agent takes part in; runs before its other reply functions."""
+        agent.register_reply([Agent, None], LoopDetector._reply_func, config=self)
+        return agent
+
+    @staticmethod
+    def _reply_func(recipient, messages=None, sender=None, config=None):
+        return config._reply(recipient, messages, sender)
+
+    def report(self):
+        s = self.stats
+        lines = [f"Loop detector: {s['loops']} loops cut short, about {s['turns_saved']} turns and "
+                 f"{s['tokens_saved']} prompt tokens saved"]
+        lines += [f"  - {reason}" for reason in s["reasons"]]
+        return "\n".join(lines)
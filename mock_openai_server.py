@@ -0,0 +1,193 @@
+"""
+*** Mock OpenAI Server ***
+A tiny OpenAI-compatible chat completions endpoint, so the dispatcher, pools and caches in this repo can be tried
+without an API key or a bill. It answers POST .../chat/completions (which covers OpenAI-style api_base values like
+http://127.0.0.1:8001/v1 and Azure-style deployment URLs) with a short canned reply. It can be told to be slow, to
+fail some requests with 503, or to enforce a requests-per-minute limit. The limit comes with the same
+x-ratelimit-* and Retry-After headers the real API sends. Requests with "stream": true get the reply back as
+server-sent events, a few characters at a time (--token-delay seconds apart). GET /stats returns its counters.
+From python, serve_in_background(responder=...) takes a function that gets the request and returns a recorded
+response (or None for the canned reply); replay_bench.py uses it to play back the LLM cache.
+
+python mock_openai_server.py --port 8001 --latency 0.2
+python mock_openai_server.py --port 8002 --latency 0.8 --rpm 30 --fail-rate 0.1
+python mock_openai_server.py --port 8003 --token-delay 0.05 --reply-file long_reply.md
+
+Point an OAI_CONFIG_LIST entry at it like this:
+{"model": "gpt-4", "api_key": "mock", "api_base": "http://127.0.0.1:8001/v1"}
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(options):
+    counters = collections.Counter()
+    window = collections.deque()  # request times in the last minute, for --rpm
+    lock = threading.Lock()
+    responder = getattr(options, "responder", None)
+
+    def respond(request):
+        return (responder and responder(request)) or completion(request, options)
+
+    class MockOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, request, headers):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")  # the end of the stream is the end of the body
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.close_connection = True
+            for chunk in stream_chunks(respond(request)):
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(options.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with lock:
+                    self._send_json(200, dict(counters))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not self.path.split("?")[0].endswith("/completions"):
+                self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                return
+            now = time.time()
+            with lock:
+                counters["requests"] += 1
+                while window and now - window[0] > 60:
+                    window.popleft()
+                limited = options.rpm and len(window) >= options.rpm
+                if not limited:
+                    window.append(now)
+                remaining = max(options.rpm - len(window), 0) if options.rpm else 1000
+                retry_after = 60 - (now - window[0]) if limited else 0
+            rate_headers = {
+                "x-ratelimit-limit-requests": str(options.rpm or 1000),
+                "x-ratelimit-remaining-requests": str(remaining),
+            }
+            if limited:
+                with lock:
+                    counters["rate_limited"] += 1
+                rate_headers["Retry-After"] = str(max(int(retry_after), 1))
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, rate_headers)
+                return
+            time.sleep(max(options.latency + random.uniform(-options.jitter, options.jitter), 0))
+            if options.fail_rate and random.random() < options.fail_rate:
+                with lock:
+                    counters["failed"] += 1
+                self._send_json(503, {"error": {"message": "The server is overloaded", "type": "server_error"}})
+                return
+            with lock:
+                counters["ok"] += 1
+                counters["streamed"] += bool(request.get("stream"))
+            if request.get("stream"):
+                self._send_stream(request, rate_headers)
+            else:
+                self._send_json(200, respond(request), rate_headers)
+
+        def log_message(self, format, *log_args):
+            pass
+
+    return MockOpenAIHandler
+
+
+def completion(request, options):
+    """A chat.completion (or text_completion) response echoing the start of the last message."""
+    messages = request.get("messages") or [{"content": request.get("prompt") or ""}]
+    last = str(messages[-1].get("content") or "")
+    content = options.reply or f"[mock {options.name}] {' '.join(last.split())[:80]}"
+    usage = {"prompt_tokens": sum(len(str(m.get("content") or "")) // 4 for m in messages),
+             "completion_tokens": len(content) // 4}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    if "messages" not in request:
+        return {"id": f"cmpl-{uuid.uuid4().hex[:24]}", "object": "text_completion", "created": int(time.time()),
+                "model": request.get("model", "mock"), "usage": usage,
+                "choices": [{"index": 0, "text": content, "finish_reason": "stop", "logprobs": None}]}
+    return {"id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "mock"), "usage": usage,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]}
+
+
+def stream_chunks(response):
+    """A completion split into chat.completion.chunk (or text_completion) events of a few characters each."""
+    choice = response["choices"][0]
+    chat = "message" in choice
+    text = (choice["message"].get("content") if chat else choice["text"]) or ""
+    pieces = re.findall(r"\s*\S{1,6}|\s+", text) or [""]
+    base = {"id": response["id"], "created": response["created"], "model": response["model"],
+            "object": "chat.completion.chunk" if chat else "text_completion"}
+    if chat:
+        yield dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+    for piece in pieces:
+        delta = {"delta": {"content": piece}} if chat else {"text": piece, "logprobs": None}
+        yield dict(base, choices=[dict(delta, index=0, finish_reason=None)])
+    if chat and choice["message"].get("function_call"):
+        call = {"delta": {"function_call": choice["message"]["function_call"]}}
+        yield dict(base, choices=[dict(call, index=0, finish_reason=None)])
+    end = {"delta": {}} if chat else {"text": "", "logprobs": None}
+    yield dict(base, choices=[dict(end, index=0, finish_reason=choice.get("finish_reason") or "stop")])
+
+
+def parse_options(argv=None, **overrides):
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--name", help="shown in replies (default: the port)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.05, help="+/- random seconds added to the latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before answering 429 (0 = no limit)")
+    parser.add_argument("--reply", help="fixed reply text")
+    parser.add_argument("--reply-file", help="read the fixed reply text from a file")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    options = parser.parse_args(argv or [])
+    for name, value in overrides.items():
+        setattr(options, name, value)
+    if options.reply_file:
+        with open(options.reply_file, encoding="utf-8") as f:
+            options.reply = f.read()
+    options.name = options.name or str(options.port)
+    return options
+
+
+def serve_in_background(port=0, **overrides):
+    """Start a mock server on a thread (port 0 picks a free port). Returns (server, api_base)."""
+    options = parse_options(port=port, **overrides)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(options))
+    options.name = overrides.get("name") or str(server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    import sys
+
+    options = parse_options(sys.argv[1:])
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), make_handler(options))
+    print(f"Mock OpenAI API listening on http://127.0.0.1:{options.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,153 @@
+"""
+*** Routing Requests to Cheaper Models ***
+The scripts filter the config list down to one model (gpt-4, or gpt-4-1106-preview) and every agent uses it for every
+request. Plenty of turns don't need it: "verify this output looks right" or "the file was saved, what's next?".
+ModelRouter picks a model for each request from a ladder of models, cheapest first. It looks at:
+- the agent's role: role_min_tier can keep an agent off the cheapest models,
+- the prompt size: prompts over small_max_tokens go to a bigger model,
+- a complexity score for the latest message. Tracebacks, code blocks and words like "plan", "design" or "debug"
+  raise it. Words like "verify", "check" or "confirm" lower it. Scores over max_simple_score go to a bigger model.
+
+If the cheaper model fails (an API error, an empty reply, or a function call with broken arguments), the request is
+retried one step up the ladder. Every request is appended to .cache/routes.jsonl with its route, reason, complexity,
+tokens, latency and outcome, so the rules can be tuned from real runs. A per-route summary is printed at exit.
+
+example:
+router = ModelRouter(autogen.config_list_from_json("OAI_CONFIG_LIST", filter_dict={"model": ["gpt-3.5-turbo", "gpt-4"]}))
+router.attach(assistant)
+router.attach(planner, role_min_tier=1)      # the planner never goes below the second model
+
+Models on the ladder that aren't in the config list are skipped, so with a single model routing changes nothing.
+"""
+import atexit
+import json
+import os
+import re
+import time
+
+from agent_hooks import llm_messages, wrap_llm_reply
+from history_compaction import CODE_BLOCK_RE, count_tokens, split_tracebacks
+
+DEFAULT_LADDER = ("gpt-3.5-turbo", "gpt-3.5-turbo-16k", "gpt-4-1106-preview", "gpt-4", "gpt-4-32k")
+LOG_PATH = os.path.join(".cache", "routes.jsonl")
+COMPLEX_WORDS = re.compile(r"\b(plan|design|architect\w*|refactor|debug|why|optimi[sz]e|implement|create|build)\b", re.I)
+SIMPLE_WORDS = re.compile(r"\b(verify|check|confirm|looks? (right|good|correct)|summari[sz]e|yes or no)\b", re.I)
+
+
+def complexity(text):
+    """Rough complexity score of a message; higher means a bigger model is more likely to be needed."""
+    score = 2 * min(len(list(split_tracebacks(text))) + ("exitcode: 1" in text), 2)
+    score += min(len(CODE_BLOCK_RE.findall(text)), 3)
+    score += 2 if COMPLEX_WORDS.search(text) else 0
+    score -= 2 if SIMPLE_WORDS.search(text) else 0
+    return score
+
+
+def bad_reply(reply, llm_config):
+    """Why a reply should be retried on a bigger model, or None if it looks fine."""
+    if not reply:
+        return "empty reply"
+    if isinstance(reply, dict) and reply.get("function_call"):
+        call = reply["function_call"]
+        names = {f["name"] for f in llm_config.get("functions", [])}
+        if names and call.get("name") not in names:
+            return f"unknown function {call.get('name')}"
+        try:
+            json.loads(call.get("arguments") or "{}")
+        except ValueError:
+            return "function arguments are not valid JSON"
+    return None
+
+
+class ModelRouter:
+    def __init__(self, config_list, ladder=DEFAULT_LADDER, small_max_tokens=3000, max_simple_score=2,
+                 log_path=LOG_PATH, log=True):
+        self.config_list = config_list
+        available = {c.get("model") for c in config_list}
+        self.ladder = [model for model in ladder if model in available]
+        if not self.ladder:
+            raise ValueError(f"none of the models {list(ladder)} are in the config list")
+        self.small_max_tokens = small_max_tokens
+        self.max_simple_score = max_simple_score
+        self.log_path = log_path
+        self.log = log
+        self.routes = {}  # (agent, model) -> counters
+        atexit.register(lambda: print(self.report()) if self.routes else None)
+
+    def choose(self, messages, role_min_tier=0):
+        """Return (tier, reason, prompt tokens, complexity) for a request."""
+        tokens = count_tokens(messages)
+        last = messages[-1] if messages else {}
+        text = last.get("content") or json.dumps(last.get("function_call") or "")
+        score = complexity(text)
+        tier, reasons = 0, []
+        if tokens > self.small_max_tokens:
+            tier, reasons = tier + 1, reasons + [f"{tokens} prompt tokens"]
+        if score > self.max_simple_score:
+            tier, reasons = tier + 1, reasons + [f"complexity {score}"]
+        if role_min_tier > tier:
+            tier, reasons = role_min_tier, reasons + ["role"]
+        tier = min(tier, len(self.ladder) - 1)
+        return tier, ", ".join(reasons) or "simple", tokens, score
+
+    def routed_config(self, llm_config, model):
+        config_list = [c for c in self.config_list if c.get("model") == model]
+        return dict(llm_config, model=model, config_list=config_list)
+
+    def attach(self, agent, role_min_tier=0):
+        """Route every LLM call of agent through the ladder."""
+
+        def wrapper(inner, recipient, messages, sender, config):
+            llm_config = recipient.llm_config if config is None else config
+            if llm_config is False:
+                return inner()
+            tier, reason, tokens, score = self.choose(llm_messages(recipient, messages), role_min_tier)
+            while True:
+                model = self.ladder[tier]
+                if self.log:
+                    print(f"\n>>>>>>>> ROUTE {recipient.name} -> {model} ({reason})", flush=True)
+                start = time.perf_counter()
+                try:
+                    final, reply = inner(config=self.routed_config(llm_config, model))
+                    problem = bad_reply(reply, llm_config)
+                except Exception as e:
+                    if tier == len(self.ladder) - 1:
+                        self._record(recipient.name, model, reason, tokens, score, start, None, repr(e))
+                        raise
+                    final, reply, problem = False, None, f"{type(e).__name__}: {e}"
+                self._record(recipient.name, model, reason, tokens, score, start, reply, problem)
+                if problem is None or tier == len(self.ladder) - 1:
+                    return final, reply
+                tier += 1
+                reason = f"escalated after {problem}"
+
+        return wrap_llm_reply(agent, wrapper)
+
+    def _record(self, agent, model, reason, tokens, score, start, reply, problem):
+        latency = time.perf_counter() - start
+        reply_tokens = count_tokens([reply if isinstance(reply, dict) else {"content": reply or ""}])
+        route = self.routes.setdefault(
+            (agent, model), {"requests": 0, "ok": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+        route["requests"] += 1
+        route["ok"] += problem is None
+        route["seconds"] += latency
+        route["prompt_tokens"] += tokens
+        route["completion_tokens"] += reply_tokens
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "time": time.time(), "agent": agent, "model": model, "reason": reason, "complexity": score,
+                    "prompt_tokens": tokens, "completion_tokens": reply_tokens, "latency": round(latency, 3),
+                    "ok": problem is None, "problem": problem,
+                }) + "\n")
+
+    def report(self):
+        lines = [f"{'agent':<16} {'model':<20} {'reqs':>5} {'ok':>6} {'latency':>8} {'prompt tok':>10} {'reply tok':>9}"]
+        for (agent, model), r in sorted(self.routes.items()):
+            lines.append(
+                f"{agent[:16]:<16} {model[:20]:<20} {r['requests']:>5} {r['ok'] / r['requests']:>6.0%} "
+                f"{r['seconds'] / r['requests']:>7.2f}s {r['prompt_tokens']:>10} {r['completion_tokens']:>9}"
+            )
+        return "Model routes:\n" + "\n".join(lines)
@@ -0,0 +1,185 @@
+"""
+*** Asking the Planner Several Things at Once ***
+ask_planner(message) is synchronous: planner_user.initiate_chat(planner, ...) blocks the whole user_proxy <-> assistant
+loop until the planner answers. When the assistant has several independent sub-questions (one per wiki page, one per
+state of rescues) they go out strictly one after another. PlannerPool keeps a few isolated planner/planner_user pairs,
+copied from the ones in your script. ask_many sends a list of questions through them at the same time, at most
+max_concurrency at once, and returns the answers in the same order as the questions.
+
+The assistant gets this as one more function, ask_planner_batch, which takes a list of questions and returns all the
+answers numbered in order:
+planner_pool = PlannerPool.like(planner, planner_user, size=4)
+def ask_planner_batch(messages):
+    return planner_pool.ask_planner_batch(messages)
+# add ASK_PLANNER_BATCH_FUNCTION to the assistant's "functions" and ask_planner_batch to the user_proxy function_map
+
+From async code use "await planner_pool.a_ask_many(questions)".
+
+Giving the assistant ask_planner_batch changes its requests, so responses cached without it are not reused.
+
+The planner conversations run in threads, and their output is kept quiet so it doesn't interleave; each answer is
+announced with its timing instead. autogen keeps the open completion cache in one class attribute
+(Completion._cache) and every call opens and closes it, so threads would close each other's cache. While the pool is
+in use, each thread opens its own cache handle and Completion._cache only points at "this thread's handle".
+"""
+import asyncio
+import copy
+import queue
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import autogen
+from autogen.oai import completion
+
+ASK_PLANNER_BATCH_FUNCTION = {
+    "name": "ask_planner_batch",
+    "description": "ask planner several independent questions at once (for example one per topic, page or state). They are answered in parallel and the answers come back numbered in the same order. Use ask_planner instead when a question depends on the answer to another.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "messages": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "the questions to ask planner. Each question must include all the context it needs, such as the code and the execution result, because planner does not see the other questions or the conversation.",
+            },
+        },
+        "required": ["messages"],
+    },
+}
+
+_local = threading.local()
+
+
+class _CurrentThreadCache:
+    """What Completion._cache is set to: every lookup goes to the cache handle the calling thread opened last."""
+
+    def __getattr__(self, name):
+        return getattr(_local.handles[-1], name)
+
+
+_CURRENT = _CurrentThreadCache()
+
+
+class PerThreadCache:
+    """Cache factory for autogen's "with diskcache.Cache(path) as cls._cache": opens a handle of the cache that was
+    installed before (diskcache, or the shared cache / cache daemon) for the calling thread alone."""
+
+    open_cache = None
+
+    def __init__(self, directory, **kwargs):
+        self.handle = PerThreadCache.open_cache(directory, **kwargs)
+
+    def __enter__(self):
+        _local.__dict__.setdefault("handles", []).append(self.handle.__enter__())
+        return _CURRENT
+
+    def __exit__(self, *exc):
+        _local.handles.pop()
+        return self.handle.__exit__(*exc)
+
+
+def use_per_thread_cache():
+    """Make autogen's completion cache safe to use from several threads at once. Safe to call more than once, and
+    keeps whatever cache backend is installed at the time."""
+    if completion.diskcache.Cache is not PerThreadCache:
+        PerThreadCache.open_cache = completion.diskcache.Cache
+        completion.diskcache = types.SimpleNamespace(Cache=PerThreadCache)
+
+
+class PlannerPool:
+    """size isolated planner/planner_user pairs; make_pair(i) builds pair i."""
+
+    def __init__(self, make_pair, size=4, max_concurrency=None):
+        self.size = size
+        self.max_concurrency = max_concurrency or size
+        self._pairs = queue.Queue()
+        for i in range(size):
+            self._pairs.put(make_pair(i))
+        self._lock = threading.Lock()
+        self.stats = {"questions": 0, "batches": 0, "seconds": 0.0, "wall_seconds": 0.0, "errors": 0}
+
+    @classmethod
+    def like(cls, planner, planner_user, size=4, max_concurrency=None):
+        """Pool of copies of an existing planner and planner_user (same system message, llm_config and work_dir)."""
+
+        def make_pair(i):
+            pair_planner = autogen.AssistantAgent(
+                name=f"{planner.name}_{i}",
+                system_message=planner.system_message,
+                llm_config=copy.deepcopy(planner.llm_config),
+            )
+            pair_user = type(planner_user)(
+                name=f"{planner_user.name}_{i}",
+                max_consecutive_auto_reply=0,
+                human_input_mode="NEVER",
+                code_execution_config=copy.deepcopy(planner_user._code_execution_config),
+            )
+            return pair_planner, pair_user
+
+        return cls(make_pair, size, max_concurrency)
+
+    def ask(self, message, silent=False):
+        """Same as ask_planner, on whichever pair is free."""
+        planner, planner_user = self._pairs.get()
+        try:
+            planner_user.initiate_chat(planner, message=message, silent=silent)
+            return planner_user.last_message()["content"]
+        finally:
+            self._pairs.put((planner, planner_user))
+
+    def _ask_timed(self, index, message):
+        start = time.perf_counter()
+        try:
+            answer = self.ask(message, silent=True)
+        except Exception as e:
+            answer = f"Error: {e}"
+            with self._lock:
+                self.stats["errors"] += 1
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["questions"] += 1
+            self.stats["seconds"] += elapsed
+        print(f"\n>>>>>>>> PLANNER answered question {index + 1} in {elapsed:.1f}s", flush=True)
+        return answer
+
+    def ask_many(self, messages, max_concurrency=None):
+        """Ask every message concurrently; answers come back in input order. A failed question returns 'Error: ...'."""
+        workers = max(1, min(max_concurrency or self.max_concurrency, self.size, len(messages) or 1))
+        use_per_thread_cache()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            answers = list(executor.map(self._ask_timed, range(len(messages)), messages))
+        self.stats["batches"] += 1
+        self.stats["wall_seconds"] += time.perf_counter() - start
+        return answers
+
+    async def a_ask_many(self, messages, max_concurrency=None):
+        """Async version of ask_many; each conversation runs in a worker thread."""
+        limit = asyncio.Semaphore(max(1, min(max_concurrency or self.max_concurrency, self.size)))
+        use_per_thread_cache()
+
+        async def ask_one(index, message):
+            async with limit:
+                return await asyncio.to_thread(self._ask_timed, index, message)
+
+        start = time.perf_counter()
+        answers = await asyncio.gather(*(ask_one(i, m) for i, m in enumerate(messages)))
+        self.stats["batches"] += 1
+        self.stats["wall_seconds"] += time.perf_counter() - start
+        return list(answers)
+
+    def ask_planner_batch(self, messages):
+        """Function-call entry point: all answers merged into one message, numbered in question order."""
+        if isinstance(messages, str):
+            messages = [messages]
+        answers = self.ask_many(messages)
+        return "\n\n".join(f"### Answer to question {i + 1}\n{answer}" for i, answer in enumerate(answers))
+
+    def report(self):
+        s = self.stats
+        return (
+            f"Planner pool: {s['questions']} questions in {s['batches']} batches, {s['seconds']:.1f}s of planner time "
+            f"in {s['wall_seconds']:.1f}s wall time, {s['errors']} errors"
+        )
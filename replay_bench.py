@@ -0,0 +1,300 @@
+"""
+*** Replay Benchmark ***
+A real run of one of the scripts hits the live API, costs money and never goes the same way twice, so there's no way
+to tell whether a change made it faster. This harness replays each script against mock_openai_server.py instead. The
+mock is seeded with the responses recorded in the LLM cache (.cache/<seed>/cache.db). A request whose conversation was
+recorded gets the recorded answer, anything else gets a fixed fallback reply (TERMINATE by default, which ends the
+conversation). Every response waits --latency seconds first, to stand in for the real API. Only scenarios whose
+requests were recorded are replayed for real: a run where the mock had to fall back for every request is marked
+NOT REPLAYED (it ends after the first turn and says nothing about speed), and the share of fallback replies is shown
+for every run. The command exits with status 1 if any run was not replayed.
+
+Each scenario runs in its own process and its own scratch directory, with OAI_CONFIG_LIST pointing at the mock, and
+human input always answered with "exit". By default the scratch directory starts with an empty LLM cache, so every
+request goes to the mock; --warm-cache copies .cache in first. For every scenario it reports wall time, turns (messages
+sent between agents), LLM calls, autogen cache hit rate, tokens, code blocks and code execution time. One JSON line per
+scenario is appended to the results file, with the git commit, so regressions can be tracked across commits.
+
+python replay_bench.py                                  # all scenarios, results appended to replay_results.jsonl
+python replay_bench.py --scenario wiki --latency 1.5 --runs 3
+python replay_bench.py --list
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import pickle
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from llm_cache_manager import CACHE_ROOT, SeedCacheFile
+from mock_openai_server import serve_in_background
+from semantic_cache import normalize_prompt
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_ROOT = os.path.join(REPO, CACHE_ROOT)  # the repo's .cache, wherever the bench is started from
+SCENARIOS = {
+    "friend2": "AutoGenIsYourFriend2.py",
+    "multiagent": "MultiAgentMadness.py",
+    "wiki": "WikiMadness.py",
+    "fosters": "Finding Fosters and Rescues for Dogs.py",
+}
+# every model the scripts ask for, all served by the mock
+MODELS = ("gpt-4", "gpt-4-1106-preview", "gpt-3.5-turbo")
+
+
+def conversation_key(request):
+    return json.dumps(request.get("messages") or request.get("prompt"), sort_keys=True)
+
+
+def last_prompt(request):
+    messages = request.get("messages") or [{"content": request.get("prompt")}]
+    for message in reversed(messages):
+        if message.get("content"):
+            return normalize_prompt(str(message["content"]))
+    return ""
+
+
+class Recordings:
+    """Responses from the seed caches, by exact conversation and, failing that, by the last prompt."""
+
+    def __init__(self, root=RECORDINGS_ROOT, fallback_reply="TERMINATE"):
+        self.by_conversation = {}
+        self.by_prompt = {}
+        self.fallback_reply = fallback_reply
+        self.counts = {"exact": 0, "prompt": 0, "fallback": 0}
+        self._lock = threading.Lock()
+        for path in sorted(glob.glob(os.path.join(root, "*", "cache.db"))):
+            seed_file = SeedCacheFile(path)
+            for key, value, _ in seed_file.items():
+                try:
+                    request, response = json.loads(key), pickle.loads(value)
+                except Exception:
+                    continue  # not an autogen request, or pickled with something we can't load
+                response = json.loads(json.dumps(response))  # OpenAIObject -> plain dicts
+                self.by_conversation[conversation_key(request)] = response
+                self.by_prompt.setdefault(last_prompt(request), response)
+            seed_file.close()
+
+    def __len__(self):
+        return len(self.by_conversation)
+
+    def respond(self, request):
+        response = self.by_conversation.get(conversation_key(request))
+        kind = "exact"
+        if response is None:
+            response, kind = self.by_prompt.get(last_prompt(request)), "prompt"
+        if response is None:
+            kind = "fallback"
+            response = {
+                "id": "replay-fallback", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.fallback_reply}}],
+            }
+        with self._lock:
+            self.counts[kind] += 1
+        return response
+
+
+def instrument(summary):
+    """Count turns, LLM calls, cache hits, tokens and code execution time in this process."""
+    import openai
+    from autogen import ChatCompletion, ConversableAgent
+
+    lock = threading.Lock()
+    depth = threading.local()  # autogen's create calls itself once per config_list entry; count the outer call
+
+    def add(**values):
+        with lock:
+            for key, value in values.items():
+                summary[key] = summary.get(key, 0) + value
+
+    send = ConversableAgent.send
+
+    def counting_send(self, *args, **kwargs):
+        add(turns=1)
+        return send(self, *args, **kwargs)
+
+    create = ChatCompletion.create  # autogen: answers from the seed cache or calls openai
+
+    def counting_create(cls, *args, **kwargs):
+        depth.value = getattr(depth, "value", 0) + 1
+        try:
+            response = create(*args, **kwargs)
+        finally:
+            depth.value -= 1
+        if depth.value:
+            return response
+        usage = (response.get("usage") or {}) if isinstance(response, dict) else {}
+        add(llm_calls=1, prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0))
+        return response
+
+    api_create = openai.ChatCompletion.create  # only reached on a cache miss
+
+    def counting_api_create(cls, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return api_create(*args, **kwargs)
+        finally:
+            add(api_calls=1, llm_seconds=time.perf_counter() - start)
+
+    execute_code_blocks = ConversableAgent.execute_code_blocks
+
+    def timed_execute_code_blocks(self, code_blocks):
+        start = time.perf_counter()
+        try:
+            return execute_code_blocks(self, code_blocks)
+        finally:
+            add(code_blocks=len(code_blocks), exec_seconds=time.perf_counter() - start)
+
+    def no_human(self, prompt):
+        add(human_prompts=1)
+        return "exit"
+
+    ConversableAgent.send = counting_send
+    ConversableAgent.execute_code_blocks = timed_execute_code_blocks
+    ConversableAgent.get_human_input = no_human
+    ChatCompletion.create = classmethod(counting_create)
+    openai.ChatCompletion.create = classmethod(counting_api_create)
+
+
+def run_scenario(script, summary_path):
+    """Inside the scenario process: run the script with instrumentation and write the summary."""
+    summary = {"error": None}
+    sys.path.insert(0, REPO)
+    instrument(summary)
+    start = time.perf_counter()
+    try:
+        runpy.run_path(os.path.join(REPO, script), run_name="__main__")
+    except SystemExit:
+        pass
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["wall_seconds"] = time.perf_counter() - start
+    with open(summary_path, "w") as f:
+        json.dump(summary, f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench(name, api_base, recordings, args):
+    scratch = tempfile.mkdtemp(prefix=f"replay-{name}-")
+    if args.warm_cache and os.path.isdir(RECORDINGS_ROOT):
+        shutil.copytree(RECORDINGS_ROOT, os.path.join(scratch, ".cache"))
+    env = dict(os.environ, OAI_CONFIG_LIST=json.dumps([{"model": m, "api_key": "mock", "api_base": api_base}
+                                                         for m in MODELS]))
+    summary_path = os.path.join(scratch, "summary.json")
+    log_path = os.path.join(scratch, "output.log")
+    before = dict(recordings.counts)
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--run-scenario", SCENARIOS[name],
+                            "--summary", summary_path], cwd=scratch, env=env, stdout=log, stderr=subprocess.STDOUT,
+                           stdin=subprocess.DEVNULL, timeout=args.timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            timed_out = True
+    total = time.perf_counter() - start
+    summary = {}
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+    llm_calls = summary.get("llm_calls", 0)
+    replayed = {k: recordings.counts[k] - before[k] for k in recordings.counts}
+    answered = sum(replayed.values())
+    result = {
+        "time": time.time(), "commit": git_commit(), "scenario": name, "latency": args.latency,
+        "warm_cache": args.warm_cache, "timed_out": timed_out, "error": summary.get("error"),
+        "wall_seconds": round(summary.get("wall_seconds", total), 3), "process_seconds": round(total, 3),
+        "turns": summary.get("turns", 0), "llm_calls": llm_calls, "api_calls": summary.get("api_calls", 0),
+        "cache_hit_rate": round(1 - summary.get("api_calls", 0) / llm_calls, 3) if llm_calls else None,
+        "prompt_tokens": summary.get("prompt_tokens", 0), "completion_tokens": summary.get("completion_tokens", 0),
+        "llm_seconds": round(summary.get("llm_seconds", 0.0), 3), "code_blocks": summary.get("code_blocks", 0),
+        "exec_seconds": round(summary.get("exec_seconds", 0.0), 3),
+        "replayed": replayed, "fallback_share": round(replayed["fallback"] / answered, 3) if answered else None,
+        # every request the mock saw got the fallback reply: the run didn't follow any recorded conversation
+        "not_replayed": answered > 0 and replayed["fallback"] == answered, "log": log_path,
+    }
+    shutil.rmtree(os.path.join(scratch, ".cache"), ignore_errors=True)  # the log and work dirs stay for a look
+    return result
+
+
+def print_results(results):
+    print(f"\n{'scenario':<12} {'wall':>8} {'turns':>6} {'llm':>5} {'hit%':>5} {'tokens':>8} {'blocks':>6} "
+          f"{'exec':>7} {'replayed':>9} {'fallback':>12}")
+    for r in results:
+        hit = f"{r['cache_hit_rate']:.0%}" if r["cache_hit_rate"] is not None else "-"
+        share = f"({r['fallback_share']:.0%})" if r["fallback_share"] is not None else ""
+        status = " TIMEOUT" if r["timed_out"] else (f" {r['error']}" if r["error"] else "")
+        if r["not_replayed"]:
+            status = " NOT REPLAYED" + status
+        print(f"{r['scenario']:<12} {r['wall_seconds']:>7.2f}s {r['turns']:>6} {r['llm_calls']:>5} {hit:>5} "
+              f"{r['prompt_tokens'] + r['completion_tokens']:>8} {r['code_blocks']:>6} {r['exec_seconds']:>6.2f}s "
+              f"{r['replayed']['exact'] + r['replayed']['prompt']:>9} {r['replayed']['fallback']:>5} {share:>6}{status}")
+    not_replayed = sorted({r["scenario"] for r in results if r["not_replayed"]})
+    if not_replayed:
+        print(f"\nNOT REPLAYED: {', '.join(not_replayed)} got the fallback reply for every request, because "
+              f"{RECORDINGS_ROOT} has no recording of their conversations. Their numbers only cover the first turn.")
+    return not not_replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the agent scripts against a mock LLM seeded from .cache")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all of them")
+    parser.add_argument("--list", action="store_true", help="list the scenarios and the recorded responses")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the mock waits before each response")
+    parser.add_argument("--runs", type=int, default=1, help="runs per scenario")
+    parser.add_argument("--warm-cache", action="store_true", help="start each run with a copy of .cache")
+    parser.add_argument("--fallback-reply", default="TERMINATE", help="reply to requests that were never recorded")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per run")
+    parser.add_argument("--output", default="replay_results.jsonl", help="JSON lines file the results are added to")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--summary", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_scenario:
+        run_scenario(args.run_scenario, args.summary)
+        return
+    recordings = Recordings(fallback_reply=args.fallback_reply)
+    if args.list:
+        for name, script in SCENARIOS.items():
+            print(f"{name:<12} {script}")
+        print(f"{len(recordings)} recorded responses in {RECORDINGS_ROOT}")
+        return
+    server, api_base = serve_in_background(latency=args.latency, jitter=0.0, responder=recordings.respond,
+                                           name="replay")
+    atexit.register(server.shutdown)
+    results = []
+    for name in args.scenario or SCENARIOS:
+        for run in range(args.runs):
+            print(f">>>>>>>> REPLAY {name} (run {run + 1} of {args.runs})", flush=True)
+            result = bench(name, api_base, recordings, args)
+            results.append(result)
+            with open(args.output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+    replayed = print_results(results)
+    print(f"mock server: {requests.get(api_base + '/stats').json()}")
+    print(f"results appended to {args.output}")
+    if not replayed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
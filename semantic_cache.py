@@ -0,0 +1,192 @@
+"""
+*** Semantic Prompt Cache ***
+The seed cache only helps when a prompt is byte-for-byte identical. ask_planner(message) rarely is: the assistant
+keeps sending "verify the execution result..." with the same code block and a slightly different error line. This
+cache normalizes prompts (lowercase, whitespace collapsed, object addresses, timestamps and temp file names masked;
+other numbers are kept, since "movies for 2020" and "movies for 1999" are different questions) and turns each one into
+a MinHash signature of its word 3-grams. Similar prompts are found through an LSH index. If a stored prompt is at least as
+similar as the threshold (estimated Jaccard similarity, 0.9 by default), its answer is returned and the model is
+never called. Every hit and its similarity are counted, and there is a report when the script ends.
+
+You can use it two ways:
+planner_cache = SemanticCache("planner", threshold=0.9)
+ask_planner = planner_cache.wrap(ask_planner)     # in front of the ask_planner function
+planner_cache.attach(assistant)                   # or in front of any agent's LLM call (uses agent_hooks)
+
+In front of an LLM call only the newest message is compared by similarity. Everything before it (system message,
+functions and the earlier conversation) has to match exactly, so a conversation that grew by one turn never gets the
+reply to the turn before.
+
+Only use it where a close-enough answer is good enough. With temperature 0 and the planner's "look at this output
+and suggest a fix" questions, it usually is. Set the threshold to 1.0 to only reuse (near) exact repeats. Entries
+are kept in .cache/semantic/<name>.db so they survive between runs.
+"""
+import array
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+from agent_hooks import llm_messages, wrap_llm_reply
+
+CACHE_DIR = os.path.join(".cache", "semantic")
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# values that change between otherwise identical runs; other numbers (years, counts, exit codes, line numbers) matter
+VOLATILE_RE = re.compile(
+    r"\b0x[0-9a-f]{6,}\b"  # object addresses: <object at 0x7f3a2c1d>
+    r"|\b\d{4}-\d\d-\d\d[t ]\d\d:\d\d:\d\d(?:[.,]\d+)?"  # timestamps
+    r"|\b\d\d:\d\d:\d\d(?:[.,]\d+)?"
+    r"|\btmp_code_[0-9a-f]+|\btmp[a-z0-9_]{6,}"  # autogen's tmp_code_<md5>.py, tempfile's /tmp/tmpk3j9x_2a
+)
+
+
+def normalize_prompt(text):
+    """Lowercase, mask object addresses, timestamps and temp file names, and collapse whitespace."""
+    return " ".join(VOLATILE_RE.sub("0", text.lower()).split())
+
+
+def shingles(text, size=3):
+    tokens = TOKEN_RE.findall(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """num_perm universal hash functions; the signature is the minimum of each over the shingle hashes."""
+
+    def __init__(self, num_perm=128, seed=1):
+        state = seed
+        self.params = []
+        for _ in range(num_perm):
+            # small deterministic LCG so signatures are stable between runs
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = state % MERSENNE_PRIME or 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            self.params.append((a, state % MERSENNE_PRIME))
+
+    def signature(self, text):
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles(text)]
+        return array.array("Q", (min((a * h + b) % MERSENNE_PRIME & MAX_HASH for h in hashes) for a, b in self.params))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the fraction of matching signature slots."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class SemanticCache:
+    """Near-duplicate prompt -> answer cache with a MinHash LSH index, persisted in SQLite."""
+
+    def __init__(self, name, threshold=0.9, num_perm=128, bands=32, path=None):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.name = name
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.db")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, signature BLOB, prompt TEXT, answer TEXT, "
+            "created_at REAL, hits INTEGER DEFAULT 0, context TEXT)"
+        )
+        if "context" not in {row[1] for row in self.db.execute("PRAGMA table_info(entries)")}:
+            self.db.execute("ALTER TABLE entries ADD COLUMN context TEXT")  # a cache file from before contexts
+        self.signatures = {}
+        self.contexts = {}  # entry id -> hash of what came before the prompt, None for wrap()
+        self.buckets = {}
+        for entry_id, blob, context in self.db.execute("SELECT id, signature, context FROM entries"):
+            self._index(entry_id, array.array("Q", blob), context)
+        self.stats = {"lookups": 0, "hits": 0, "similarities": []}
+        atexit.register(lambda: print(self.report()) if self.stats["lookups"] else None)
+
+    def _band_keys(self, signature):
+        return [(i, tuple(signature[i * self.rows : (i + 1) * self.rows])) for i in range(self.bands)]
+
+    def _index(self, entry_id, signature, context=None):
+        self.signatures[entry_id] = signature
+        self.contexts[entry_id] = context
+        for band in self._band_keys(signature):
+            self.buckets.setdefault(band, []).append(entry_id)
+
+    def lookup(self, prompt, context=None):
+        """Return (answer, similarity) for the most similar stored prompt above the threshold, else (None, best).
+        context: only entries stored with exactly the same context are considered."""
+        self.stats["lookups"] += 1
+        signature = self.hasher.signature(normalize_prompt(prompt))
+        candidates = {entry_id for band in self._band_keys(signature) for entry_id in self.buckets.get(band, ())
+                      if self.contexts[entry_id] == context}
+        best_id, best = None, 0.0
+        for entry_id in candidates:
+            score = similarity(signature, self.signatures[entry_id])
+            if score > best:
+                best_id, best = entry_id, score
+        if best_id is None or best < self.threshold:
+            return None, best
+        row = self.db.execute("SELECT answer FROM entries WHERE id = ?", (best_id,)).fetchone()
+        self.db.execute("UPDATE entries SET hits = hits + 1 WHERE id = ?", (best_id,))
+        self.stats["hits"] += 1
+        self.stats["similarities"].append(best)
+        return json.loads(row[0]), best
+
+    def store(self, prompt, answer, context=None):
+        signature = self.hasher.signature(normalize_prompt(prompt))
+        cursor = self.db.execute(
+            "INSERT INTO entries (signature, prompt, answer, created_at, context) VALUES (?, ?, ?, ?, ?)",
+            (signature.tobytes(), prompt[:2000], json.dumps(answer), time.time(), context),
+        )
+        self._index(cursor.lastrowid, signature, context)
+
+    def wrap(self, func):
+        """Cache a function of one text argument, e.g. ask_planner(message)."""
+
+        def cached(message):
+            answer, score = self.lookup(message)
+            if answer is not None:
+                print(f"\n>>>>>>>> SEMANTIC CACHE HIT for {self.name} (similarity {score:.2f})", flush=True)
+                return answer
+            answer = func(message)
+            if answer:
+                self.store(message, answer)
+            return answer
+
+        cached.__name__ = getattr(func, "__name__", "cached")
+        cached.__doc__ = func.__doc__
+        return cached
+
+    def attach(self, agent):
+        """Put the cache in front of an agent's LLM call. The newest message is the prompt; the system message,
+        functions and earlier messages must be exactly the same as for the stored entry."""
+
+        def wrapper(inner, recipient, messages, sender, config):
+            sent = llm_messages(recipient, messages)
+            if not sent:
+                return inner()
+            functions = (recipient.llm_config or {}).get("functions") if isinstance(recipient.llm_config, dict) else None
+            context = hashlib.sha256(json.dumps([sent[:-1], functions], sort_keys=True, default=str).encode()).hexdigest()
+            last = sent[-1]
+            prompt = f"{last.get('role')}: {last.get('content') or json.dumps(last.get('function_call'))}"
+            answer, score = self.lookup(prompt, context)
+            if answer is not None:
+                print(f"\n>>>>>>>> SEMANTIC CACHE HIT for {recipient.name} (similarity {score:.2f})", flush=True)
+                return True, answer
+            final, reply = inner()
+            if final and reply:
+                self.store(prompt, reply, context)
+            return final, reply
+
+        return wrap_llm_reply(agent, wrapper)
+
+    def report(self):
+        s = self.stats
+        scores = s["similarities"]
+        detail = f", similarity min {min(scores):.2f} / mean {sum(scores) / len(scores):.2f}" if scores else ""
+        return f"Semantic cache {self.name}: {s['hits']} of {s['lookups']} prompts answered from cache{detail}"
@@ -0,0 +1,238 @@
+"""
+*** Streaming Replies ***
+Out of the box the assistant waits for the model's whole reply ("request_timeout": 600) before anything happens, and
+user_proxy only starts on the code once the full message has arrived. For a long reply that is tens of seconds of
+nothing. StreamingReply asks the model to stream instead: tokens are printed as they arrive, and each fenced code
+block is handed to user_proxy's executor as soon as its closing ``` shows up, while the rest of the message is still
+being written. When the message is complete, user_proxy answers with the results of those early runs instead of
+executing the blocks again; if the finished message parses into different blocks, only the ones that haven't run
+yet are executed. The blocks still run one after another and stop at the first failure, just like autogen's own
+execute_code_blocks, and they go through user_proxy's run_code (so the warm pool, the container pool
+and the exec cache all still apply).
+
+Time to first token, time to first execution and total time are recorded for every reply and summarized at exit.
+
+example:
+streaming = StreamingReply(executor=user_proxy)
+streaming.attach(assistant)
+
+Early dispatch runs code before the message is finished, so only use it where user_proxy executes code without
+asking anyway. Streamed replies don't go through autogen's seed cache. Try it without an API key:
+python streaming_reply.py --demo
+"""
+import argparse
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from autogen import Agent
+from autogen.code_utils import UNKNOWN, extract_code
+from openai.error import APIConnectionError, RateLimitError, ServiceUnavailableError, Timeout
+
+from agent_hooks import llm_messages, wrap_llm_reply
+
+# llm_config keys that only mean something to autogen, not to the openai API
+AUTOGEN_KEYS = (
+    "config_list", "seed", "filter_func", "raise_on_ratelimit_or_timeout", "allow_format_str_template",
+    "max_retry_period", "retry_wait_time", "use_cache", "context",
+)
+RETRY_ERRORS = (RateLimitError, Timeout, APIConnectionError, ServiceUnavailableError)
+
+
+class EarlyRun:
+    """The code blocks of one streaming message, executed in order as they complete."""
+
+    def __init__(self):
+        self.blocks = []
+        self.futures = []
+        self.failed = False
+
+
+class StreamingReply:
+    def __init__(self, executor=None, print_tokens=True):
+        self.executor = executor
+        self.print_tokens = print_tokens
+        self._runner = ThreadPoolExecutor(max_workers=1)  # one block at a time, in order
+        self._runs = {}  # message content -> EarlyRun
+        self._lock = threading.Lock()
+        self.timings = []
+        atexit.register(lambda: print(self.report()) if self.timings else None)
+
+    def attach(self, agent):
+        """Stream agent's LLM replies; if there is an executor, dispatch code blocks to it early."""
+        wrap_llm_reply(agent, self._wrapper)
+        if self.executor is not None:
+            # right where code execution would happen, so termination and human input are still checked first
+            position = next(
+                i for i, entry in enumerate(self.executor._reply_func_list)
+                if entry["reply_func"] is type(self.executor).generate_code_execution_reply
+            )
+            self.executor.register_reply([Agent, None], StreamingReply._early_reply_func, position=position, config=self)
+        return agent
+
+    def _create(self, llm_config, messages):
+        params = {k: v for k, v in llm_config.items() if k not in AUTOGEN_KEYS}
+        if "functions" in params and not params["functions"]:
+            params.pop("functions")
+        config_list = llm_config.get("config_list") or [{}]
+        for i, config in enumerate(config_list):
+            request = dict(params, **config, messages=messages, stream=True)
+            if "azure" in str(request.get("api_type", "")) and "engine" not in request:
+                request["engine"] = request.pop("model").replace("gpt-3.5-turbo", "gpt-35-turbo")
+            try:
+                return openai.ChatCompletion.create(**request)
+            except RETRY_ERRORS:
+                if i == len(config_list) - 1:
+                    raise
+
+    def _wrapper(self, inner, recipient, messages, sender, config):
+        llm_config = recipient.llm_config if config is None else config
+        if llm_config is False:
+            return inner()
+        if messages and "context" in messages[-1]:
+            messages[-1].pop("context")
+        start = time.perf_counter()
+        timing = {"agent": recipient.name, "first_token": None, "first_execution": None}
+        run = EarlyRun() if self.executor is not None else None
+        content, function_call = "", {}
+        if self.print_tokens:
+            print(f"\n>>>>>>>> STREAMING {recipient.name}:", flush=True)
+        for chunk in self._create(llm_config, llm_messages(recipient, messages)):
+            if not chunk["choices"]:
+                continue
+            delta = chunk["choices"][0].get("delta", {})
+            piece = delta.get("content") or ""
+            if delta.get("function_call"):
+                for key, value in delta["function_call"].items():
+                    function_call[key] = function_call.get(key, "") + value
+            if (piece or delta.get("function_call")) and timing["first_token"] is None:
+                timing["first_token"] = time.perf_counter() - start
+            if piece:
+                content += piece
+                if self.print_tokens:
+                    print(piece, end="", flush=True)
+                if run is not None and "`" in piece:
+                    self._dispatch_new_blocks(run, content, timing, start)
+        if self.print_tokens:
+            print(flush=True)
+        timing["total"] = time.perf_counter() - start
+        self.timings.append(timing)
+        if function_call:
+            return True, {"content": content or None, "function_call": function_call}
+        if run is not None and run.blocks:
+            with self._lock:
+                self._runs[content] = run
+        return True, content
+
+    def _dispatch_new_blocks(self, run, content, timing, start):
+        blocks = extract_code(content)
+        if len(blocks) == 1 and blocks[0][0] == UNKNOWN:
+            return
+        for lang, code in blocks[len(run.blocks) :]:
+            index = len(run.blocks)
+            run.blocks.append((lang, code))
+            run.futures.append(self._runner.submit(self._run_block, run, index, lang, code, timing, start))
+
+    def _run_block(self, run, index, lang, code, timing, start):
+        if run.failed:
+            return None  # an earlier block failed; autogen stops there too
+        if timing["first_execution"] is None:
+            timing["first_execution"] = time.perf_counter() - start
+        print(f"\n>>>>>>>> EARLY DISPATCH of code block {index} while the reply is still streaming", flush=True)
+        exitcode, logs = self.executor.execute_code_blocks([(lang, code)])
+        if exitcode != 0:
+            run.failed = True
+        return exitcode, logs
+
+    @staticmethod
+    def _early_reply_func(recipient, messages=None, sender=None, config=None):
+        return config._early_reply(recipient, messages, sender)
+
+    def _early_reply(self, recipient, messages, sender):
+        if messages is None:
+            messages = recipient._oai_messages[sender]
+        content = messages[-1].get("content")
+        with self._lock:
+            run = self._runs.pop(content, None) if isinstance(content, str) else None
+        if run is None:
+            return False, None
+        # results of the early runs by block content; a block that was skipped after a failure has no result
+        done = {}
+        for block, future in zip(run.blocks, run.futures):
+            result = future.result()
+            if result is not None:
+                done.setdefault(block, []).append(result)
+        blocks = extract_code(content)
+        if len(blocks) == 1 and blocks[0][0] == UNKNOWN:
+            blocks = run.blocks  # no code blocks in the finished message; report the ones that already ran
+        logs_all, exitcode = "", 0
+        for lang, code in blocks:
+            if done.get((lang, code)):
+                exitcode, logs = done[(lang, code)].pop(0)
+            else:
+                # the finished message parsed differently from the partial one: run only the blocks that haven't run
+                exitcode, logs = self.executor.execute_code_blocks([(lang, code)])
+            logs_all += logs  # execute_code_blocks already starts each block's logs with "\n"
+            if exitcode != 0:
+                break
+        exitcode2str = "execution succeeded" if exitcode == 0 else "execution failed"
+        return True, f"exitcode: {exitcode} ({exitcode2str})\nCode output: {logs_all}"
+
+    def report(self):
+        def mean(key):
+            values = [t[key] for t in self.timings if t.get(key) is not None]
+            return f"{sum(values) / len(values):.2f}s" if values else "-"
+
+        return (
+            f"Streaming: {len(self.timings)} replies, mean time to first token {mean('first_token')}, "
+            f"to first execution {mean('first_execution')}, to last token {mean('total')}"
+        )
+
+
+DEMO_REPLY = """Let's start by checking which python we have.
+```python
+import sys
+print(sys.version)
+```
+While that runs, here is the plan for the rest of the task. First we collect the list of pages, then we fetch each
+one, parse the titles and write them to a file. Once we have the titles we can sort them and print a summary.
+```python
+print(sum(range(10)))
+```
+If both blocks work, the environment is ready and we can move on to the actual scraping.
+"""
+
+
+def demo(token_delay=0.03):
+    """One streamed reply from the mock server, executed by a local user_proxy."""
+    import autogen
+
+    from mock_openai_server import serve_in_background
+
+    _, api_base = serve_in_background(latency=0.3, token_delay=token_delay, reply=DEMO_REPLY, name="stream")
+    assistant = autogen.AssistantAgent(
+        "assistant", max_consecutive_auto_reply=1,
+        llm_config={"config_list": [{"model": "gpt-4", "api_key": "mock", "api_base": api_base}]},
+    )
+    user_proxy = autogen.UserProxyAgent(
+        "user_proxy", human_input_mode="NEVER", max_consecutive_auto_reply=1,
+        code_execution_config={"work_dir": "streaming", "use_docker": False},
+    )
+    streaming = StreamingReply(executor=user_proxy)
+    streaming.attach(assistant)
+    user_proxy.initiate_chat(assistant, message="Check the environment.")
+    print(streaming.report())
+    streaming.timings.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream LLM replies and run code blocks as soon as they are complete")
+    parser.add_argument("--demo", action="store_true", help="run against a local streaming mock server")
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    args = parser.parse_args()
+    if args.demo:
+        demo(args.token_delay)
+    else:
+        parser.print_help()
@@ -0,0 +1,183 @@
+"""
+*** Warm Python Workers ***
+Every python code block a UserProxyAgent runs normally starts a brand new interpreter, which then has to import
+requests, bs4, lxml, pandas, matplotlib and friends all over again. In the plotting demo and the dogrescues loop
+that startup is most of the time spent per turn. This module keeps a small pool of python worker processes per
+work_dir that have already imported those libraries. Each code block still gets a clean namespace, a timeout and
+(on Linux/macOS) a memory limit, and every worker is replaced after a number of blocks so nothing leaks for long.
+
+Use it by swapping UserProxyAgent for WarmPoolUserProxyAgent. Shell blocks still run the normal way.
+example:
+user_proxy = WarmPoolUserProxyAgent(
+    name="user_proxy",
+    code_execution_config={"work_dir": "coding", "use_docker": False},
+    warm_pool={"size": 2, "timeout": 120, "memory_limit_mb": 2048, "max_uses": 20},
+)
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import autogen
+
+DEFAULT_PRELOAD = ["requests", "bs4", "lxml.html", "numpy", "pandas", "matplotlib.pyplot", "yfinance"]
+TIMEOUT_MSG = "Timeout"
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_worker.py")
+
+
+class WarmWorker:
+    """One long-lived python process that runs code blocks sent to it over stdin."""
+
+    def __init__(self, work_dir, preload, memory_limit_mb=None):
+        self.uses = 0
+        self.started = time.perf_counter()
+        env = dict(os.environ, MPLBACKEND="Agg", PYTHONUNBUFFERED="1")
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, json.dumps(preload), str(memory_limit_mb or 0)],
+            cwd=work_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+        # a reader thread lets us wait for a reply with a timeout on every platform
+        self.ready = threading.Event()
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    def _read_replies(self):
+        for line in self.process.stdout:
+            reply = json.loads(line)
+            if reply.get("ready"):
+                self.ready.set()
+            else:
+                self.replies.put(reply)
+        self.ready.set()
+        self.replies.put(None)
+
+    def run(self, code, filename, timeout):
+        """Run one block. The timeout also covers a worker that is still warming up."""
+        self.uses += 1
+        deadline = time.monotonic() + timeout
+        if not self.ready.wait(timeout):
+            self.kill()
+            return 1, TIMEOUT_MSG
+        try:
+            self.process.stdin.write(json.dumps({"code": code, "filename": filename}) + "\n")
+            self.process.stdin.flush()
+            reply = self.replies.get(timeout=max(deadline - time.monotonic(), 0.01))
+        except queue.Empty:
+            self.kill()
+            return 1, TIMEOUT_MSG
+        except OSError:
+            reply = None
+        if reply is None:  # the worker died (e.g. killed by the memory limit)
+            return 1, "Worker process exited unexpectedly"
+        return reply["exitcode"], reply["output"]
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+class WarmPythonPool:
+    """A pool of warm workers for one work_dir, with per-block latency bookkeeping."""
+
+    def __init__(self, work_dir, size=1, preload=None, timeout=600, memory_limit_mb=None, max_uses=25):
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.preload = DEFAULT_PRELOAD if preload is None else preload
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_uses = max_uses
+        self.latencies = []
+        self.recycled = 0
+        self._idle = queue.Queue()
+        # workers start importing right away so they are warm by the time the first block arrives
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return WarmWorker(self.work_dir, self.preload, self.memory_limit_mb)
+
+    def run(self, code, filename=None, timeout=None):
+        """Run a python code block. Returns (exitcode, output, seconds); output is what the block printed."""
+        # save the code to the work_dir exactly like autogen does, so "save the code" tasks still work
+        if filename is None:
+            filename = f"tmp_code_{hashlib.md5(code.encode()).hexdigest()}.py"
+        path = os.path.join(self.work_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            if not worker.alive():
+                worker = self._spawn()
+                self.recycled += 1
+            exitcode, output = worker.run(code, filename, timeout or self.timeout)
+        finally:
+            # replace workers that timed out, crashed or hit their use limit; the new one warms up in the background
+            if not worker.alive() or worker.uses >= self.max_uses:
+                worker.close()
+                worker = self._spawn()
+                self.recycled += 1
+            self._idle.put(worker)
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        return exitcode, output, elapsed
+
+    def report(self):
+        if not self.latencies:
+            return f"Warm pool {self.work_dir}: no code blocks run"
+        total = sum(self.latencies)
+        return (
+            f"Warm pool {self.work_dir}: {len(self.latencies)} blocks, {total:.2f}s total, "
+            f"{total / len(self.latencies):.2f}s mean, {max(self.latencies):.2f}s max, {self.recycled} workers recycled"
+        )
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get().close()
+
+
+class WarmPoolUserProxyAgent(autogen.UserProxyAgent):
+    """UserProxyAgent that runs python code blocks on a WarmPythonPool for its work_dir."""
+
+    def __init__(self, *args, warm_pool=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        work_dir = (self._code_execution_config or {}).get("work_dir") or "extensions"
+        self.warm_pool = WarmPythonPool(work_dir, **(warm_pool or {}))
+        atexit.register(self._close_pool)
+
+    def _close_pool(self):
+        print(self.warm_pool.report())
+        self.warm_pool.close()
+
+    def run_code(self, code, **kwargs):
+        if kwargs.get("lang") not in ("python", "Python"):
+            return super().run_code(code, **kwargs)
+        exitcode, output, elapsed = self.warm_pool.run(code, kwargs.get("filename"), kwargs.get("timeout"))
+        print(f"\n>>>>>>>> WARM WORKER ran the block in {elapsed:.2f}s (exitcode {exitcode})", flush=True)
+        return exitcode, output, None
@@ -0,0 +1,85 @@
+"""
+Worker process for warm_executor.WarmPythonPool. It imports the libraries it is told to preload, tells the
+pool it is ready, and then runs one JSON request per stdin line: {"code": ..., "filename": ...}. Each block runs in a
+fresh namespace with fd 1 and 2 captured, and the reply {"exitcode": ..., "output": ...} goes back on the original
+stdout. This file deliberately imports nothing heavy (no autogen) so the workers start fast.
+usage: python warm_worker.py '["requests", "bs4"]' <memory limit in MB, 0 for none>
+"""
+import builtins
+import importlib
+import json
+import os
+import sys
+import tempfile
+import traceback
+
+
+def _worker_main(preload, memory_limit_mb):
+    """Import the heavy libraries once, then run blocks until stdin closes."""
+    if memory_limit_mb:
+        try:
+            import resource
+
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # not supported on this platform (e.g. Windows)
+
+    # the real stdout carries replies to the pool; fd 1 and 2 are pointed at a capture file per block
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    work_dir = os.getcwd()
+    sys.path.insert(0, work_dir)
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass  # a missing optional library just isn't preloaded
+    baseline_modules = set(sys.modules)
+    baseline_path = list(sys.path)
+    replies.write(json.dumps({"ready": True}) + "\n")
+    replies.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        path = os.path.join(work_dir, request["filename"])
+        exitcode = 0
+        with tempfile.TemporaryFile() as capture:
+            saved_fds = os.dup(1), os.dup(2)
+            os.dup2(capture.fileno(), 1)
+            os.dup2(capture.fileno(), 2)
+            try:
+                namespace = {"__name__": "__main__", "__file__": path, "__builtins__": builtins}
+                sys.argv = [path]
+                exec(compile(request["code"], path, "exec"), namespace)
+            except SystemExit as e:
+                if isinstance(e.code, int) or e.code is None:
+                    exitcode = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    exitcode = 1
+            except BaseException as e:
+                # leave this loop's frame out of the traceback, like a script run with "python file.py"
+                traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+                exitcode = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(saved_fds[0], 1)
+                os.dup2(saved_fds[1], 2)
+                os.close(saved_fds[0])
+                os.close(saved_fds[1])
+            capture.seek(0)
+            output = capture.read().decode("utf-8", errors="replace")
+        # clean up after the block: forget modules it imported from the work_dir and any cwd/path changes
+        for name in set(sys.modules) - baseline_modules:
+            module_file = getattr(sys.modules[name], "__file__", None) or ""
+            if os.path.abspath(module_file).startswith(work_dir):
+                del sys.modules[name]
+        sys.path[:] = baseline_path
+        os.chdir(work_dir)
+        replies.write(json.dumps({"exitcode": exitcode, "output": output}) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    _worker_main(json.loads(sys.argv[1]), int(sys.argv[2]))